@@ -2,6 +2,8 @@ from fastapi import HTTPException, Header
 import httpx
 import os
 
+from shared.deadline import deadline_headers, downstream_timeout
+
 USER_SERVICE_URL = os.getenv("USER_SERVICE_URL", "http://localhost:8001")
 
 
@@ -14,10 +16,10 @@ async def verify_token(authorization: str = Header(None)):
         token = authorization.replace("Bearer ", "")
 
         # Verify token with user service
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(timeout=downstream_timeout(5.0)) as client:
             response = await client.get(
                 f"{USER_SERVICE_URL}/users/me",
-                headers={"Authorization": f"Bearer {token}"},
+                headers={"Authorization": f"Bearer {token}", **deadline_headers()},
             )
 
             if response.status_code != 200:
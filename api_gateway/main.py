@@ -1,16 +1,27 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 import httpx
 import redis
-import json
 import os
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 from datetime import datetime
 from dotenv import load_dotenv
 
 # Import from shared package
 from shared.schemas import UserCreate, UserResponse, ProductCreate, ProductResponse
 from shared.schemas import OrderCreate, OrderResponse, LoginRequest
+from shared.schemas import ReservationCreate, ReservationResponse, ProductFacets
+from shared.schemas import ProductImportReport, ProductBatch, ProductBatchRequest
+from shared.deadline import (
+    install_deadline_middleware,
+    deadline_headers,
+    downstream_timeout,
+)
+from shared.message_queue import MessageType, message_queue
+from shared.serialization import ORJSONResponse, dumps, loads
 from .dependencies import verify_token
 
 from .monitoring import monitor_app, track_downstream_request, track_downstream_error
@@ -22,6 +33,31 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Drop cached product entities as products change. Without the broker
+    # the gateway still serves requests and entities expire by TTL instead.
+    invalidation_tasks = []
+    try:
+        await message_queue.connect(service_name="api_gateway")
+        invalidation_tasks = [
+            asyncio.create_task(
+                message_queue.consume_messages(message_type, invalidate_products)
+            )
+            for message_type in (MessageType.PRODUCT_UPDATED, MessageType.INVENTORY_LOW)
+        ]
+    except Exception as e:
+        logger.warning(f"Product cache invalidation disabled: {e}")
+
+    yield
+
+    for task in invalidation_tasks:
+        task.cancel()
+    if message_queue.connection:
+        await message_queue.close()
+
+
 app = FastAPI(
     title="E-commerce API Gateway",
     version="1.0.0",
@@ -104,6 +140,8 @@ The API Gateway serves as the single entry point for all client requests, provid
             "description": "Login and token management (routed to User Service)",
         },
     ],
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
 )
 
 # Redis client for caching
@@ -114,6 +152,17 @@ USER_SERVICE_URL = os.getenv("USER_SERVICE_URL", "http://localhost:8001")
 PRODUCT_SERVICE_URL = os.getenv("PRODUCT_SERVICE_URL", "http://localhost:8002")
 ORDER_SERVICE_URL = os.getenv("ORDER_SERVICE_URL", "http://localhost:8003")
 
+# Product entities are cached once each, shared by every list page and
+# lookup; list pages only cache their ordered product ids. Entities are
+# dropped on PRODUCT_UPDATED, and expire no later than list pages so that
+# stock is never staler than a cached page would have been
+PRODUCT_CACHE_TTL = int(os.getenv("PRODUCT_CACHE_TTL", 60))
+PRODUCT_LIST_CACHE_TTL = int(os.getenv("PRODUCT_LIST_CACHE_TTL", 60))
+
+# Deadline budget: clients may ask for less via X-Request-Timeout, never more
+GATEWAY_REQUEST_TIMEOUT = float(os.getenv("GATEWAY_REQUEST_TIMEOUT", 30))
+DOWNSTREAM_TIMEOUT = float(os.getenv("DOWNSTREAM_TIMEOUT", 10))
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -126,6 +175,25 @@ app.add_middleware(
 # Setup monitoring
 monitor_app(app, "api_gateway")
 
+# Stamp every request with a deadline that is propagated downstream
+install_deadline_middleware(
+    app, default_timeout=GATEWAY_REQUEST_TIMEOUT, max_timeout=GATEWAY_REQUEST_TIMEOUT
+)
+
+
+@app.exception_handler(httpx.TimeoutException)
+async def downstream_timeout_handler(request, exc):
+    return JSONResponse(
+        status_code=504, content={"detail": "Request deadline exceeded"}
+    )
+
+
+def downstream_client(default_timeout: float = DOWNSTREAM_TIMEOUT) -> httpx.AsyncClient:
+    """HTTP client for downstream calls, bounded by the request deadline"""
+    return httpx.AsyncClient(
+        timeout=downstream_timeout(default_timeout), headers=deadline_headers()
+    )
+
 
 async def handle_service_response(response: httpx.Response, service: str):
     """Handle responses from downstream services with monitoring"""
@@ -133,6 +201,8 @@ async def handle_service_response(response: httpx.Response, service: str):
 
     if response.status_code == 404:
         raise HTTPException(status_code=404, detail="Resource not found")
+    elif response.status_code == 504:
+        raise HTTPException(status_code=504, detail="Request deadline exceeded")
     elif response.status_code >= 500:
         logger.error(f"Service error: {response.status_code} - {response.text}")
         raise HTTPException(status_code=503, detail="Service temporarily unavailable")
@@ -159,7 +229,7 @@ async def health_check():
 
     for service_name, url in services.items():
         try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
+            async with downstream_client(5.0) as client:
                 response = await client.get(f"{url}/health")
                 status_report["services"][service_name] = {
                     "status": "healthy" if response.status_code == 200 else "unhealthy",
@@ -204,7 +274,7 @@ async def health_check():
 
     for service_name, url in services.items():
         try:
-            async with httpx.AsyncClient(timeout=5.0) as client:
+            async with downstream_client(5.0) as client:
                 response = await client.get(f"{url}/health")
                 status_report["services"][service_name] = {
                     "status": "healthy" if response.status_code == 200 else "unhealthy",
@@ -225,7 +295,7 @@ async def health_check():
 
 def get_cache_key(method: str, path: str, params: dict) -> str:
     """Generate cache key from request details"""
-    param_str = json.dumps(params, sort_keys=True)
+    param_str = dumps(params, sort_keys=True).decode()
     return f"cache:{method}:{path}:{param_str}"
 
 
@@ -237,10 +307,10 @@ async def cached_request(method: str, url: str, cache_ttl: int = 300, **kwargs):
     if method.upper() == "GET":
         cached = redis_client.get(cache_key)
         if cached:
-            return json.loads(cached)
+            return httpx.Response(200, content=cached)
 
     # Make actual request
-    async with httpx.AsyncClient() as client:
+    async with downstream_client() as client:
         if method.upper() == "GET":
             response = await client.get(url, **kwargs)
         elif method.upper() == "POST":
@@ -250,11 +320,67 @@ async def cached_request(method: str, url: str, cache_ttl: int = 300, **kwargs):
 
         # Cache successful GET responses
         if method.upper() == "GET" and response.status_code == 200:
-            redis_client.setex(cache_key, cache_ttl, response.text)
+            redis_client.setex(cache_key, cache_ttl, response.content)
 
         return response
 
 
+def product_cache_key(product_id: str) -> str:
+    return f"cache:product:{product_id}"
+
+
+def cache_products(products: list[dict]) -> dict[str, str]:
+    """Cache product entities and return their JSON by id"""
+    encoded = {product["id"]: dumps(product).decode() for product in products}
+    if encoded:
+        pipe = redis_client.pipeline(transaction=False)
+        for product_id, data in encoded.items():
+            pipe.setex(product_cache_key(product_id), PRODUCT_CACHE_TTL, data)
+        pipe.execute()
+    return encoded
+
+
+async def cached_products(ids: list[str]) -> dict[str, str]:
+    """
+    JSON of the products ``ids`` by id, ids without a product left out.
+
+    Cached entities are read with one MGET; the rest are fetched from
+    product_service in one batch request and cached.
+    """
+    if not ids:
+        return {}
+    cached = redis_client.mget([product_cache_key(product_id) for product_id in ids])
+    found = {product_id: data for product_id, data in zip(ids, cached) if data}
+    missing = [
+        product_id for product_id in dict.fromkeys(ids) if product_id not in found
+    ]
+    if missing:
+        async with downstream_client() as client:
+            response = await client.post(
+                f"{PRODUCT_SERVICE_URL}/products/batch", json={"ids": missing}
+            )
+        batch = await handle_service_response(response, "product_service")
+        found.update(cache_products(batch["products"]))
+    return found
+
+
+def json_array(items) -> str:
+    """A JSON array of already encoded JSON values"""
+    return "[" + ",".join(items) + "]"
+
+
+async def invalidate_products(message: dict):
+    """Drop the cached entities of the products an event changed"""
+    data = message["data"]
+    ids = [
+        product.get("id") or product.get("product_id")
+        for product in data.get("products") or [data]
+    ]
+    keys = [product_cache_key(product_id) for product_id in ids if product_id]
+    if keys:
+        redis_client.delete(*keys)
+
+
 # API Gateway only handles synchronous REST API routing
 # It doesn't use message queue directly for client requests
 
@@ -291,7 +417,7 @@ async def get_user(user_id: str, current_user: dict = Depends(verify_token)):
 # Authentication
 @app.post("/token")
 async def login(login_data: LoginRequest):
-    async with httpx.AsyncClient() as client:
+    async with downstream_client() as client:
         response = await client.post(
             f"{USER_SERVICE_URL}/token",
             data={"username": login_data.username, "password": login_data.password},
@@ -304,41 +430,181 @@ async def login(login_data: LoginRequest):
 async def create_product(
     product: ProductCreate, current_user: dict = Depends(verify_token)
 ):
-    async with httpx.AsyncClient() as client:
+    async with downstream_client() as client:
         response = await client.post(
             f"{PRODUCT_SERVICE_URL}/products/", json=product.dict()
         )
         return await handle_service_response(response, "product_service")
 
 
+@app.post("/products/import", response_model=ProductImportReport)
+async def import_products(request: Request, current_user: dict = Depends(verify_token)):
+    # Stream the feed through rather than buffering it in the gateway;
+    # imports may take longer than a single call, up to the request deadline
+    async with downstream_client(GATEWAY_REQUEST_TIMEOUT) as client:
+        response = await client.post(
+            f"{PRODUCT_SERVICE_URL}/products/import",
+            content=request.stream(),
+            headers={"Content-Type": request.headers.get("content-type", "")},
+        )
+        return await handle_service_response(response, "product_service")
+
+
 @app.get("/products/", response_model=list[ProductResponse])
-async def get_products(category: str = None, skip: int = 0, limit: int = 100):
+async def get_products(
+    request: Request,
+    category: str = None,
+    min_price: float = None,
+    max_price: float = None,
+    in_stock: bool = None,
+    sort: str = "created_at",
+    cursor: str = None,
+    skip: int = 0,
+    limit: int = 100,
+):
     # async with httpx.AsyncClient() as client:
-    params = {"skip": skip, "limit": limit}
+    params = {"limit": limit, "sort": sort}
+    # Keyset pages are stable, so pages are cached by cursor
+    if cursor:
+        params["cursor"] = cursor
+    else:
+        params["skip"] = skip
+    if category:
+        params["category"] = category
+    for name, value in (
+        ("min_price", min_price),
+        ("max_price", max_price),
+        ("in_stock", in_stock),
+    ):
+        if value is not None:
+            params[name] = value
+
+    # The page is cached as its product ids and assembled from the entities
+    list_key = get_cache_key("GET", f"{PRODUCT_SERVICE_URL}/products/", params)
+    cached = redis_client.get(list_key)
+    if cached:
+        page = loads(cached)
+        products = await cached_products(page["ids"])
+        # Products deleted since the page was cached are left out
+        body = json_array(products[i] for i in page["ids"] if i in products)
+        next_cursor = page["next"]
+    else:
+        async with downstream_client() as client:
+            response = await client.get(
+                f"{PRODUCT_SERVICE_URL}/products/", params=params
+            )
+        items = await handle_service_response(response, "product_service")
+        next_cursor = response.headers.get("X-Next-Cursor")
+        products = cache_products(items)
+        ids = [product["id"] for product in items]
+        redis_client.setex(
+            list_key, PRODUCT_LIST_CACHE_TTL, dumps({"ids": ids, "next": next_cursor})
+        )
+        body = json_array(products[i] for i in ids)
+
+    # Point the next-page link at the gateway rather than the service
+    headers = {}
+    if next_cursor:
+        next_url = request.url.remove_query_params("skip").include_query_params(
+            cursor=next_cursor
+        )
+        headers = {"X-Next-Cursor": next_cursor, "Link": f'<{next_url}>; rel="next"'}
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.get("/products/search", response_model=list[ProductResponse])
+async def search_products(q: str, category: str = None, limit: int = 20):
+    params = {"q": q, "limit": limit}
     if category:
         params["category"] = category
 
-    # response = await client.get(f"{PRODUCT_SERVICE_URL}/products/", params=params)
     response = await cached_request(
-        "GET", f"{PRODUCT_SERVICE_URL}/products/", cache_ttl=60, params=params
+        "GET", f"{PRODUCT_SERVICE_URL}/products/search", cache_ttl=30, params=params
     )
     return await handle_service_response(response, "product_service")
 
 
-@app.get("/products/{product_id}", response_model=ProductResponse)
-async def get_product(product_id: str):
-    # async with httpx.AsyncClient() as client:
-    # response = await client.get(f"{PRODUCT_SERVICE_URL}/products/{product_id}")
+@app.get("/products/facets", response_model=ProductFacets)
+async def get_product_facets():
     response = await cached_request(
-        "GET", f"{PRODUCT_SERVICE_URL}/products/{product_id}", cache_ttl=300
+        "GET", f"{PRODUCT_SERVICE_URL}/products/facets", cache_ttl=30
     )
     return await handle_service_response(response, "product_service")
 
 
+async def product_batch(ids: list[str]) -> Response:
+    """Products ``ids`` from the entity cache, in order, with missing ids"""
+    ids = list(dict.fromkeys(ids))
+    if len(ids) > 1000:
+        raise HTTPException(status_code=400, detail="At most 1000 ids per request")
+    products = await cached_products(ids)
+    missing = [product_id for product_id in ids if product_id not in products]
+    body = (
+        f'{{"products":{json_array(products[i] for i in ids if i in products)},'
+        f'"missing":{dumps(missing).decode()}}}'
+    )
+    return Response(content=body, media_type="application/json")
+
+
+@app.get("/products/batch", response_model=ProductBatch)
+async def get_products_batch(ids: list[str] = Query(...)):
+    return await product_batch([i for value in ids for i in value.split(",") if i])
+
+
+@app.post("/products/batch", response_model=ProductBatch)
+async def post_products_batch(batch: ProductBatchRequest):
+    return await product_batch(batch.ids)
+
+
+@app.get("/products/{product_id}", response_model=ProductResponse)
+async def get_product(product_id: str):
+    products = await cached_products([product_id])
+    if product_id not in products:
+        raise HTTPException(status_code=404, detail="Resource not found")
+    return Response(content=products[product_id], media_type="application/json")
+
+
+# Inventory reservations (routed to Product Service)
+@app.post("/reservations/", response_model=ReservationResponse, status_code=201)
+async def create_reservation(
+    reservation: ReservationCreate, current_user: dict = Depends(verify_token)
+):
+    async with downstream_client() as client:
+        response = await client.post(
+            f"{PRODUCT_SERVICE_URL}/reservations/", json=reservation.dict()
+        )
+        return await handle_service_response(response, "product_service")
+
+
+@app.post("/reservations/{reservation_id}/confirm")
+async def confirm_reservation(
+    reservation_id: str, current_user: dict = Depends(verify_token)
+):
+    async with downstream_client() as client:
+        response = await client.post(
+            f"{PRODUCT_SERVICE_URL}/reservations/{reservation_id}/confirm"
+        )
+        return await handle_service_response(response, "product_service")
+
+
+@app.delete("/reservations/{reservation_id}", status_code=204)
+async def release_reservation(
+    reservation_id: str, current_user: dict = Depends(verify_token)
+):
+    async with downstream_client() as client:
+        response = await client.delete(
+            f"{PRODUCT_SERVICE_URL}/reservations/{reservation_id}"
+        )
+        if response.status_code == 204:
+            track_downstream_request("product_service", response.status_code)
+            return Response(status_code=204)
+        return await handle_service_response(response, "product_service")
+
+
 # Order Service Routes
 @app.post("/orders/", response_model=OrderResponse)
 async def create_order(order: OrderCreate, current_user: dict = Depends(verify_token)):
-    async with httpx.AsyncClient() as client:
+    async with downstream_client() as client:
         response = await client.post(f"{ORDER_SERVICE_URL}/orders/", json=order.dict())
 
         # This triggers the Order Service REST API, which then publishes message queue events
@@ -347,7 +613,7 @@ async def create_order(order: OrderCreate, current_user: dict = Depends(verify_t
 
 @app.get("/orders/", response_model=list[OrderResponse])
 async def get_orders(user_id: str = None, current_user: dict = Depends(verify_token)):
-    async with httpx.AsyncClient() as client:
+    async with downstream_client() as client:
         params = {}
         if user_id:
             params["user_id"] = user_id
@@ -358,7 +624,7 @@ async def get_orders(user_id: str = None, current_user: dict = Depends(verify_to
 
 @app.get("/orders/{order_id}", response_model=OrderResponse)
 async def get_order(order_id: str, current_user: dict = Depends(verify_token)):
-    async with httpx.AsyncClient() as client:
+    async with downstream_client() as client:
         response = await client.get(f"{ORDER_SERVICE_URL}/orders/{order_id}")
         return await handle_service_response(response, "order_service")
 
@@ -367,7 +633,7 @@ async def get_order(order_id: str, current_user: dict = Depends(verify_token)):
 async def update_order_status(
     order_id: str, status: dict, current_user: dict = Depends(verify_token)
 ):
-    async with httpx.AsyncClient() as client:
+    async with downstream_client() as client:
         response = await client.patch(
             f"{ORDER_SERVICE_URL}/orders/{order_id}/status", json=status
         )
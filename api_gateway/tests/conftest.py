@@ -36,6 +36,15 @@ def mock_services(mock_httpx_client):
     return mock_httpx_client
 
 
+@pytest.fixture
+def mock_redis():
+    """Mock the gateway cache with an empty one"""
+    with patch("api_gateway.main.redis_client") as redis_client:
+        redis_client.get.return_value = None
+        redis_client.mget.side_effect = lambda keys: [None] * len(keys)
+        yield redis_client
+
+
 @pytest.fixture
 def valid_token():
     """Return a valid JWT token for testing"""
@@ -1,6 +1,28 @@
+import httpx
 import pytest
 from unittest.mock import patch
 
+from api_gateway.main import invalidate_products, product_cache_key
+from shared.serialization import dumps
+
+
+def product(product_id: str, **fields) -> dict:
+    return {
+        "id": product_id,
+        "name": f"Product {product_id}",
+        "description": "",
+        "price": 10.0,
+        "category": "test",
+        "stock": 1,
+        **fields,
+    }
+
+
+def cached(redis_client, *products):
+    """Serve ``products`` from the mocked cache by id"""
+    entities = {product_cache_key(p["id"]): dumps(p).decode() for p in products}
+    redis_client.mget.side_effect = lambda keys: [entities.get(k) for k in keys]
+
 
 class TestAPIGatewayRoutes:
     def test_root_endpoint(self, client):
@@ -184,8 +206,9 @@ class TestAPIGatewayRoutes:
         assert data["name"] == "Gateway Product"
         assert data["price"] == 99.99
 
-    def test_get_products_success(self, client, mock_services):
+    def test_get_products_success(self, client, mock_services, mock_redis):
         """Test getting products through gateway (no auth required)"""
+        mock_services.get.return_value.headers = {}
         mock_services.get.return_value.json.return_value = [
             {
                 "id": "prod-1",
@@ -213,8 +236,9 @@ class TestAPIGatewayRoutes:
         assert data[0]["name"] == "Product One"
         assert data[1]["name"] == "Product Two"
 
-    def test_get_products_with_filters(self, client, mock_services):
+    def test_get_products_with_filters(self, client, mock_services, mock_redis):
         """Test getting products with category filter through gateway"""
+        mock_services.get.return_value.headers = {}
         mock_services.get.return_value.json.return_value = [
             {
                 "id": "prod-1",
@@ -233,17 +257,24 @@ class TestAPIGatewayRoutes:
         assert len(data) == 1
         assert data[0]["category"] == "electronics"
 
-    def test_get_product_by_id_success(self, client, mock_services):
+    def test_get_product_by_id_success(self, client, mock_services, mock_redis):
         """Test getting specific product by ID through gateway"""
         product_id = "prod-123"
 
-        mock_services.get.return_value.json.return_value = {
-            "id": product_id,
-            "name": "Test Product",
-            "description": "A test product",
-            "price": 49.99,
-            "category": "test",
-            "stock": 100,
+        # Fetched through the batch lookup on a cache miss
+        mock_services.post.return_value.status_code = 200
+        mock_services.post.return_value.json.return_value = {
+            "products": [
+                {
+                    "id": product_id,
+                    "name": "Test Product",
+                    "description": "A test product",
+                    "price": 49.99,
+                    "category": "test",
+                    "stock": 100,
+                }
+            ],
+            "missing": [],
         }
 
         response = client.get(f"/products/{product_id}")
@@ -396,3 +427,87 @@ class TestAPIGatewayRoutes:
         data = response.json()
         assert "access_token" in data
         assert data["token_type"] == "bearer"
+
+
+class TestProductCache:
+    def test_product_served_from_cache(self, client, mock_services, mock_redis):
+        """Test a cached product is returned without calling the service"""
+        cached(mock_redis, product("prod-1"))
+
+        response = client.get("/products/prod-1")
+
+        assert response.status_code == 200
+        assert response.json()["name"] == "Product prod-1"
+        mock_services.post.assert_not_called()
+
+    def test_missing_product(self, client, mock_services, mock_redis):
+        """Test a product neither cached nor found is a 404"""
+        mock_services.post.return_value = httpx.Response(
+            200, json={"products": [], "missing": ["prod-1"]}
+        )
+
+        response = client.get("/products/prod-1")
+
+        assert response.status_code == 404
+
+    def test_batch_fetches_only_uncached(self, client, mock_services, mock_redis):
+        """Test uncached products are fetched in one batch request and cached"""
+        cached(mock_redis, product("prod-1"))
+        mock_services.post.return_value = httpx.Response(
+            200, json={"products": [product("prod-2")], "missing": ["prod-3"]}
+        )
+
+        response = client.get("/products/batch?ids=prod-2,prod-1,prod-3")
+
+        assert response.status_code == 200
+        data = response.json()
+        assert [p["id"] for p in data["products"]] == ["prod-2", "prod-1"]
+        assert data["missing"] == ["prod-3"]
+        mock_services.post.assert_called_once()
+        assert mock_services.post.call_args.kwargs["json"] == {
+            "ids": ["prod-2", "prod-3"]
+        }
+        pipe = mock_redis.pipeline.return_value
+        assert pipe.setex.call_args.args[0] == product_cache_key("prod-2")
+
+    def test_list_assembled_from_cached_ids(self, client, mock_services, mock_redis):
+        """Test a cached page is rebuilt from its ids, in order"""
+        mock_redis.get.return_value = dumps(
+            {"ids": ["prod-2", "prod-1"], "next": "abc"}
+        ).decode()
+        cached(mock_redis, product("prod-1"), product("prod-2", price=5.0))
+
+        response = client.get("/products/?limit=2")
+
+        assert response.status_code == 200
+        assert [p["id"] for p in response.json()] == ["prod-2", "prod-1"]
+        assert response.json()[0]["price"] == 5.0
+        assert response.headers["X-Next-Cursor"] == "abc"
+        mock_services.get.assert_not_called()
+        mock_services.post.assert_not_called()
+
+    def test_list_miss_caches_ids_and_entities(self, client, mock_services, mock_redis):
+        """Test a page fetched from the service is cached as ids and entities"""
+        mock_services.get.return_value = httpx.Response(
+            200, json=[product("prod-1"), product("prod-2")]
+        )
+
+        response = client.get("/products/?category=test")
+
+        assert response.status_code == 200
+        assert [p["id"] for p in response.json()] == ["prod-1", "prod-2"]
+        page = mock_redis.setex.call_args.args[2]
+        assert page == dumps({"ids": ["prod-1", "prod-2"], "next": None})
+        pipe = mock_redis.pipeline.return_value
+        assert pipe.setex.call_count == 2
+
+    @pytest.mark.asyncio
+    async def test_invalidate_products(self, mock_redis):
+        """Test product events drop only the changed products from the cache"""
+        await invalidate_products({"data": {"products": [{"id": "a"}, {"id": "b"}]}})
+        mock_redis.delete.assert_called_with(
+            product_cache_key("a"), product_cache_key("b")
+        )
+
+        await invalidate_products({"data": {"product_id": "c", "stock": 0}})
+        mock_redis.delete.assert_called_with(product_cache_key("c"))
@@ -0,0 +1,83 @@
+"""
+Benchmark message body codecs.
+
+Encodes and decodes ``order.created`` events shaped like the ones the
+order service publishes, with every codec in ``shared.codecs`` and with and
+without zstd compression, and reports body size and throughput.
+
+Usage:
+    python -m benchmarks.bench_codecs [--events 10000] [--items 5] [--repeat 5]
+"""
+
+import argparse
+import timeit
+import uuid
+from datetime import datetime
+
+from shared.codecs import JSON, MSGPACK, decode, encode
+from shared.message_queue import MessageType
+
+
+def build_events(events: int, items: int):
+    now = datetime.utcnow().isoformat()
+    return [
+        {
+            "type": MessageType.ORDER_CREATED,
+            "data": {
+                "id": str(uuid.uuid4()),
+                "user_id": f"user-{i % 50}",
+                "items": [
+                    {
+                        "product_id": str(uuid.uuid4()),
+                        "quantity": j + 1,
+                        "price": 9.99 + j,
+                    }
+                    for j in range(items)
+                ],
+                "total_amount": 59.94,
+                "status": "pending",
+                "created_at": now,
+            },
+            "timestamp": "",
+        }
+        for i in range(events)
+    ]
+
+
+def bench(events, repeat: int):
+    print(f"\n{len(events)} events, best of {repeat}")
+    print(f"  {'codec':<26} {'avg bytes':>10} {'encode/s':>12} {'decode/s':>12}")
+    for content_type in (JSON, MSGPACK):
+        for threshold in (0, 1):
+            encoded = [encode(event, content_type, threshold) for event in events]
+
+            def encode_all():
+                for event in events:
+                    encode(event, content_type, threshold)
+
+            def decode_all():
+                for body, body_type, encoding in encoded:
+                    decode(body, body_type, encoding)
+
+            size = sum(len(body) for body, _, _ in encoded) / len(encoded)
+            encode_time = min(timeit.repeat(encode_all, number=1, repeat=repeat))
+            decode_time = min(timeit.repeat(decode_all, number=1, repeat=repeat))
+            name = content_type + (" + zstd" if threshold else "")
+            print(
+                f"  {name:<26} {size:10.0f} "
+                f"{len(events) / encode_time:12,.0f} {len(events) / decode_time:12,.0f}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--items", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    bench(build_events(args.events, args.items), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+Benchmark product listing queries on a large synthetic catalog.
+
+Fills a products table (SQLite by default, or DATABASE_URL) and runs the
+queries ``GET /products/`` builds for each filter and sort combination,
+first page and a page deep into the listing (by cursor), once with only
+the single-column indexes and once with the composite listing indexes
+from ``product_service.models``. For every query the plan is printed, so
+it can be checked that each listing is an index range scan without a
+separate sort step (SQLite: no ``USE TEMP B-TREE FOR ORDER BY``).
+
+Reported per query and index set:
+  first ms   median time of the first page
+  deep ms    median time of the page after the middle of the listing
+
+Usage:
+    python -m benchmarks.bench_product_queries [--products 200000]
+        [--categories 50] [--page 100] [--repeat 5] [--no-plans]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+SCENARIOS = [
+    ("newest", {}),
+    ("by price", {"sort": "price"}),
+    ("by name", {"sort": "name"}),
+    ("category, newest", {"category": True}),
+    ("category by price", {"category": True, "sort": "price"}),
+    (
+        "category, price range by price",
+        {"category": True, "min_price": 20, "max_price": 60, "sort": "price"},
+    ),
+    (
+        "category, price range, newest",
+        {"category": True, "min_price": 20, "max_price": 60},
+    ),
+    (
+        "category by name, in stock",
+        {"category": True, "sort": "name", "in_stock": True},
+    ),
+    ("price range by price", {"min_price": 20, "max_price": 25, "sort": "price"}),
+]
+
+
+def seed_catalog(engine, products: int, categories: int):
+    from product_service.models import Product
+
+    rng = random.Random(42)
+    start = datetime(2020, 1, 1)
+    rows = (
+        {
+            "id": f"prod-{i:08d}",
+            "name": f"{rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ')}roduct {rng.random():.8f}",
+            "description": "",
+            "price": round(rng.uniform(1, 500), 2),
+            "category": f"category-{rng.randrange(categories)}",
+            "stock": rng.choice([0, 0, 5, 50, 500]),
+            "created_at": start + timedelta(seconds=rng.randrange(10**8)),
+            "updated_at": start,
+        }
+        for i in range(products)
+    )
+    with engine.begin() as connection:
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == 10000:
+                connection.execute(Product.__table__.insert(), chunk)
+                chunk = []
+        if chunk:
+            connection.execute(Product.__table__.insert(), chunk)
+
+
+def composite_indexes():
+    from product_service.models import Product
+
+    return [index for index in Product.__table__.indexes if len(index.columns) > 1]
+
+
+def analyze(engine):
+    from sqlalchemy import text
+
+    with engine.begin() as connection:
+        if engine.dialect.name == "sqlite":
+            connection.execute(text("ANALYZE"))
+        elif engine.dialect.name == "oracle":
+            connection.execute(
+                text("BEGIN DBMS_STATS.GATHER_TABLE_STATS(USER, 'PRODUCTS'); END;")
+            )
+
+
+def listing_query(db, params: dict, cursor=None):
+    from product_service.listing import ProductSort, filter_products, sort_products
+    from product_service.models import Product
+
+    query = filter_products(
+        db.query(Product),
+        params.get("category"),
+        params.get("min_price"),
+        params.get("max_price"),
+        params.get("in_stock"),
+    )
+    return sort_products(query, ProductSort(params.get("sort", "created_at")), cursor)
+
+
+def explain(db, query) -> list:
+    """Execution plan lines of ``query``"""
+    from sqlalchemy import text
+
+    compiled = query.statement.compile(db.bind)
+    if db.bind.dialect.name == "sqlite":
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+        rows = db.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params)
+        return [row[-1] for row in rows]
+    if db.bind.dialect.name == "oracle":
+        db.execute(text(f"EXPLAIN PLAN FOR {compiled}"), compiled.params)
+        rows = db.execute(text("SELECT * FROM TABLE(DBMS_XPLAN.DISPLAY())"))
+        return [row[0] for row in rows]
+    return ["(no plan support for this database)"]
+
+
+def time_page(db, params: dict, page: int, repeat: int, cursor=None) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        listing_query(db, params, cursor).limit(page + 1).all()
+        timings.append(time.perf_counter() - start)
+        db.expunge_all()
+    return statistics.median(timings) * 1000
+
+
+def middle_cursor(db, params: dict) -> str:
+    """Cursor that starts the listing halfway through"""
+    from product_service.listing import ProductSort, next_cursor
+
+    count = listing_query(db, params).count()
+    product = listing_query(db, params).offset(count // 2).limit(1).first()
+    return next_cursor(product, ProductSort(params.get("sort", "created_at")))
+
+
+def run(args, session_factory, label: str) -> dict:
+    results = {}
+    db = session_factory()
+    try:
+        for name, params in SCENARIOS:
+            params = dict(params)
+            if params.get("category"):
+                params["category"] = "category-7"
+            cursor = middle_cursor(db, params)
+            first = time_page(db, params, args.page, args.repeat)
+            deep = time_page(db, params, args.page, args.repeat, cursor)
+            results[name] = (first, deep)
+            if args.plans:
+                print(f"\n[{label}] {name}")
+                for line in explain(db, listing_query(db, params, cursor)):
+                    print(f"    {line}")
+    finally:
+        db.close()
+    return results
+
+
+def report(before: dict, after: dict):
+    print(
+        f"\n{'query':<34} {'first ms':>9} {'deep ms':>9}   "
+        f"{'first ms':>9} {'deep ms':>9}"
+    )
+    print(f"{'':<34} {'single-column indexes':>19}   {'composite indexes':>19}")
+    for name, _ in SCENARIOS:
+        print(
+            f"{name:<34} {before[name][0]:>9.2f} {before[name][1]:>9.2f}   "
+            f"{after[name][0]:>9.2f} {after[name][1]:>9.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--products", type=int, default=200000)
+    parser.add_argument("--categories", type=int, default=50)
+    parser.add_argument("--page", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--no-plans", dest="plans", action="store_false")
+    args = parser.parse_args()
+
+    # Must be set before the service modules create their engines
+    database = os.path.join(tempfile.mkdtemp(), "bench.db")
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{database}")
+
+    from product_service.database import SessionLocal, engine
+    from product_service.migrations import ensure_indexes
+    from product_service.models import Base
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    for index in composite_indexes():
+        index.drop(bind=engine)
+
+    start = time.perf_counter()
+    seed_catalog(engine, args.products, args.categories)
+    analyze(engine)
+    print(f"Seeded {args.products:,} products in {time.perf_counter() - start:.1f}s")
+    before = run(args, SessionLocal, "single-column indexes")
+
+    start = time.perf_counter()
+    ensure_indexes(engine)
+    analyze(engine)
+    print(f"\nCreated composite indexes in {time.perf_counter() - start:.1f}s")
+    after = run(args, SessionLocal, "composite indexes")
+
+    report(before, after)
+    Base.metadata.drop_all(engine)
+
+
+if __name__ == "__main__":
+    main()
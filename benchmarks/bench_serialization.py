@@ -0,0 +1,89 @@
+"""
+Benchmark response encoding for the order and product list endpoints.
+
+Builds ``limit=1000`` pages shaped exactly like ``GET /orders/`` and
+``GET /products/`` responses and compares FastAPI's default JSONResponse
+(stdlib json after jsonable_encoder) with the shared ORJSONResponse.
+
+Usage:
+    python -m benchmarks.bench_serialization [--rows 1000] [--repeat 20]
+"""
+
+import argparse
+import timeit
+import uuid
+from datetime import datetime, timedelta
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from shared.schemas import OrderItem, OrderResponse, OrderStatus, ProductResponse
+from shared.serialization import ORJSONResponse
+
+
+def build_orders(rows: int):
+    now = datetime.utcnow()
+    return [
+        OrderResponse(
+            id=str(uuid.uuid4()),
+            user_id=f"user-{i % 50}",
+            items=[
+                OrderItem(product_id=f"prod-{i + j}", quantity=j + 1, price=9.99 + j)
+                for j in range(3)
+            ],
+            total_amount=59.94,
+            status=OrderStatus.PENDING,
+            created_at=now - timedelta(minutes=i),
+        )
+        for i in range(rows)
+    ]
+
+
+def build_products(rows: int):
+    now = datetime.utcnow()
+    return [
+        ProductResponse(
+            id=str(uuid.uuid4()),
+            name=f"Product {i}",
+            description=f"Description for product {i}",
+            price=10.0 + i,
+            category=f"category-{i % 20}",
+            stock=i % 100,
+            created_at=now - timedelta(minutes=i),
+        )
+        for i in range(rows)
+    ]
+
+
+def bench(label: str, payload, repeat: int):
+    def stdlib():
+        JSONResponse(jsonable_encoder(payload))
+
+    def orjson_encoded():
+        ORJSONResponse(jsonable_encoder(payload))
+
+    def orjson_native():
+        ORJSONResponse([item.dict() for item in payload])
+
+    print(f"\n{label} ({len(payload)} rows, best of {repeat})")
+    for name, func in [
+        ("json (FastAPI default)", stdlib),
+        ("orjson after jsonable_encoder", orjson_encoded),
+        ("orjson native types", orjson_native),
+    ]:
+        best = min(timeit.repeat(func, number=1, repeat=repeat))
+        print(f"  {name:<32} {best * 1000:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    bench("GET /orders/", build_orders(args.rows), args.repeat)
+    bench("GET /products/", build_products(args.rows), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,8 @@ import time
 from contextlib import contextmanager
 import logging
 
+from shared.deadline import install_statement_timeout
+
 logger = logging.getLogger(__name__)
 
 
@@ -23,12 +25,21 @@ ORACLE_CONNECTION_STRING = (
     f"{ORACLE_USER}/{ORACLE_PASSWORD}@{ORACLE_HOST}:{ORACLE_PORT}/{ORACLE_SERVICE}"
 )
 
+# Any other SQLAlchemy URL (e.g. sqlite:///bench.db) replaces Oracle for
+# local runs and benchmarks
+DATABASE_URL = os.getenv("DATABASE_URL")
+
 # Connection retry settings
 MAX_RETRIES = 5
 RETRY_DELAY = 2  # seconds
 
 
 def create_engine_with_retry():
+    if DATABASE_URL:
+        return create_engine(
+            DATABASE_URL, echo=os.getenv("DB_ECHO", "false").lower() == "true"
+        )
+
     retries = 0
     while retries < MAX_RETRIES:
         try:
@@ -60,6 +71,7 @@ def create_engine_with_retry():
 
 
 engine = create_engine_with_retry()
+install_statement_timeout(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
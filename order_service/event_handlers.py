@@ -1,17 +1,29 @@
 from shared.message_queue import message_queue, MessageType
-from shared.schemas import OrderResponse
+from sqlalchemy.orm import Session
 import logging
 
+from .outbox import add_outbox_event
+
 logger = logging.getLogger(__name__)
 
 
-async def publish_order_events(order: OrderResponse, event_type: MessageType):
-    """Publish order events to message queue"""
-    try:
-        await message_queue.publish_message(event_type, order.dict())
-        logger.info(f"Published {event_type} event for order {order.id}")
-    except Exception as e:
-        logger.error(f"Failed to publish order event: {e}")
+def order_partition_key(order: dict) -> str:
+    """
+    Consistent-hash key of order events: the order's lowest product id.
+
+    Product service keeps stock changes of a product in order by routing
+    all of its events to one replica. An order can only be routed once, so
+    only its first product is guaranteed that; the other products of a
+    multi-product order may be changed on other replicas concurrently.
+    """
+    product_ids = [item["product_id"] for item in order.get("items") or ()]
+    return min(product_ids) if product_ids else order["id"]
+
+
+def record_order_event(db: Session, order: dict, event_type: MessageType):
+    """Write an order event to the outbox in the caller's transaction"""
+    add_outbox_event(db, event_type, order)
+    logger.info(f"Recorded {event_type} event for order {order['id']}")
 
 
 async def handle_inventory_updates(message: dict):
@@ -19,14 +31,14 @@ async def handle_inventory_updates(message: dict):
     logger.info(f"Received inventory update: {message}")
 
 
-# Order event publishing functions
-async def publish_order_created(order: OrderResponse):
-    await publish_order_events(order, MessageType.ORDER_CREATED)
+# Order event recording functions, relayed to the message queue by OutboxRelay
+def record_order_created(db: Session, order: dict):
+    record_order_event(db, order, MessageType.ORDER_CREATED)
 
 
-async def publish_order_updated(order: OrderResponse):
-    await publish_order_events(order, MessageType.ORDER_UPDATED)
+def record_order_updated(db: Session, order: dict):
+    record_order_event(db, order, MessageType.ORDER_UPDATED)
 
 
-async def publish_order_cancelled(order: OrderResponse):
-    await publish_order_events(order, MessageType.ORDER_CANCELLED)
+def record_order_cancelled(db: Session, order: dict):
+    record_order_event(db, order, MessageType.ORDER_CANCELLED)
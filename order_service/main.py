@@ -4,14 +4,19 @@ from dotenv import load_dotenv
 import os
 from datetime import datetime
 
-from .database import Base, engine
+from .database import Base, SessionLocal, engine
 from .routers import orders
 
 from monitoring import monitor_app, track_order_creation, track_order_completion
 
+from shared.deadline import install_deadline_middleware
+from shared.serialization import ORJSONResponse
+
 from contextlib import asynccontextmanager
 import asyncio
 from .event_handlers import message_queue, handle_inventory_updates, MessageType
+from .event_handlers import order_partition_key
+from .outbox import OutboxRelay
 
 # Load environment variables
 load_dotenv()
@@ -23,7 +28,17 @@ Base.metadata.create_all(bind=engine)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup: Connect to message queue
-    await message_queue.connect()
+    await message_queue.connect(service_name="order_service")
+
+    # Order events are hashed by product, so consistent-hash consumers get
+    # the stock events of a product on one replica (see order_partition_key
+    # for the limits with orders of several products)
+    for event_type in (
+        MessageType.ORDER_CREATED,
+        MessageType.ORDER_UPDATED,
+        MessageType.ORDER_CANCELLED,
+    ):
+        message_queue.set_partition_key(event_type, order_partition_key)
 
     # Start consuming inventory update responses
     inventory_task = asyncio.create_task(
@@ -32,9 +47,13 @@ async def lifespan(app: FastAPI):
         )
     )
 
+    # Relay committed order events from the outbox to the message queue
+    outbox_task = asyncio.create_task(OutboxRelay(SessionLocal, message_queue).run())
+
     yield
 
     # Shutdown: Close connections
+    outbox_task.cancel()
     inventory_task.cancel()
     await message_queue.close()
 
@@ -95,6 +114,7 @@ Complete order processing system for the E-commerce Platform with real-time stat
         {"name": "status", "description": "Order status tracking and updates"},
     ],
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # CORS middleware
@@ -112,6 +132,9 @@ app.include_router(orders.router)
 # Setup monitoring
 monitor_app(app, "order_service")
 
+# Reject and cancel requests whose gateway deadline has passed
+install_deadline_middleware(app)
+
 
 @app.get("/health")
 async def health_check():
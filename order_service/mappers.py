@@ -0,0 +1,42 @@
+"""
+Bulk mapping from stored orders to response payloads.
+
+Orders are written by this service only, so rows are turned straight into
+plain dicts shaped like ``OrderResponse`` without building Pydantic models
+or re-validating the stored items. The payloads go out through
+ORJSONResponse, so encoding cost follows payload size rather than the number
+of objects.
+"""
+
+from typing import Any, Dict, Iterable, List
+
+from sqlalchemy.orm import Query
+
+from .models import Order
+
+# Columns exposed by OrderResponse, in payload order
+RESPONSE_COLUMNS = (
+    Order.id,
+    Order.user_id,
+    Order.items,
+    Order.total_amount,
+    Order.status,
+    Order.created_at,
+)
+RESPONSE_FIELDS = tuple(column.key for column in RESPONSE_COLUMNS)
+
+
+def order_to_payload(order: Order) -> Dict[str, Any]:
+    """Map a single Order row to an OrderResponse-shaped dict"""
+    return {field: getattr(order, field) for field in RESPONSE_FIELDS}
+
+
+def rows_to_payload(rows: Iterable[tuple]) -> List[Dict[str, Any]]:
+    """Map column tuples selected with RESPONSE_COLUMNS in one pass"""
+    fields = RESPONSE_FIELDS
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def query_order_payloads(query: Query) -> List[Dict[str, Any]]:
+    """Run an Order query selecting only response columns, skipping the ORM"""
+    return rows_to_payload(query.with_entities(*RESPONSE_COLUMNS).all())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, Float, Integer, JSON
+from sqlalchemy import Column, String, DateTime, Float, Integer, JSON, Sequence
 from sqlalchemy.ext.declarative import declarative_base
 import datetime
 from enum import Enum as PyEnum
@@ -30,3 +30,21 @@ class Order(Base):
 
     def __repr__(self):
         return f"<Order(id='{self.id}', status='{self.status}', total={self.total_amount})>"
+
+
+class OutboxEvent(Base):
+    """Order event written in the same transaction as the order change"""
+
+    __tablename__ = "order_outbox"
+
+    id = Column(Integer, Sequence("order_outbox_id_seq"), primary_key=True)
+    event_type = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    attempts = Column(Integer, default=0)
+    last_error = Column(String)
+    # Set when the relay gave up on the event; clear it to relay it again
+    dead_lettered_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+    def __repr__(self):
+        return f"<OutboxEvent(id={self.id}, type='{self.event_type}')>"
@@ -29,6 +29,21 @@ ORDER_REVENUE = Gauge("order_revenue_total", "Total revenue from orders")
 
 ORDER_STATUS = Gauge("orders_by_status", "Number of orders by status", ["status"])
 
+OUTBOX_PENDING = Gauge("order_outbox_pending", "Order events waiting in the outbox")
+
+OUTBOX_RELAYED = Counter(
+    "order_outbox_relayed_total", "Order events relayed from the outbox to the broker"
+)
+
+OUTBOX_RELAY_FAILURES = Counter(
+    "order_outbox_relay_failures_total", "Failed attempts to relay an outbox batch"
+)
+
+OUTBOX_DEAD_LETTERED = Counter(
+    "order_outbox_dead_lettered_total",
+    "Order events set aside after they could not be relayed",
+)
+
 
 def monitor_app(app, app_name: str):
     """
@@ -96,3 +111,19 @@ def track_revenue(amount: float):
 def track_order_status(status: str, count: int):
     """Track number of orders by status"""
     ORDER_STATUS.labels(status=status).set(count)
+
+
+def track_outbox_relay(relayed: int, pending: int):
+    """Track events relayed from the outbox and the remaining backlog"""
+    OUTBOX_RELAYED.inc(relayed)
+    OUTBOX_PENDING.set(pending)
+
+
+def track_outbox_failure():
+    """Track a failed outbox relay attempt"""
+    OUTBOX_RELAY_FAILURES.inc()
+
+
+def track_outbox_dead_letter():
+    """Track an outbox event set aside after failing to relay"""
+    OUTBOX_DEAD_LETTERED.inc()
@@ -0,0 +1,154 @@
+"""
+Transactional outbox for order events.
+
+Request handlers add an OutboxEvent in the same transaction as the order
+change, so the write path only waits for the database and an event can never
+be lost after a commit. OutboxRelay drains the table to RabbitMQ in id
+order, in batches, retrying with exponential backoff until the broker
+confirms. Delivery is at-least-once: a batch that fails part-way is
+published again from its first event, with the same message ids so
+deduplicating consumers skip the repeats.
+
+After a failure the relay publishes the oldest event alone until it goes
+through, so a poison event (an unknown type, a payload the broker refuses)
+is pinned down; once it has failed ``max_attempts`` times it is set aside
+with ``dead_lettered_at`` and the rest of the outbox drains. Replicas take
+the oldest events with ``SELECT ... FOR UPDATE SKIP LOCKED`` where the
+database supports it, and only the replica holding the oldest pending event
+relays, so events stay in order with several relays running.
+"""
+
+import asyncio
+import logging
+import os
+
+from datetime import datetime
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from shared.message_queue import MessageType
+from shared.serialization import dumps, loads
+from monitoring import (
+    track_outbox_dead_letter,
+    track_outbox_failure,
+    track_outbox_relay,
+)
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+
+def add_outbox_event(db: Session, event_type: MessageType, payload: dict):
+    """Stage an event; it is persisted by the caller's commit"""
+    # Round-trip through the shared codec so datetimes are stored as JSON text
+    payload = loads(dumps(payload))
+    db.add(OutboxEvent(event_type=event_type.value, payload=payload, attempts=0))
+
+
+class OutboxRelay:
+    def __init__(
+        self,
+        session_factory,
+        message_queue,
+        batch_size: int = None,
+        poll_interval: float = None,
+        max_backoff: float = None,
+        max_attempts: int = None,
+    ):
+        self.session_factory = session_factory
+        self.message_queue = message_queue
+        self.batch_size = batch_size or int(os.getenv("OUTBOX_BATCH_SIZE", 100))
+        self.poll_interval = poll_interval or float(
+            os.getenv("OUTBOX_POLL_INTERVAL", 0.5)
+        )
+        self.max_backoff = max_backoff or float(os.getenv("OUTBOX_MAX_BACKOFF", 30))
+        self.max_attempts = max_attempts or int(os.getenv("OUTBOX_MAX_ATTEMPTS", 20))
+
+    def _dead_letter(self, db: Session, event: OutboxEvent, error: str):
+        event.dead_lettered_at = datetime.utcnow()
+        event.last_error = error[:500]
+        track_outbox_dead_letter()
+        logger.error(
+            f"Outbox event {event.id} ({event.event_type}) set aside after "
+            f"{event.attempts} attempts: {error}"
+        )
+
+    async def relay_batch(self) -> int:
+        """Publish the oldest pending events; returns how many were relayed"""
+        db = self.session_factory()
+        try:
+            pending = db.query(OutboxEvent).filter(
+                OutboxEvent.dead_lettered_at.is_(None)
+            )
+            events = (
+                pending.order_by(OutboxEvent.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            oldest = pending.with_entities(func.min(OutboxEvent.id)).scalar()
+            if not events or events[0].id != oldest:
+                # Empty, or another replica is relaying the older events
+                db.rollback()
+                track_outbox_relay(0, pending.count())
+                return 0
+            if events[0].attempts:
+                # The last batch failed: publish its oldest event alone to
+                # find out whether that event is the cause
+                events = events[:1]
+
+            messages = []
+            for event in events:
+                try:
+                    messages.append((MessageType(event.event_type), event.payload))
+                except ValueError as e:
+                    # Can never be published; later events must not wait on it
+                    self._dead_letter(db, event, str(e))
+                    events = events[: len(messages)]
+                    break
+            if not events:
+                db.commit()
+                return 0
+
+            try:
+                # Ids are stable across retries so consumers can drop repeats
+                await self.message_queue.publish_many(
+                    messages,
+                    message_ids=[f"order-outbox-{event.id}" for event in events],
+                )
+            except Exception as e:
+                # Charged to the oldest event only; it is retried alone next
+                head = events[0]
+                head.attempts = (head.attempts or 0) + 1
+                head.last_error = str(e)[:500]
+                if len(events) == 1 and head.attempts >= self.max_attempts:
+                    self._dead_letter(db, head, str(e))
+                db.commit()
+                raise
+
+            for event in events:
+                db.delete(event)
+            db.commit()
+
+            track_outbox_relay(len(events), pending.count())
+            return len(events)
+        finally:
+            db.close()
+
+    async def run(self):
+        """Drain the outbox until cancelled"""
+        backoff = self.poll_interval
+        while True:
+            try:
+                relayed = await self.relay_batch()
+                backoff = self.poll_interval
+                if relayed < self.batch_size:
+                    await asyncio.sleep(self.poll_interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                track_outbox_failure()
+                logger.error(f"Outbox relay failed, retrying in {backoff:.1f}s: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
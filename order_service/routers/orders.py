@@ -6,14 +6,16 @@ from datetime import datetime
 
 from ..database import get_db
 from ..models import Order, OrderStatus
-from shared.schemas import OrderCreate, OrderResponse, OrderItem
+from ..mappers import order_to_payload, query_order_payloads
+from shared.schemas import OrderCreate, OrderResponse
+from shared.serialization import ORJSONResponse
 
 from dependencies import get_order_or_404
 
 from ..event_handlers import (
-    publish_order_created,
-    publish_order_updated,
-    publish_order_cancelled,
+    record_order_created,
+    record_order_updated,
+    record_order_cancelled,
 )
 
 
@@ -35,26 +37,19 @@ async def create_order(order: OrderCreate, db: Session = Depends(get_db)):
         items=items_json,
         total_amount=order.total_amount,
         status=OrderStatus.PENDING,
+        created_at=datetime.utcnow(),
     )
+    order_response = order_to_payload(db_order)
+    if order.reservation_id:
+        # product_service confirms the held stock when it sees the event
+        order_response["reservation_id"] = order.reservation_id
 
+    # 🎯 MESSAGE QUEUE: Event is committed with the order and relayed later
     db.add(db_order)
+    record_order_created(db, order_response)
     db.commit()
-    db.refresh(db_order)
-
-    # 🎯 MESSAGE QUEUE: Publish event asynchronously
-    order_response = OrderResponse(
-        id=db_order.id,
-        user_id=db_order.user_id,
-        items=[OrderItem(**item) for item in db_order.items],
-        total_amount=db_order.total_amount,
-        status=db_order.status,
-        created_at=db_order.created_at,
-    )
-
-    await publish_order_created(order_response)
 
-    # return db_order
-    return order_response
+    return ORJSONResponse(order_response, status_code=status.HTTP_201_CREATED)
 
 
 @router.get("/", response_model=List[OrderResponse])
@@ -74,36 +69,14 @@ async def get_orders(
     if status:
         query = query.filter(Order.status == status)
 
-    orders = query.order_by(Order.created_at.desc()).offset(skip).limit(limit).all()
+    query = query.order_by(Order.created_at.desc()).offset(skip).limit(limit)
 
-    # return orders
-
-    # Convert to response model
-    return [
-        OrderResponse(
-            id=order.id,
-            user_id=order.user_id,
-            items=[OrderItem(**item) for item in order.items],
-            total_amount=order.total_amount,
-            status=order.status,
-            created_at=order.created_at,
-        )
-        for order in orders
-    ]
+    return ORJSONResponse(query_order_payloads(query))
 
 
 @router.get("/{order_id}", response_model=OrderResponse)
 async def get_order(order: Order = Depends(get_order_or_404)):
-
-    # return order
-    return OrderResponse(
-        id=order.id,
-        user_id=order.user_id,
-        items=[OrderItem(**item) for item in order.items],
-        total_amount=order.total_amount,
-        status=order.status,
-        created_at=order.created_at,
-    )
+    return ORJSONResponse(order_to_payload(order))
 
 
 @router.patch("/{order_id}/status", response_model=OrderResponse)
@@ -123,23 +96,13 @@ async def update_order_status(
     # Update order
     order.status = new_status
     order.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(order)
+    order_response = order_to_payload(order)
 
-    # 🎯 MESSAGE QUEUE: Publish update event
-    order_response = OrderResponse(
-        id=order.id,
-        user_id=order.user_id,
-        items=[OrderItem(**item) for item in order.items],
-        total_amount=order.total_amount,
-        status=order.status,
-        created_at=order.created_at,
-    )
-
-    await publish_order_updated(order_response)
+    # 🎯 MESSAGE QUEUE: Update event is committed with the status change
+    record_order_updated(db, order_response)
+    db.commit()
 
-    # return order
-    return order_response
+    return ORJSONResponse(order_response)
 
 
 @router.delete("/{order_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -147,17 +110,8 @@ async def delete_order(
     order: Order = Depends(get_order_or_404), db: Session = Depends(get_db)
 ):
 
-    # 🎯 MESSAGE QUEUE: Publish cancellation event before deletion
-    order_response = OrderResponse(
-        id=order.id,
-        user_id=order.user_id,
-        items=[OrderItem(**item) for item in order.items],
-        total_amount=order.total_amount,
-        status=order.status,
-        created_at=order.created_at,
-    )
-
-    await publish_order_cancelled(order_response)
+    # 🎯 MESSAGE QUEUE: Cancellation event is committed with the deletion
+    record_order_cancelled(db, order_to_payload(order))
 
     # Delete from database
     db.delete(order)
@@ -166,10 +120,9 @@ async def delete_order(
 
 @router.get("/user/{user_id}/orders", response_model=List[OrderResponse])
 async def get_user_orders(user_id: str, db: Session = Depends(get_db)):
-    orders = (
+    query = (
         db.query(Order)
         .filter(Order.user_id == user_id)
         .order_by(Order.created_at.desc())
-        .all()
     )
-    return orders
+    return ORJSONResponse(query_order_payloads(query))
@@ -0,0 +1,28 @@
+from datetime import datetime
+
+from order_service.mappers import order_to_payload, query_order_payloads
+from order_service.models import Order
+
+
+class TestOrderMappers:
+    def test_order_to_payload(self, db_session, test_order):
+        """Test single order maps to an OrderResponse-shaped dict"""
+        payload = order_to_payload(test_order)
+
+        assert payload["id"] == test_order.id
+        assert payload["user_id"] == test_order.user_id
+        assert payload["items"] == test_order.items
+        assert payload["total_amount"] == test_order.total_amount
+        assert payload["status"] == test_order.status
+        assert isinstance(payload["created_at"], datetime)
+        assert "updated_at" not in payload
+
+    def test_query_order_payloads(self, db_session, test_order):
+        """Test batch mapping selects only response columns"""
+        payloads = query_order_payloads(db_session.query(Order))
+
+        assert payloads == [order_to_payload(test_order)]
+
+    def test_query_order_payloads_empty(self, db_session):
+        """Test batch mapping of an empty result"""
+        assert query_order_payloads(db_session.query(Order)) == []
@@ -0,0 +1,121 @@
+import pytest
+from unittest.mock import AsyncMock
+from sqlalchemy.orm import sessionmaker
+
+from order_service.models import OutboxEvent
+from order_service.outbox import OutboxRelay, add_outbox_event
+from shared.message_queue import MessageType
+
+
+@pytest.fixture
+def relay_factory(db_session):
+    def build(message_queue, batch_size=3):
+        session_factory = sessionmaker(bind=db_session.get_bind())
+        return OutboxRelay(session_factory, message_queue, batch_size=batch_size)
+
+    return build
+
+
+def stage_events(db_session, count):
+    for i in range(count):
+        add_outbox_event(db_session, MessageType.ORDER_CREATED, {"id": f"order-{i}"})
+    db_session.commit()
+
+
+class TestOrderOutbox:
+    def test_create_order_writes_outbox(self, client, db_session):
+        """Test the order and its event are committed together"""
+        order_data = {
+            "items": [{"product_id": "prod-1", "quantity": 1, "price": 10.0}],
+            "total_amount": 10.0,
+        }
+
+        response = client.post("/orders/", json=order_data)
+
+        assert response.status_code == 201
+        events = db_session.query(OutboxEvent).all()
+        assert len(events) == 1
+        assert events[0].event_type == MessageType.ORDER_CREATED.value
+        assert events[0].payload["id"] == response.json()["id"]
+
+    def test_relay_publishes_in_order(self, event_loop, db_session, relay_factory):
+        """Test events are relayed in batches, oldest first, then removed"""
+        stage_events(db_session, 5)
+        published = []
+        message_queue = AsyncMock()
+        published_ids = []
+
+        def publish_many(events, message_ids):
+            published.extend(data["id"] for _, data in events)
+            published_ids.extend(message_ids)
+
+        message_queue.publish_many.side_effect = publish_many
+        relay = relay_factory(message_queue)
+
+        assert event_loop.run_until_complete(relay.relay_batch()) == 3
+        assert event_loop.run_until_complete(relay.relay_batch()) == 2
+        assert event_loop.run_until_complete(relay.relay_batch()) == 0
+
+        assert published == [f"order-{i}" for i in range(5)]
+        assert len(set(published_ids)) == 5
+        assert db_session.query(OutboxEvent).count() == 0
+
+    def test_relay_keeps_events_on_failure(self, event_loop, db_session, relay_factory):
+        """Test a failed publish leaves the batch in place for a retry"""
+        stage_events(db_session, 2)
+        message_queue = AsyncMock()
+        message_queue.publish_many.side_effect = ConnectionError("broker down")
+        relay = relay_factory(message_queue)
+
+        with pytest.raises(ConnectionError):
+            event_loop.run_until_complete(relay.relay_batch())
+
+        db_session.expire_all()
+        events = db_session.query(OutboxEvent).order_by(OutboxEvent.id).all()
+        assert len(events) == 2
+        assert [event.attempts for event in events] == [1, 0]
+        assert "broker down" in events[0].last_error
+
+    def test_poison_event_set_aside(self, event_loop, db_session, relay_factory):
+        """Test an event that keeps failing is set aside and the rest drain"""
+        stage_events(db_session, 3)
+        published = []
+
+        def publish_many(events, message_ids):
+            if any(data["id"] == "order-0" for _, data in events):
+                raise ValueError("rejected")
+            published.extend(data["id"] for _, data in events)
+
+        message_queue = AsyncMock()
+        message_queue.publish_many.side_effect = publish_many
+        relay = relay_factory(message_queue)
+        relay.max_attempts = 2
+
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                event_loop.run_until_complete(relay.relay_batch())
+        assert message_queue.publish_many.call_args.args[0][0][1]["id"] == "order-0"
+        assert len(message_queue.publish_many.call_args.args[0]) == 1
+
+        assert event_loop.run_until_complete(relay.relay_batch()) == 2
+        assert published == ["order-1", "order-2"]
+        db_session.expire_all()
+        parked = db_session.query(OutboxEvent).one()
+        assert parked.payload["id"] == "order-0"
+        assert parked.dead_lettered_at is not None
+
+    def test_unknown_event_type_set_aside(self, event_loop, db_session, relay_factory):
+        """Test an event of an unknown type does not block the outbox"""
+        stage_events(db_session, 2)
+        oldest = db_session.query(OutboxEvent).order_by(OutboxEvent.id).first()
+        oldest.event_type = "order.exploded"
+        db_session.commit()
+        message_queue = AsyncMock()
+        relay = relay_factory(message_queue)
+
+        assert event_loop.run_until_complete(relay.relay_batch()) == 0
+        assert event_loop.run_until_complete(relay.relay_batch()) == 1
+
+        message_queue.publish_many.assert_awaited_once()
+        db_session.expire_all()
+        assert db_session.query(OutboxEvent).one().dead_lettered_at is not None
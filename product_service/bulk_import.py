@@ -0,0 +1,296 @@
+"""
+Bulk product import from supplier feeds.
+
+``POST /products/import`` takes the request body as a stream of NDJSON (one
+product object per line) or CSV (a header row, then one product per row)
+and never holds the whole feed in memory:
+
+- every row is validated on its own; invalid rows are reported with their
+  row number and do not stop the import
+- valid rows are written in chunks of ``IMPORT_CHUNK_SIZE``, keyed by the
+  supplier ``sku``: one SELECT finds the SKUs already in the catalog, then
+  one multi-row INSERT creates the new products and one executemany UPDATE
+  overwrites the existing ones, in a single transaction per chunk
+- each written chunk is announced by one PRODUCT_UPDATED event carrying all
+  of its products, instead of one event per product
+"""
+
+import asyncio
+import codecs
+import csv
+import logging
+import os
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from shared.schemas import ProductImportRow
+from shared.serialization import loads
+
+from .event_handlers import publish_product_updated
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", 500))
+
+NDJSON = "ndjson"
+CSV = "csv"
+
+
+class ImportFormatError(ValueError):
+    """The feed cannot be read at all, e.g. a CSV without header row"""
+
+
+def feed_format(content_type: Optional[str]) -> Optional[str]:
+    """Feed format of a request Content-Type, None if unsupported"""
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type in ("text/csv", "application/csv"):
+        return CSV
+    if media_type in (
+        "application/x-ndjson",
+        "application/ndjson",
+        "application/jsonl",
+        "application/json-lines",
+    ):
+        return NDJSON
+    return None
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Decoded lines of a byte stream, line endings kept"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line + "\n"
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer
+
+
+async def iter_ndjson(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[int, Any]]:
+    """(row number, decoded object or error message) per non-blank line"""
+    number = 0
+    async for line in lines:
+        number += 1
+        if not line.strip():
+            continue
+        try:
+            yield number, loads(line)
+        except ValueError as e:
+            yield number, f"invalid JSON: {e}"
+
+
+class _NeedMore(Exception):
+    """The buffered lines end inside a CSV record"""
+
+
+class _LineFeed:
+    """
+    Lines for ``csv.reader`` that are pushed in as they are streamed.
+
+    When the reader asks for a line that has not arrived yet, it gets
+    _NeedMore instead; ``rewind`` puts back the lines of the unfinished
+    record, so that the reader parses it again once more lines are in.
+    """
+
+    def __init__(self):
+        self.lines: deque = deque()
+        self.taken: List[str] = []
+        self.done = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if self.lines:
+            line = self.lines.popleft()
+            self.taken.append(line)
+            return line
+        if self.done:
+            raise StopIteration
+        raise _NeedMore
+
+    def rewind(self):
+        self.lines.extendleft(reversed(self.taken))
+        self.taken.clear()
+
+
+async def iter_csv(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[int, Any]]:
+    """
+    (row number, field dict or error message) per CSV record.
+
+    Records are parsed by ``csv.reader``, so quoted fields may span lines
+    and stray quotes inside unquoted fields are kept as they are.
+    """
+    feed = _LineFeed()
+    reader = csv.reader(feed, strict=True)
+    header = None
+    number = 0
+
+    def records():
+        while True:
+            try:
+                fields = next(reader)
+            except _NeedMore:
+                feed.rewind()
+                return
+            except StopIteration:
+                return
+            except csv.Error as e:
+                fields = e
+            feed.taken.clear()
+            yield fields
+
+    async def buffered():
+        async for line in lines:
+            feed.lines.append(line)
+            yield
+        feed.done = True
+        yield
+
+    async for _ in buffered():
+        for fields in records():
+            if fields == []:
+                continue
+            if header is None:
+                if isinstance(fields, csv.Error):
+                    raise ImportFormatError(f"Unreadable CSV header: {fields}")
+                header = [name.strip() for name in fields]
+                continue
+            number += 1
+            if isinstance(fields, csv.Error):
+                yield number, f"malformed CSV: {fields}"
+            elif len(fields) != len(header):
+                yield number, f"expected {len(header)} fields, got {len(fields)}"
+            else:
+                yield number, dict(zip(header, fields))
+    if header is None:
+        raise ImportFormatError("CSV feed has no header row")
+
+
+def validate(number: int, row: Any) -> Tuple[Optional[dict], Optional[dict]]:
+    """(product fields, None) for a valid row, (None, error report) otherwise"""
+    if isinstance(row, str):
+        return None, {"row": number, "sku": None, "errors": [row]}
+    if not isinstance(row, dict):
+        return None, {"row": number, "sku": None, "errors": ["not an object"]}
+    try:
+        return ProductImportRow(**row).dict(), None
+    except ValidationError as e:
+        errors = [
+            f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+            for error in e.errors()
+        ]
+        sku = row.get("sku")
+        return None, {
+            "row": number,
+            "sku": sku if isinstance(sku, str) else None,
+            "errors": errors,
+        }
+
+
+def upsert_chunk(db: Session, rows: List[Dict[str, Any]]) -> Tuple[List[dict], int]:
+    """
+    Create or overwrite a chunk of products by SKU in one transaction.
+
+    Returns the written products and how many of them were created. A later
+    row wins over an earlier one with the same SKU.
+    """
+    by_sku = {row["sku"]: row for row in rows}
+    for attempt in range(2):
+        try:
+            existing = {
+                sku: (product_id, created_at)
+                for sku, product_id, created_at in db.query(
+                    Product.sku, Product.id, Product.created_at
+                ).filter(Product.sku.in_(list(by_sku)))
+            }
+            now = datetime.utcnow()
+            products, created, updated = [], [], []
+            for sku, row in by_sku.items():
+                product_id, created_at = existing.get(sku) or (str(uuid.uuid4()), now)
+                product = {
+                    **row,
+                    "id": product_id,
+                    "created_at": created_at,
+                    "updated_at": now,
+                }
+                products.append(product)
+                if sku in existing:
+                    updated.append(
+                        {
+                            key: value
+                            for key, value in product.items()
+                            if key != "created_at"
+                        }
+                    )
+                else:
+                    created.append(product)
+            if created:
+                db.execute(insert(Product), created)
+            if updated:
+                # Bulk UPDATE by primary key, one executemany
+                db.execute(update(Product), updated)
+            db.commit()
+            return products, len(created)
+        except IntegrityError:
+            # A concurrent import created one of the SKUs; they now update
+            db.rollback()
+            if attempt:
+                raise
+    return [], 0
+
+
+async def import_products(db: Session, feed: str, chunks: AsyncIterator[bytes]) -> dict:
+    """Import a streamed feed and return the per-row report"""
+    lines = iter_lines(chunks)
+    rows = iter_csv(lines) if feed == CSV else iter_ndjson(lines)
+    report = {
+        "received": 0,
+        "created": 0,
+        "updated": 0,
+        "failed": 0,
+        "unpublished": 0,
+        "errors": [],
+    }
+    pending: List[Dict[str, Any]] = []
+
+    async def write():
+        products, created = await asyncio.to_thread(upsert_chunk, db, pending)
+        report["created"] += created
+        # A repeated SKU counts as an update of the row before it
+        report["updated"] += len(pending) - created
+        # 🎯 MESSAGE QUEUE: One event for the whole chunk. The chunk is already
+        # committed, so a failed publish is counted and the import goes on
+        if not await publish_product_updated({"products": products}):
+            report["unpublished"] += len(products)
+        pending.clear()
+
+    async for number, row in rows:
+        report["received"] += 1
+        fields, error = validate(number, row)
+        if error:
+            report["failed"] += 1
+            report["errors"].append(error)
+            continue
+        pending.append(fields)
+        if len(pending) >= IMPORT_CHUNK_SIZE:
+            await write()
+    if pending:
+        await write()
+
+    logger.info(
+        f"Imported {report['created']} new and {report['updated']} updated products, "
+        f"{report['failed']} rows rejected"
+    )
+    return report
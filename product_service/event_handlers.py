@@ -1,43 +1,206 @@
 from shared.message_queue import message_queue, MessageType
+from sqlalchemy import case, update
 from sqlalchemy.orm import Session
+from collections import defaultdict
+from typing import Dict, List
+import asyncio
 import logging
+from .database import get_db
 from .models import Product
+from .reservations import reservations
 
 logger = logging.getLogger(__name__)
 
+LOW_STOCK_THRESHOLD = 10  # Threshold for low inventory
+STOCK_UPDATE_CHUNK = 500  # Products per UPDATE, below Oracle's 1000 IN-list cap
+
+
+def _stock_deltas(messages: List[dict], sign: int) -> Dict[str, int]:
+    """Sum item quantities per product over a batch of order events"""
+    deltas = defaultdict(int)
+    for message in messages:
+        for item in message["data"]["items"]:
+            deltas[item["product_id"]] += sign * item["quantity"]
+    return deltas
+
+
+async def unreserved_orders(messages: List[dict]) -> List[dict]:
+    """
+    Confirm the reservations of reserved orders and return the other ones.
+
+    Stock of a confirmed reservation is written back by the reservation
+    engine, so only orders without one (or whose hold expired before the
+    event arrived) still take their stock here.
+    """
+    remaining = []
+    for message in messages:
+        reservation_id = message["data"].get("reservation_id")
+        if reservation_id and await reservations.confirm(reservation_id):
+            continue
+        remaining.append(message)
+    return remaining
+
+
+def product_payload(product: Product) -> dict:
+    """A product as published in PRODUCT_UPDATED events"""
+    return {
+        column.key: getattr(product, column.key) for column in Product.__table__.columns
+    }
+
+
+def order_product_ids(message: dict) -> List[str]:
+    """Partition key of order events: every product whose stock they change"""
+    return [item["product_id"] for item in message["data"]["items"]]
+
+
+def write_stock(db: Session, deltas: Dict[str, int]) -> Dict[str, int]:
+    """
+    Apply stock changes in one transaction and return the new levels.
+
+    Each chunk of products is changed by a single
+    ``UPDATE ... SET stock = stock + CASE id ... END ... RETURNING``, so the
+    database applies the deltas atomically (no read-modify-write between
+    concurrent consumers) and hands back the new levels without a re-read.
+    """
+    if not deltas:
+        return {}
+
+    product_ids = list(deltas)
+    levels = {}
+    for start in range(0, len(product_ids), STOCK_UPDATE_CHUNK):
+        chunk = product_ids[start : start + STOCK_UPDATE_CHUNK]
+        statement = (
+            update(Product)
+            .where(Product.id.in_(chunk))
+            .values(
+                stock=Product.stock
+                + case({pid: deltas[pid] for pid in chunk}, value=Product.id)
+            )
+            .returning(Product.id, Product.stock)
+            .execution_options(synchronize_session=False)
+        )
+        levels.update(db.execute(statement).all())
+    db.commit()
+    logger.info(f"Updated inventory for {len(levels)} products")
+    return levels
+
+
+def update_stock(db: Session, deltas: Dict[str, int]) -> List[dict]:
+    """Apply stock changes in one transaction and return low-stock alerts"""
+    levels = write_stock(db, deltas)
+    return [
+        {"product_id": product_id, "stock": stock}
+        for product_id, stock in levels.items()
+        if deltas[product_id] < 0 and stock < LOW_STOCK_THRESHOLD
+    ]
+
+
+async def publish_low_stock(alerts: List[dict]):
+    """
+    Publish the low-stock alerts of a committed stock change.
+
+    Best effort: the stock is already taken, so a failed publish must not
+    fail the order events, or they would be retried and take it again.
+    """
+    if not alerts:
+        return
+    try:
+        # One round trip for every low-stock alert of the batch
+        await message_queue.publish_many(
+            (MessageType.INVENTORY_LOW, alert) for alert in alerts
+        )
+    except Exception as e:
+        logger.error(f"Failed to publish {len(alerts)} low-stock alerts: {e}")
 
-async def handle_order_created(message: dict, db: Session):
-    """Handle order creation events - update inventory"""
-    order_data = message["data"]
 
-    for item in order_data["items"]:
-        # Update product inventory
-        product = db.query(Product).filter(Product.id == item["product_id"]).first()
-        if product:
-            product.stock -= item["quantity"]
-            db.commit()
-            logger.info(f"Updated inventory for product {product.id}")
+async def publish_restocked(levels: Dict[str, int]):
+    """
+    Announce the stock levels restored by cancelled orders.
 
-            # Check if inventory is low
-            if product.stock < 10:  # Threshold for low inventory
-                await message_queue.publish_message(
-                    MessageType.INVENTORY_LOW,
-                    {"product_id": product.id, "stock": product.stock},
-                )
+    Sent as partial PRODUCT_UPDATED events, which every replica's category
+    facets and search index apply. Best effort, like the low-stock alerts.
+    """
+    if not levels:
+        return
+    try:
+        await message_queue.publish_many(
+            (MessageType.PRODUCT_UPDATED, {"product_id": product_id, "stock": stock})
+            for product_id, stock in levels.items()
+        )
+    except Exception as e:
+        logger.error(f"Failed to publish {len(levels)} restocked levels: {e}")
+
+
+async def apply_stock_deltas(db: Session, deltas: Dict[str, int]):
+    """Apply stock changes for many products in a single transaction"""
+    await publish_low_stock(update_stock(db, deltas))
+
+
+def _update_stock_in_session(deltas: Dict[str, int]) -> List[dict]:
+    with get_db() as db:
+        return update_stock(db, deltas)
+
+
+def _restock_in_session(deltas: Dict[str, int]) -> Dict[str, int]:
+    with get_db() as db:
+        return write_stock(db, deltas)
+
+
+async def handle_order_created(message: dict, db: Session):
+    """Handle order creation events - update inventory"""
+    messages = await unreserved_orders([message])
+    await apply_stock_deltas(db, _stock_deltas(messages, -1))
 
 
 async def handle_order_cancelled(message: dict, db: Session):
     """Handle order cancellation - restore inventory"""
-    order_data = message["data"]
+    await publish_restocked(write_stock(db, _stock_deltas([message], 1)))
+
+
+async def handle_order_created_batch(messages: List[dict]):
+    """Handle a batch of order creation events in one transaction"""
+    messages = await unreserved_orders(messages)
+    with get_db() as db:
+        await apply_stock_deltas(db, _stock_deltas(messages, -1))
+
+
+async def handle_order_cancelled_batch(messages: List[dict]):
+    """Handle a batch of order cancellations in one transaction"""
+    with get_db() as db:
+        levels = write_stock(db, _stock_deltas(messages, 1))
+    await publish_restocked(levels)
+
+
+async def handle_order_created_partitioned(message: dict):
+    """
+    Handle one order creation on a partition lane.
+
+    The database work runs in a worker thread so that lanes holding
+    different products update stock concurrently.
+    """
+    messages = await unreserved_orders([message])
+    alerts = await asyncio.to_thread(
+        _update_stock_in_session, _stock_deltas(messages, -1)
+    )
+    await publish_low_stock(alerts)
+
+
+async def handle_order_cancelled_partitioned(message: dict):
+    """Handle one order cancellation on a partition lane"""
+    levels = await asyncio.to_thread(_restock_in_session, _stock_deltas([message], 1))
+    await publish_restocked(levels)
 
-    for item in order_data["items"]:
-        product = db.query(Product).filter(Product.id == item["product_id"]).first()
-        if product:
-            product.stock += item["quantity"]
-            db.commit()
-            logger.info(f"Restored inventory for product {product.id}")
 
+async def publish_product_updated(product_data: dict) -> bool:
+    """
+    Publish product update events, returning whether the event went out.
 
-async def publish_product_updated(product_data: dict):
-    """Publish product update events"""
-    await message_queue.publish_message(MessageType.PRODUCT_UPDATED, product_data)
+    Best effort: the change is already committed, so a failed publish must
+    not fail the request, or the client would retry a write that happened.
+    """
+    try:
+        await message_queue.publish_message(MessageType.PRODUCT_UPDATED, product_data)
+    except Exception as e:
+        logger.error(f"Failed to publish product update: {e}")
+        return False
+    return True
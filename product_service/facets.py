@@ -0,0 +1,158 @@
+"""
+Product counts per category, kept in memory for ``/products/facets``.
+
+Every replica holds the category and in-stock flag of each product and
+adjusts the per-category counts as changes arrive, instead of counting
+rows on every request:
+
+- PRODUCT_UPDATED events carry created, updated and deleted products, one
+  at a time or a bulk import chunk at once, stock set through the API and
+  stock returned by cancelled orders
+- INVENTORY_LOW alerts carry stock taken by orders, including products
+  that sell out
+
+Those events are published best effort, so the counts are also reconciled
+against the database every ``FACETS_RECONCILE_INTERVAL`` seconds. The same
+counts are exported as the ``product_inventory_total`` gauge.
+"""
+
+import asyncio
+import logging
+import os
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .database import get_db
+from .models import Product
+
+from monitoring import PRODUCT_INVENTORY
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per round trip while scanning the catalog
+SCAN_BATCH_SIZE = 1000
+
+
+class CategoryFacets:
+    def __init__(self):
+        # product id -> (category, in stock)
+        self.products: Dict[str, Tuple[Optional[str], bool]] = {}
+        self.totals: Dict[Optional[str], int] = defaultdict(int)
+        self.in_stock: Dict[Optional[str], int] = defaultdict(int)
+        # Events received while a reconciliation scans the database
+        self._pending: Optional[List[Dict[str, Any]]] = None
+        # Gauge labels set by the last export
+        self._exported: Set[str] = set()
+
+    def _count(self, product_id: str, sign: int):
+        category, in_stock = self.products[product_id]
+        self.totals[category] += sign
+        self.in_stock[category] += sign * in_stock
+        if not self.totals[category]:
+            del self.totals[category]
+            del self.in_stock[category]
+
+    def set(self, product_id: str, category: Optional[str], stock: Optional[int]):
+        """Count a product, replacing its previous category and stock"""
+        self.remove(product_id)
+        self.products[product_id] = (category, (stock or 0) > 0)
+        self._count(product_id, 1)
+
+    def remove(self, product_id: str):
+        if product_id in self.products:
+            self._count(product_id, -1)
+            del self.products[product_id]
+
+    def apply_event(self, data: Dict[str, Any]):
+        """Apply a product event or a stock change"""
+        if self._pending is not None:
+            self._pending.append(data)
+            return
+        product_id = data.get("id") or data.get("product_id")
+        if "products" in data:
+            # A chunk of a bulk import
+            for product in data["products"]:
+                self.set(product["id"], product["category"], product["stock"])
+        elif data.get("deleted"):
+            self.remove(product_id)
+        elif "category" in data:
+            self.set(product_id, data["category"], data.get("stock"))
+        elif "stock" in data and product_id in self.products:
+            self.set(product_id, self.products[product_id][0], data["stock"])
+        self.export()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "total": len(self.products),
+            "in_stock": sum(self.in_stock.values()),
+            "categories": [
+                {
+                    "category": category,
+                    "products": self.totals[category],
+                    "in_stock": self.in_stock[category],
+                }
+                for category in sorted(self.totals, key=lambda c: c or "")
+            ],
+        }
+
+    def export(self):
+        """Publish the counts as the ``product_inventory_total`` gauge"""
+        exported = set()
+        for category, total in self.totals.items():
+            label = category or ""
+            PRODUCT_INVENTORY.labels(category=label).set(total)
+            exported.add(label)
+        for label in self._exported - exported:
+            PRODUCT_INVENTORY.remove(label)
+        self._exported = exported
+
+    @staticmethod
+    def _scan() -> "CategoryFacets":
+        counted = CategoryFacets()
+        with get_db() as db:
+            rows = db.query(Product.id, Product.category, Product.stock)
+            for product_id, category, stock in rows.yield_per(SCAN_BATCH_SIZE):
+                counted.set(product_id, category, stock)
+        return counted
+
+    async def reconcile(self):
+        """
+        Recount from the database in a worker thread, then swap it in.
+
+        Events that arrive during the scan are applied on top of the fresh
+        counts, so none is lost to the swap.
+        """
+        self._pending = []
+        try:
+            counted = await asyncio.to_thread(self._scan)
+        except BaseException:
+            pending, self._pending = self._pending, None
+            for data in pending:
+                self.apply_event(data)
+            raise
+        pending, self._pending = self._pending, None
+        drifted = counted.totals != self.totals or counted.in_stock != self.in_stock
+        if self.products and drifted:
+            logger.info("Category facets corrected against the database")
+        self.products = counted.products
+        self.totals = counted.totals
+        self.in_stock = counted.in_stock
+        for data in pending:
+            self.apply_event(data)
+        self.export()
+
+    async def handle_event(self, message: dict):
+        self.apply_event(message["data"])
+
+    async def run(self, interval: Optional[float] = None):
+        """Reconcile periodically until cancelled"""
+        interval = interval or float(os.getenv("FACETS_RECONCILE_INTERVAL", 300))
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.reconcile()
+            except Exception as e:
+                logger.error(f"Category facets reconciliation failed: {e}")
+
+
+facets = CategoryFacets()
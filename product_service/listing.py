@@ -0,0 +1,136 @@
+"""
+Product listing queries: filters and the sort orders clients can pick.
+
+Every sort order ends with the primary key, so that keyset cursors point
+at exactly one row. Each order is covered by an index on its own and one
+led by ``category``, so that a filtered or unfiltered listing seeks into
+the index and reads the rows already sorted:
+
+    created_at  ix_products_created_at, ix_products_category_created_at
+    price       ix_products_price, ix_products_category_price
+    name        ix_products_name_id, ix_products_category_name
+
+Price filters are range conditions on the same indexes when sorting by
+price; with another sort they filter the rows read in index order.
+
+Products without a price or name come last in those orders, NULLs sorting
+after every value as in Oracle's ascending indexes.
+
+Lookups of many products by id go through ``products_by_id``, one primary
+key ``IN`` query per chunk of ids.
+"""
+
+from enum import Enum
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Query, Session
+
+from .models import Product
+from .pagination import after, decode_cursor, encode_cursor, keyset_order
+
+# Ids per IN list, below Oracle's limit of 1000 expressions
+ID_CHUNK_SIZE = 500
+# Ids a single batch lookup may ask for
+MAX_BATCH_IDS = 1000
+
+
+class ProductSort(str, Enum):
+    CREATED_AT = "created_at"
+    PRICE = "price"
+    NAME = "name"
+
+
+SORT_COLUMNS = {
+    ProductSort.CREATED_AT: (Product.created_at, Product.id),
+    ProductSort.PRICE: (Product.price, Product.id),
+    ProductSort.NAME: (Product.name, Product.id),
+}
+
+
+def filter_products(
+    query: Query,
+    category: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    in_stock: Optional[bool] = None,
+) -> Query:
+    if category:
+        query = query.filter(Product.category == category)
+    if min_price is not None:
+        query = query.filter(Product.price >= min_price)
+    if max_price is not None:
+        query = query.filter(Product.price <= max_price)
+    if in_stock:
+        query = query.filter(Product.stock > 0)
+    elif in_stock is not None:
+        query = query.filter(or_(Product.stock <= 0, Product.stock.is_(None)))
+    return query
+
+
+def sort_products(
+    query: Query, sort: ProductSort, cursor: Optional[str] = None
+) -> Query:
+    """
+    Order ``query`` by ``sort``, starting after ``cursor`` if given.
+
+    Raises InvalidCursor for a cursor of another sort order.
+    """
+    columns = SORT_COLUMNS[sort]
+    query = query.order_by(*keyset_order(columns))
+    if cursor:
+        query = query.filter(after(columns, decode_cursor(cursor, sort.value, columns)))
+    return query
+
+
+def products_page(
+    query: Query,
+    sort: ProductSort,
+    cursor: Optional[str] = None,
+    size: int = 100,
+    skip: int = 0,
+) -> List[Product]:
+    """
+    Up to ``size`` products of ``query`` in ``sort`` order after ``cursor``.
+
+    Products without a value for the sort come last. A cursor at a value
+    only seeks through the remaining values, so when they run out the page
+    is topped up from the start of the NULLs, a second index range.
+
+    Raises InvalidCursor like ``sort_products``.
+    """
+    products = sort_products(query, sort, cursor).offset(skip).limit(size).all()
+    if cursor and len(products) < size:
+        columns = SORT_COLUMNS[sort]
+        start = decode_cursor(cursor, sort.value, columns)[0]
+        if columns[0].nullable and start is not None:
+            nulls = query.filter(columns[0].is_(None)).order_by(*columns[1:])
+            products += nulls.limit(size - len(products)).all()
+    return products
+
+
+def next_cursor(product: Product, sort: ProductSort) -> str:
+    """Cursor of the page that follows ``product``"""
+    return encode_cursor(
+        sort.value, [getattr(product, column.key) for column in SORT_COLUMNS[sort]]
+    )
+
+
+def products_by_id(db: Session, ids: Sequence[str]) -> Tuple[List[Product], List[str]]:
+    """
+    Products for ``ids`` in the requested order, and the ids not found.
+
+    An id asked for more than once is returned once, at its first position.
+    """
+    wanted = list(dict.fromkeys(ids))
+    found = {}
+    for start in range(0, len(wanted), ID_CHUNK_SIZE):
+        chunk = wanted[start : start + ID_CHUNK_SIZE]
+        found.update(
+            (product.id, product)
+            for product in db.query(Product).filter(Product.id.in_(chunk))
+        )
+    return (
+        [found[product_id] for product_id in wanted if product_id in found],
+        [product_id for product_id in wanted if product_id not in found],
+    )
@@ -6,16 +6,27 @@ from datetime import datetime
 
 
 from .database import Base, engine
-from .routers import products
+from .migrations import ensure_columns, ensure_indexes
+from .routers import products, reservations as reservation_routes
+from .reservations import reservations
+from .facets import facets
+from .search import search_index
 
 from monitoring import monitor_app, track_product_creation, track_product_update
 
+from shared.deadline import install_deadline_middleware
+from shared.dedup import Deduplicator
+from shared.serialization import ORJSONResponse
+
 from contextlib import asynccontextmanager
 import asyncio
 from .event_handlers import (
     message_queue,
-    handle_order_created,
-    handle_order_cancelled,
+    handle_order_created_batch,
+    handle_order_cancelled_batch,
+    handle_order_created_partitioned,
+    handle_order_cancelled_partitioned,
+    order_product_ids,
     MessageType,
 )
 
@@ -25,29 +36,79 @@ load_dotenv()
 
 # Create tables
 Base.metadata.create_all(bind=engine)
+ensure_columns(engine)
+ensure_indexes(engine)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup: Connect to message queue
-    await message_queue.connect()
+    await message_queue.connect(service_name="product_service")
+
+    # Start consuming order events, applying stock changes in batches or,
+    # with INVENTORY_LANES, one order at a time on lanes keyed by product.
+    # Stock updates are not idempotent, so redelivered events are skipped.
+    dedup = Deduplicator()
+    inventory_lanes = int(os.getenv("INVENTORY_LANES", 0))
+    if inventory_lanes:
+        order_created_task = asyncio.create_task(
+            message_queue.consume_partitioned(
+                MessageType.ORDER_CREATED, handle_order_created_partitioned,
+                partition_key=order_product_ids, lanes=inventory_lanes, dedup=dedup
+            )
+        )
+
+        order_cancelled_task = asyncio.create_task(
+            message_queue.consume_partitioned(
+                MessageType.ORDER_CANCELLED, handle_order_cancelled_partitioned,
+                partition_key=order_product_ids, lanes=inventory_lanes, dedup=dedup
+            )
+        )
+    else:
+        order_created_task = asyncio.create_task(
+            message_queue.consume_batches(
+                MessageType.ORDER_CREATED, handle_order_created_batch, dedup=dedup
+            )
+        )
+
+        order_cancelled_task = asyncio.create_task(
+            message_queue.consume_batches(
+                MessageType.ORDER_CANCELLED, handle_order_cancelled_batch, dedup=dedup
+            )
+        )
+    depth_probe_task = asyncio.create_task(message_queue.probe_queue_depth())
 
-    # Start consuming order events
-    order_created_task = asyncio.create_task(
-        message_queue.consume_messages(MessageType.ORDER_CREATED, handle_order_created)
-    )
+    # Expire stock holds and write confirmed reservations back to the database
+    reservations_task = asyncio.create_task(reservations.run())
 
-    order_cancelled_task = asyncio.create_task(
-        message_queue.consume_messages(
-            MessageType.ORDER_CANCELLED, handle_order_cancelled
+    # Every replica keeps its own search index, following product updates
+    # and the stock taken by orders
+    search_tasks = [
+        asyncio.create_task(
+            message_queue.subscribe(message_type, search_index.handle_event)
         )
-    )
+        for message_type in (MessageType.PRODUCT_UPDATED, MessageType.INVENTORY_LOW)
+    ]
+    await search_index.rebuild()
+    search_tasks.append(asyncio.create_task(search_index.run()))
+
+    # Category counts follow product events and the stock taken by orders
+    facet_tasks = [
+        asyncio.create_task(message_queue.subscribe(message_type, facets.handle_event))
+        for message_type in (MessageType.PRODUCT_UPDATED, MessageType.INVENTORY_LOW)
+    ]
+    await facets.reconcile()
+    facet_tasks.append(asyncio.create_task(facets.run()))
 
     yield
 
     # Shutdown: Close connections
     order_created_task.cancel()
     order_cancelled_task.cancel()
+    depth_probe_task.cancel()
+    reservations_task.cancel()
+    for task in search_tasks + facet_tasks:
+        task.cancel()
     await message_queue.close()
 
 
@@ -104,6 +165,7 @@ Complete product management system for the E-commerce Platform with inventory co
         {"name": "search", "description": "Product search and filtering operations"},
     ],
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # CORS middleware
@@ -117,10 +179,14 @@ app.add_middleware(
 
 # Include routers
 app.include_router(products.router)
+app.include_router(reservation_routes.router)
 
 # Setup monitoring
 monitor_app(app, "product_service")
 
+# Reject and cancel requests whose gateway deadline has passed
+install_deadline_middleware(app)
+
 
 @app.get("/health")
 async def health_check():
@@ -0,0 +1,54 @@
+"""
+Schema upgrades for existing product databases.
+
+``create_all`` only creates missing tables, so columns and indexes added
+to the models later are created here at startup when the table lacks them.
+"""
+
+import logging
+
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import SQLAlchemyError
+
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+
+def ensure_columns(engine):
+    """Add the model columns missing from the products table"""
+    inspector = inspect(engine)
+    if not inspector.has_table(Product.__tablename__):
+        return
+    existing = {
+        column["name"].lower()
+        for column in inspector.get_columns(Product.__tablename__)
+    }
+    for column in Product.__table__.columns:
+        if column.name in existing:
+            continue
+        column_type = column.type.compile(dialect=engine.dialect)
+        try:
+            with engine.begin() as connection:
+                connection.execute(
+                    text(
+                        f"ALTER TABLE {Product.__tablename__} "
+                        f"ADD {column.name} {column_type}"
+                    )
+                )
+            logger.info(f"Added column {column.name} to {Product.__tablename__}")
+        except SQLAlchemyError as e:
+            # Another replica may be adding it at the same time
+            logger.warning(f"Could not add column {column.name}: {e}")
+
+
+def ensure_indexes(engine):
+    """Create the model indexes missing from the products table"""
+    if not inspect(engine).has_table(Product.__tablename__):
+        return
+    for index in Product.__table__.indexes:
+        try:
+            index.create(bind=engine, checkfirst=True)
+        except SQLAlchemyError as e:
+            # Another replica may be creating it at the same time
+            logger.warning(f"Could not create index {index.name}: {e}")
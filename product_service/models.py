@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, Float, Integer
+from sqlalchemy import Column, String, DateTime, Float, Integer, Index
 from sqlalchemy.ext.declarative import declarative_base
 import datetime
 
@@ -7,6 +7,17 @@ Base = declarative_base()
 
 class Product(Base):
     __tablename__ = "products"
+    # Listing orders for keyset pagination, with and without a category filter
+    __table_args__ = (
+        Index("ix_products_category_created_at", "category", "created_at", "id"),
+        Index("ix_products_created_at", "created_at", "id"),
+        Index("ix_products_category_price", "category", "price", "id"),
+        Index("ix_products_price", "price", "id"),
+        Index("ix_products_category_name", "category", "name", "id"),
+        Index("ix_products_name_id", "name", "id"),
+        # Supplier SKU, the key of bulk imports
+        Index("ix_products_sku", "sku", unique=True),
+    )
 
     id = Column(String, primary_key=True, index=True)
     name = Column(String, index=True)
@@ -14,6 +25,7 @@ class Product(Base):
     price = Column(Float)
     category = Column(String, index=True)
     stock = Column(Integer, default=0)
+    sku = Column(String(64))
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     updated_at = Column(
         DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow
@@ -21,3 +33,12 @@ class Product(Base):
 
     def __repr__(self):
         return f"<Product(name='{self.name}', price={self.price})>"
+
+
+class ReservationFlush(Base):
+    """A write-back of reserved sales, committed with the stock it changed"""
+
+    __tablename__ = "reservation_flushes"
+
+    id = Column(String, primary_key=True)
+    flushed_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
@@ -0,0 +1,113 @@
+"""
+Keyset (cursor) pagination.
+
+A listing is read in a fixed order over indexed columns that end with the
+primary key, and each page starts right after the last row of the previous
+one: ``WHERE (created_at, id) > (:created_at, :id)``. The database seeks
+into the index instead of reading and discarding ``skip`` rows, so page
+5000 costs the same as page 1, and rows inserted meanwhile neither shift
+nor repeat results.
+
+Cursors are opaque to clients: URL-safe base64 of the sort name and the
+sort key of the last row returned.
+"""
+
+import base64
+from datetime import datetime
+from typing import Any, List, Sequence
+
+from sqlalchemy import and_, false, or_
+
+from shared.serialization import dumps, loads
+
+
+class InvalidCursor(ValueError):
+    """The cursor is malformed or was issued for another sort order"""
+
+
+def encode_cursor(sort: str, values: Sequence[Any]) -> str:
+    payload = dumps({"s": sort, "v": list(values)})
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, columns: Sequence) -> List[Any]:
+    """Sort key values in ``cursor``, typed like ``columns``"""
+    try:
+        payload = loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        values = payload["v"]
+        if payload["s"] != sort or len(values) != len(columns):
+            raise InvalidCursor(f"Cursor does not belong to sort {sort!r}")
+        return [
+            (
+                datetime.fromisoformat(value)
+                if value is not None and column.type.python_type is datetime
+                else value
+            )
+            for column, value in zip(columns, values)
+        ]
+    except InvalidCursor:
+        raise
+    except Exception as e:
+        raise InvalidCursor("Malformed cursor") from e
+
+
+def keyset_order(columns: Sequence) -> list:
+    """
+    ORDER BY clauses for ``columns``, ascending with NULLs last.
+
+    NULLs sort last explicitly so that ``after`` can place them; it is also
+    Oracle's order for ascending indexes, so no sort step is added there.
+    """
+    return [
+        column.asc().nulls_last() if column.nullable else column.asc()
+        for column in columns
+    ]
+
+
+def _greater(column, value):
+    """``column`` after ``value`` in ``keyset_order``"""
+    if value is None:
+        return false()
+    if column.nullable:
+        return or_(column > value, column.is_(None))
+    return column > value
+
+
+def _equal(column, value):
+    return column.is_(None) if value is None else column == value
+
+
+def after(columns: Sequence, values: Sequence[Any]):
+    """
+    Rows strictly after ``values`` in ``keyset_order(columns)``.
+
+    Spelled out as ``a > x OR (a = x AND b > y) ...`` because Oracle has no
+    row value comparison. The redundant ``a >= x`` in front gives the
+    planner a range to seek to; without it SQLite walks the index from its
+    start up to the cursor.
+
+    NULLs of the leading column sort last and are a range of their own:
+    after a NULL only NULLs follow, and after a value only the remaining
+    values are matched, so that the planner keeps its seek. The caller reads
+    the NULLs behind the last value separately (``listing.products_page``).
+    """
+    leading, start = columns[0], values[0]
+    if start is None:
+        if len(columns) == 1:
+            return false()
+        return and_(leading.is_(None), after(columns[1:], values[1:]))
+    return and_(
+        leading >= start,
+        or_(
+            *(
+                and_(
+                    *(
+                        _equal(column, value)
+                        for column, value in zip(columns[:i], values[:i])
+                    ),
+                    _greater(columns[i], values[i]),
+                )
+                for i in range(len(columns))
+            )
+        ),
+    )
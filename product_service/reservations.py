@@ -0,0 +1,403 @@
+"""
+Stock reservations for hot products.
+
+During flash sales thousands of checkouts hit the same few product rows and
+the row lock on ``stock`` serializes them. Reservations take stock from
+atomic Redis counters instead, and the database only sees batched deltas:
+
+- ``reserve`` holds the quantities of all items of a checkout, or none of
+  them, for ``ttl`` seconds
+- ``confirm`` turns a hold into a sale; sales accumulate in a pending hash
+  that ``flush`` writes back to the database with one set-based UPDATE
+- ``release``, or expiry found by ``sweep``, returns held stock
+
+Every check-and-change is a Lua script, so it is atomic in Redis. Keys share
+the ``{inventory}`` hash tag to stay on one Redis Cluster slot:
+
+    {inventory}:available:<product_id>  stock that can still be reserved
+    {inventory}:held                    product_id -> quantity on hold
+    {inventory}:pending                 product_id -> sold, not yet written back
+    {inventory}:flushing                pending deltas being written back
+    {inventory}:flush-id                id of the write-back of flushing
+    {inventory}:flush-epoch             incremented after every write-back
+    {inventory}:reservation:<id>        product_id -> quantity
+    {inventory}:confirmed:<id>          marks a confirmed reservation for a day
+    {inventory}:expiring                reservation ids scored by expiry time
+
+A counter is loaded on first use as database stock + pending + flushing -
+held, and expires after ``counter_ttl`` seconds so that stock changed
+directly in the database (restocks, cancellations) is picked up. A load
+racing a write-back is detected through the flush epoch and retried.
+
+A write-back records its flush id in the same transaction as the stock
+change, so deltas whose retirement from Redis failed are not applied twice.
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+import redis.asyncio as redis
+from sqlalchemy.exc import IntegrityError
+
+from .database import get_db
+from .models import Product, ReservationFlush
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "{inventory}"
+HELD = f"{PREFIX}:held"
+PENDING = f"{PREFIX}:pending"
+FLUSHING = f"{PREFIX}:flushing"
+FLUSH_ID = f"{PREFIX}:flush-id"
+FLUSH_EPOCH = f"{PREFIX}:flush-epoch"
+FLUSH_LOCK = f"{PREFIX}:flush-lock"
+EXPIRING = f"{PREFIX}:expiring"
+# How long a confirmation is remembered, so confirming again is a no-op
+CONFIRMED_TTL = 86400
+# How long applied flush ids are kept to recognise a replayed write-back
+FLUSH_LOG_RETENTION = timedelta(days=1)
+
+# KEYS: held, expiring, reservation, available counters
+# ARGV: reservation id, expires at, item count, product ids..., quantities...
+RESERVE_SCRIPT = """
+local n = tonumber(ARGV[3])
+for i = 1, n do
+    local available = redis.call('GET', KEYS[3 + i])
+    if not available then
+        return {'missing', i}
+    end
+    if tonumber(available) < tonumber(ARGV[3 + n + i]) then
+        return {'short', i}
+    end
+end
+for i = 1, n do
+    local quantity = tonumber(ARGV[3 + n + i])
+    redis.call('DECRBY', KEYS[3 + i], quantity)
+    redis.call('HINCRBY', KEYS[1], ARGV[3 + i], quantity)
+    redis.call('HSET', KEYS[3], ARGV[3 + i], quantity)
+end
+redis.call('ZADD', KEYS[2], ARGV[2], ARGV[1])
+return {'ok', 0}
+"""
+
+# KEYS: reservation, held, pending, expiring, confirmed marker
+# ARGV: reservation id, marker ttl
+CONFIRM_SCRIPT = """
+local items = redis.call('HGETALL', KEYS[1])
+if #items == 0 then
+    return redis.call('EXISTS', KEYS[5])
+end
+for i = 1, #items, 2 do
+    local quantity = tonumber(items[i + 1])
+    redis.call('HINCRBY', KEYS[2], items[i], -quantity)
+    redis.call('HINCRBY', KEYS[3], items[i], -quantity)
+end
+redis.call('DEL', KEYS[1])
+redis.call('ZREM', KEYS[4], ARGV[1])
+redis.call('SET', KEYS[5], 1, 'EX', ARGV[2])
+return 1
+"""
+
+# KEYS: reservation, held, expiring
+# ARGV: reservation id, available counter prefix
+RELEASE_SCRIPT = """
+local items = redis.call('HGETALL', KEYS[1])
+if #items == 0 then
+    return 0
+end
+for i = 1, #items, 2 do
+    local quantity = tonumber(items[i + 1])
+    redis.call('HINCRBY', KEYS[2], items[i], -quantity)
+    local counter = ARGV[2] .. items[i]
+    if redis.call('EXISTS', counter) == 1 then
+        redis.call('INCRBY', counter, quantity)
+    end
+end
+redis.call('DEL', KEYS[1])
+redis.call('ZREM', KEYS[3], ARGV[1])
+return 1
+"""
+
+# KEYS: available counter, held, pending, flushing, flush epoch
+# ARGV: product id, database stock, epoch seen before the read, counter ttl
+LOAD_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 1
+end
+if (redis.call('GET', KEYS[5]) or '0') ~= ARGV[3] then
+    return 0
+end
+local available = tonumber(ARGV[2])
+    + tonumber(redis.call('HGET', KEYS[3], ARGV[1]) or '0')
+    + tonumber(redis.call('HGET', KEYS[4], ARGV[1]) or '0')
+    - tonumber(redis.call('HGET', KEYS[2], ARGV[1]) or '0')
+redis.call('SET', KEYS[1], available, 'EX', ARGV[4])
+return 1
+"""
+
+# KEYS: lock
+# ARGV: token of the holder
+UNLOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class ProductNotFound(LookupError):
+    def __init__(self, product_id: str):
+        super().__init__(f"Product {product_id} not found")
+        self.product_id = product_id
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_id: str):
+        super().__init__(f"Insufficient stock for product {product_id}")
+        self.product_id = product_id
+
+
+class InventoryReservations:
+    def __init__(
+        self,
+        redis_client=None,
+        ttl: int = None,
+        counter_ttl: int = None,
+        flush_interval: float = None,
+    ):
+        self.redis = redis_client or redis.Redis(
+            host=os.getenv("REDIS_HOST", "localhost"),
+            port=int(os.getenv("REDIS_PORT", 6379)),
+            db=0,
+            decode_responses=True,
+        )
+        # Default hold time of a reservation, in seconds
+        self.ttl = ttl or int(os.getenv("RESERVATION_TTL", 600))
+        self.counter_ttl = counter_ttl or int(os.getenv("RESERVATION_COUNTER_TTL", 300))
+        self.flush_interval = flush_interval or float(
+            os.getenv("RESERVATION_FLUSH_INTERVAL", 1)
+        )
+        self._reserve = self.redis.register_script(RESERVE_SCRIPT)
+        self._confirm = self.redis.register_script(CONFIRM_SCRIPT)
+        self._release = self.redis.register_script(RELEASE_SCRIPT)
+        self._load = self.redis.register_script(LOAD_SCRIPT)
+        self._unlock = self.redis.register_script(UNLOCK_SCRIPT)
+
+    @staticmethod
+    def available_key(product_id: str) -> str:
+        return f"{PREFIX}:available:{product_id}"
+
+    @staticmethod
+    def reservation_key(reservation_id: str) -> str:
+        return f"{PREFIX}:reservation:{reservation_id}"
+
+    async def reserve(self, items: Iterable[dict], ttl: Optional[int] = None) -> dict:
+        """
+        Hold stock for every item, or for none of them.
+
+        Raises InsufficientStock naming the first product that is short,
+        or ProductNotFound for an unknown product.
+        """
+        quantities: Dict[str, int] = defaultdict(int)
+        for item in items:
+            quantities[item["product_id"]] += item["quantity"]
+        product_ids = list(quantities)
+
+        reservation_id = str(uuid.uuid4())
+        ttl = ttl or self.ttl
+        expires_at = time.time() + ttl
+        keys = [HELD, EXPIRING, self.reservation_key(reservation_id)] + [
+            self.available_key(product_id) for product_id in product_ids
+        ]
+        args = (
+            [reservation_id, expires_at, len(product_ids)]
+            + product_ids
+            + [quantities[product_id] for product_id in product_ids]
+        )
+
+        # Each retry loads at least one missing counter
+        for _ in range(len(product_ids) + 3):
+            status, index = await self._reserve(keys=keys, args=args)
+            if status == "ok":
+                return {
+                    "reservation_id": reservation_id,
+                    "items": [
+                        {"product_id": product_id, "quantity": quantities[product_id]}
+                        for product_id in product_ids
+                    ],
+                    "expires_at": expires_at,
+                }
+            product_id = product_ids[int(index) - 1]
+            if status == "short":
+                raise InsufficientStock(product_id)
+            await self.load_counters(product_ids)
+        raise RuntimeError("Stock counters keep expiring, giving up reservation")
+
+    async def load_counters(self, product_ids: List[str]):
+        """Seed missing availability counters from the database"""
+        epoch = await self.redis.get(FLUSH_EPOCH) or "0"
+        stock = await asyncio.to_thread(self._read_stock, product_ids)
+        for product_id in product_ids:
+            if product_id not in stock:
+                raise ProductNotFound(product_id)
+            await self._load(
+                keys=[
+                    self.available_key(product_id),
+                    HELD,
+                    PENDING,
+                    FLUSHING,
+                    FLUSH_EPOCH,
+                ],
+                args=[product_id, stock[product_id], epoch, self.counter_ttl],
+            )
+
+    @staticmethod
+    def _read_stock(product_ids: List[str]) -> Dict[str, int]:
+        with get_db() as db:
+            rows = db.query(Product.id, Product.stock).filter(
+                Product.id.in_(product_ids)
+            )
+            return {product_id: stock or 0 for product_id, stock in rows}
+
+    async def confirm(self, reservation_id: str) -> bool:
+        """
+        Turn a hold into a sale.
+
+        Confirming an already confirmed reservation returns True again;
+        False means it expired, was released or never existed.
+        """
+        return bool(
+            await self._confirm(
+                keys=[
+                    self.reservation_key(reservation_id),
+                    HELD,
+                    PENDING,
+                    EXPIRING,
+                    f"{PREFIX}:confirmed:{reservation_id}",
+                ],
+                args=[reservation_id, CONFIRMED_TTL],
+            )
+        )
+
+    async def release(self, reservation_id: str) -> bool:
+        """Return held stock; False if it expired or is unknown"""
+        return bool(
+            await self._release(
+                keys=[self.reservation_key(reservation_id), HELD, EXPIRING],
+                args=[reservation_id, self.available_key("")],
+            )
+        )
+
+    async def sweep(self, limit: int = 500) -> int:
+        """Release reservations whose hold time has passed"""
+        expired = await self.redis.zrangebyscore(
+            EXPIRING, "-inf", time.time(), start=0, num=limit
+        )
+        released = 0
+        for reservation_id in expired:
+            released += await self.release(reservation_id)
+        if released:
+            logger.info(f"Released {released} expired reservations")
+        return released
+
+    async def flush(self) -> int:
+        """
+        Write confirmed sales back to the database.
+
+        Only one replica flushes at a time. Pending deltas are renamed aside
+        first, so sales confirmed during the write-back go to the next one.
+        A write-back that failed is retried before new deltas are taken; once
+        it is committed the deltas are retired at once, and low-stock alerts
+        are only published after that, so they can never cause a second
+        write-back of the same sales. If retiring them fails, the retry
+        finds their flush id already recorded in the database and skips it.
+        """
+        token = str(uuid.uuid4())
+        if not await self.redis.set(
+            FLUSH_LOCK, token, nx=True, ex=max(int(self.flush_interval * 10), 10)
+        ):
+            return 0
+        try:
+            if not await self.redis.exists(FLUSHING):
+                if not await self.redis.exists(PENDING):
+                    return 0
+                async with self.redis.pipeline(transaction=True) as pipe:
+                    pipe.rename(PENDING, FLUSHING)
+                    pipe.set(FLUSH_ID, str(uuid.uuid4()))
+                    await pipe.execute()
+            flush_id = await self.redis.get(FLUSH_ID)
+            if flush_id is None:
+                # Renamed aside before flush ids existed
+                flush_id = str(uuid.uuid4())
+                await self.redis.set(FLUSH_ID, flush_id)
+
+            deltas = {
+                product_id: int(delta)
+                for product_id, delta in (await self.redis.hgetall(FLUSHING)).items()
+                if int(delta)
+            }
+            alerts = await self._write_back(deltas, flush_id) if deltas else []
+
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.delete(FLUSHING, FLUSH_ID)
+                pipe.incr(FLUSH_EPOCH)
+                await pipe.execute()
+        finally:
+            # Only our own lock: it may have expired and been taken meanwhile
+            await self._unlock(keys=[FLUSH_LOCK], args=[token])
+
+        # Imported here: event_handlers imports this module
+        from .event_handlers import publish_low_stock
+
+        await publish_low_stock(alerts)
+        return len(deltas)
+
+    async def _write_back(self, deltas: Dict[str, int], flush_id: str) -> List[dict]:
+        """Commit sales to the database and return low-stock alerts"""
+        alerts = await asyncio.to_thread(self._apply_flush, deltas, flush_id)
+        if alerts is None:
+            logger.warning(f"Reserved sales of flush {flush_id} already written back")
+            return []
+        logger.info(f"Wrote back reserved sales for {len(deltas)} products")
+        return alerts
+
+    @staticmethod
+    def _apply_flush(deltas: Dict[str, int], flush_id: str) -> Optional[List[dict]]:
+        """Apply a flush unless its id is recorded; None if it already was"""
+        # Imported here: event_handlers imports this module
+        from .event_handlers import update_stock
+
+        with get_db() as db:
+            if db.get(ReservationFlush, flush_id):
+                return None
+            db.query(ReservationFlush).filter(
+                ReservationFlush.flushed_at < datetime.utcnow() - FLUSH_LOG_RETENTION
+            ).delete(synchronize_session=False)
+            db.add(ReservationFlush(id=flush_id))
+            try:
+                return update_stock(db, deltas)
+            except IntegrityError:
+                # Another replica committed the same flush in the meantime
+                db.rollback()
+                return None
+
+    async def run(self):
+        """Expire holds and write back sales until cancelled"""
+        while True:
+            try:
+                await self.sweep()
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Reservation maintenance failed: {e}")
+            await asyncio.sleep(self.flush_interval)
+
+
+reservations = InventoryReservations()
@@ -1,15 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import uuid
 from datetime import datetime
 
+from ..bulk_import import ImportFormatError, feed_format, import_products
 from ..database import get_db
 from ..models import Product
-from shared.schemas import ProductCreate, ProductResponse, ProductUpdate
+from ..listing import MAX_BATCH_IDS, ProductSort, filter_products, next_cursor
+from ..listing import products_by_id, products_page
+from ..pagination import InvalidCursor
+from shared.schemas import ProductCreate, ProductFacets, ProductResponse, ProductUpdate
+from shared.schemas import ProductBatch, ProductBatchRequest, ProductImportReport
 
 from dependencies import get_product_or_404
-from ..event_handlers import publish_product_updated
+from ..event_handlers import product_payload, publish_product_updated
+from ..facets import facets
+from ..search import search_index
 
 
 router = APIRouter(prefix="/products", tags=["products"])
@@ -28,30 +36,130 @@ async def create_product(product: ProductCreate, db: Session = Depends(get_db)):
         price=product.price,
         category=product.category,
         stock=product.stock,
+        sku=product.sku,
     )
 
     db.add(db_product)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"A product with SKU {product.sku} already exists",
+        )
     db.refresh(db_product)
 
+    # 🎯 MESSAGE QUEUE: Every replica indexes the new product for search
+    await publish_product_updated(product_payload(db_product))
+
     return db_product  # FastAPI automatically converts to ProductResponse
 
 
+@router.post("/import", response_model=ProductImportReport)
+async def bulk_import_products(request: Request, db: Session = Depends(get_db)):
+    """
+    REST API: Create or update products in bulk from a streamed feed.
+
+    The body is NDJSON (application/x-ndjson) or CSV with a header row
+    (text/csv). Rows are matched to existing products by ``sku``; invalid
+    rows are skipped and listed in the report.
+    """
+    feed = feed_format(request.headers.get("content-type"))
+    if feed is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Send text/csv or application/x-ndjson",
+        )
+    try:
+        return await import_products(db, feed, request.stream())
+    except ImportFormatError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
 @router.get("/", response_model=List[ProductResponse])
 async def get_products(
+    request: Request,
+    response: Response,
     category: Optional[str] = Query(None, description="Filter by category"),
-    skip: int = Query(0, ge=0),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    in_stock: Optional[bool] = Query(None, description="Only products (not) in stock"),
+    sort: ProductSort = Query(ProductSort.CREATED_AT, description="Ascending sort key"),
+    cursor: Optional[str] = Query(
+        None, description="X-Next-Cursor of the previous page, same sort"
+    ),
+    skip: int = Query(0, ge=0, description="Deprecated, use cursor"),
     limit: int = Query(100, ge=1, le=1000),
     db: Session = Depends(get_db),
 ):
-    """REST API: Get products"""
-    query = db.query(Product)
+    """
+    REST API: Get products, oldest first unless another sort is given.
+
+    Pages are keyset-paginated: when more products follow, the response
+    carries an opaque X-Next-Cursor header and a Link header to the next page.
+    """
+    query = filter_products(db.query(Product), category, min_price, max_price, in_stock)
+
+    try:
+        # One extra row tells whether there is a next page
+        products = products_page(
+            query, sort, cursor, size=limit + 1, skip=0 if cursor else skip
+        )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if len(products) > limit:
+        products = products[:limit]
+        next_page = next_cursor(products[-1], sort)
+        next_url = request.url.remove_query_params("skip").include_query_params(
+            cursor=next_page
+        )
+        response.headers["X-Next-Cursor"] = next_page
+        response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return products  # FastAPI automatically converts to ProductResponse
 
-    if category:
-        query = query.filter(Product.category == category)
 
-    products = query.offset(skip).limit(limit).all()
-    return products  # FastAPI automatically converts to ProductResponse
+@router.get("/search", response_model=List[ProductResponse])
+async def search_products(
+    q: str = Query(..., min_length=1, description="Search words, prefixes match too"),
+    category: Optional[str] = Query(None, description="Filter by category"),
+    limit: int = Query(20, ge=1, le=100),
+):
+    """REST API: Full-text product search, best match first, served from memory"""
+    return search_index.search(q, limit, category)
+
+
+@router.get("/facets", response_model=ProductFacets)
+async def get_product_facets():
+    """REST API: Product and in-stock counts per category, served from memory"""
+    return facets.snapshot()
+
+
+def _product_batch(db: Session, ids: List[str]) -> dict:
+    if len(ids) > MAX_BATCH_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {MAX_BATCH_IDS} ids per request",
+        )
+    products, missing = products_by_id(db, ids)
+    return {"products": products, "missing": missing}
+
+
+@router.get("/batch", response_model=ProductBatch)
+async def get_products_batch(
+    ids: List[str] = Query(..., description="Product ids, comma-separated or repeated"),
+    db: Session = Depends(get_db),
+):
+    """REST API: Get many products by id in one query, in the requested order"""
+    return _product_batch(db, [i for value in ids for i in value.split(",") if i])
+
+
+@router.post("/batch", response_model=ProductBatch)
+async def post_products_batch(
+    batch: ProductBatchRequest, db: Session = Depends(get_db)
+):
+    """REST API: Same as GET /products/batch, for id lists too long for a URL"""
+    return _product_batch(db, batch.ids)
 
 
 @router.get("/{product_id}", response_model=ProductResponse)
@@ -75,7 +183,7 @@ async def update_product(
     db.refresh(product)
 
     # 🎯 MESSAGE QUEUE: Publish product update event
-    await publish_product_updated(product.__dict__)
+    await publish_product_updated(product_payload(product))
 
     return product  # FastAPI automatically converts to ProductResponse
 
@@ -87,6 +195,9 @@ async def delete_product(
     db.delete(product)
     db.commit()
 
+    # 🎯 MESSAGE QUEUE: Drop the product from every replica's search index
+    await publish_product_updated({"id": product.id, "deleted": True})
+
 
 @router.get("/{product_id}/stock", response_model=dict)
 async def get_product_stock(product: Product = Depends(get_product_or_404)):
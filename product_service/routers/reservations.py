@@ -0,0 +1,43 @@
+from fastapi import APIRouter, HTTPException, status
+
+from shared.schemas import ReservationCreate, ReservationResponse
+
+from ..reservations import InsufficientStock, ProductNotFound, reservations
+
+router = APIRouter(prefix="/reservations", tags=["inventory"])
+
+
+@router.post(
+    "/", response_model=ReservationResponse, status_code=status.HTTP_201_CREATED
+)
+async def create_reservation(request: ReservationCreate):
+    """Hold stock for every item of a checkout, or for none of them"""
+    try:
+        return await reservations.reserve(
+            [item.dict() for item in request.items], ttl=request.ttl
+        )
+    except ProductNotFound as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except InsufficientStock as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+
+@router.post("/{reservation_id}/confirm", response_model=dict)
+async def confirm_reservation(reservation_id: str):
+    """Turn held stock into a sale; safe to repeat"""
+    if not await reservations.confirm(reservation_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Reservation not found or expired",
+        )
+    return {"reservation_id": reservation_id, "status": "confirmed"}
+
+
+@router.delete("/{reservation_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def release_reservation(reservation_id: str):
+    """Return held stock before the reservation expires"""
+    if not await reservations.release(reservation_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Reservation not found or expired",
+        )
@@ -0,0 +1,226 @@
+"""
+In-process full-text search over the product catalog.
+
+Every replica keeps an inverted index of product name, description and
+category in memory and answers ``/products/search`` from it, without
+touching the database:
+
+- text is lowercased and split on anything that is not a letter or digit
+- hits are ranked with BM25; a term found in the name counts more than one
+  in the category, which counts more than one in the description
+- every query word also matches the words it is a prefix of ("head"
+  finds "headphones"), ranked below an exact match
+
+The index is built at startup from a streaming scan of the products table
+and then follows PRODUCT_UPDATED events and the INVENTORY_LOW alerts of
+stock taken by orders, which every replica receives on its own queue. It
+is rebuilt every ``SEARCH_REINDEX_INTERVAL`` seconds to catch changes made
+without an event, such as stock taken while staying above the threshold.
+"""
+
+import asyncio
+import bisect
+import heapq
+import logging
+import math
+import os
+import re
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from .database import get_db
+from .event_handlers import product_payload
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+FIELD_WEIGHTS = {"name": 3.0, "category": 2.0, "description": 1.0}
+# Score factor of a prefix match relative to an exact one
+PREFIX_WEIGHT = 0.5
+# Words a query word may expand to by prefix
+MAX_EXPANSIONS = 50
+# Rows fetched per round trip while scanning the catalog
+SCAN_BATCH_SIZE = 1000
+
+K1 = 1.2
+B = 0.75
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower()) if text else []
+
+
+class SearchIndex:
+    def __init__(self):
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        # term -> {product id: field-weighted term frequency}
+        self.postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self.lengths: Dict[str, float] = {}
+        self.terms: List[str] = []  # sorted, for prefix lookups
+        self.total_length = 0.0
+        # Events received while a rebuild scans the database
+        self._pending: Optional[List[Dict[str, Any]]] = None
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def add(self, document: Dict[str, Any], sort_terms: bool = True):
+        """
+        Index a product, replacing its previous version.
+
+        With ``sort_terms`` off, new terms are not added to the sorted
+        vocabulary; a bulk build sorts it once at the end instead.
+        """
+        product_id = document["id"]
+        self.remove(product_id)
+
+        frequencies: Dict[str, float] = defaultdict(float)
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(document.get(field)):
+                frequencies[term] += weight
+        for term, frequency in frequencies.items():
+            postings = self.postings[term]
+            if not postings and sort_terms:
+                bisect.insort(self.terms, term)
+            postings[product_id] = frequency
+
+        length = sum(frequencies.values())
+        self.documents[product_id] = document
+        self.lengths[product_id] = length
+        self.total_length += length
+
+    def remove(self, product_id: str):
+        document = self.documents.pop(product_id, None)
+        if document is None:
+            return
+        self.total_length -= self.lengths.pop(product_id)
+        for field in FIELD_WEIGHTS:
+            for term in tokenize(document.get(field)):
+                postings = self.postings.get(term)
+                if postings is None or postings.pop(product_id, None) is None:
+                    continue
+                if not postings:
+                    del self.postings[term]
+                    del self.terms[bisect.bisect_left(self.terms, term)]
+
+    def apply_event(self, data: Dict[str, Any]):
+        """Apply a product event: products, a deletion or a stock change"""
+        if self._pending is not None:
+            self._pending.append(data)
+            return
+        if "products" in data:
+            # A chunk of a bulk import
+            for product in data["products"]:
+                self.add(product)
+            return
+        product_id = data.get("id") or data.get("product_id")
+        if data.get("deleted"):
+            self.remove(product_id)
+        elif all(field in data for field in FIELD_WEIGHTS):
+            self.add(data)
+        elif product_id in self.documents:
+            # Partial update (stock): text fields, and so postings, are unchanged
+            self.documents[product_id] = {**self.documents[product_id], **data}
+            self.documents[product_id].pop("product_id", None)
+
+    def _expand(self, word: str) -> List[tuple]:
+        """Indexed terms matching ``word``, with their score weight"""
+        matches = []
+        start = bisect.bisect_left(self.terms, word)
+        for term in self.terms[start : start + MAX_EXPANSIONS]:
+            if not term.startswith(word):
+                break
+            matches.append((term, 1.0 if term == word else PREFIX_WEIGHT))
+        return matches
+
+    def search(
+        self, query: str, limit: int = 20, category: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Best ``limit`` products for ``query``, highest score first"""
+        words = tokenize(query)
+        if not words or not self.documents:
+            return []
+
+        count = len(self.documents)
+        average_length = self.total_length / count or 1.0
+        scores: Dict[str, float] = defaultdict(float)
+        for word in dict.fromkeys(words):
+            # A product scores once per query word, by its best matching term
+            best: Dict[str, float] = {}
+            for term, weight in self._expand(word):
+                postings = self.postings[term]
+                idf = math.log(
+                    1 + (count - len(postings) + 0.5) / (len(postings) + 0.5)
+                )
+                for product_id, frequency in postings.items():
+                    norm = K1 * (1 - B + B * self.lengths[product_id] / average_length)
+                    score = weight * idf * frequency * (K1 + 1) / (frequency + norm)
+                    if score > best.get(product_id, 0.0):
+                        best[product_id] = score
+            for product_id, score in best.items():
+                scores[product_id] += score
+
+        if category:
+            scores = {
+                product_id: score
+                for product_id, score in scores.items()
+                if self.documents[product_id].get("category") == category
+            }
+        top = heapq.nlargest(limit, scores.items(), key=lambda hit: hit[1])
+        return [self.documents[product_id] for product_id, _ in top]
+
+    @staticmethod
+    def _scan() -> "SearchIndex":
+        index = SearchIndex()
+        with get_db() as db:
+            for product in db.query(Product).yield_per(SCAN_BATCH_SIZE):
+                index.add(product_payload(product), sort_terms=False)
+        index.terms = sorted(index.postings)
+        return index
+
+    async def rebuild(self):
+        """
+        Rebuild from the database in a worker thread, then swap it in.
+
+        Events that arrive during the scan are held back and applied on top
+        of the new index, so none is lost to the swap.
+        """
+        start = time.perf_counter()
+        self._pending = []
+        try:
+            fresh = await asyncio.to_thread(self._scan)
+        except BaseException:
+            pending, self._pending = self._pending, None
+            for data in pending:
+                self.apply_event(data)
+            raise
+        pending, self._pending = self._pending, None
+        self.documents = fresh.documents
+        self.postings = fresh.postings
+        self.lengths = fresh.lengths
+        self.terms = fresh.terms
+        self.total_length = fresh.total_length
+        for data in pending:
+            self.apply_event(data)
+        logger.info(
+            f"Indexed {len(self)} products for search "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
+
+    async def handle_event(self, message: dict):
+        self.apply_event(message["data"])
+
+    async def run(self, interval: Optional[float] = None):
+        """Rebuild periodically until cancelled"""
+        interval = interval or float(os.getenv("SEARCH_REINDEX_INTERVAL", 3600))
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.rebuild()
+            except Exception as e:
+                logger.error(f"Search index rebuild failed: {e}")
+
+
+search_index = SearchIndex()
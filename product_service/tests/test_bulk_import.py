@@ -0,0 +1,157 @@
+import pytest
+from unittest.mock import AsyncMock
+
+from product_service import bulk_import, event_handlers
+from product_service.bulk_import import (
+    ImportFormatError,
+    iter_csv,
+    iter_lines,
+    iter_ndjson,
+)
+from product_service.models import Product
+
+CSV_FEED = (
+    "sku,name,description,price,category,stock\r\n"
+    'SKU-1,Lamp,"Warm light,\r\n""dimmable""",19.5,home,4\r\n'
+    "SKU-2,Chair,,not-a-price,home,2\r\n"
+    "SKU-3,Mug,Café mug,7,kitchen,0\r\n"
+)
+
+
+async def stream(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start : start + size]
+
+
+def collect(event_loop, rows):
+    async def run():
+        return [row async for row in rows]
+
+    return event_loop.run_until_complete(run())
+
+
+@pytest.fixture
+def published(monkeypatch):
+    publish = AsyncMock()
+    monkeypatch.setattr(bulk_import, "publish_product_updated", publish)
+    return publish
+
+
+class TestFeedParsing:
+    def test_csv_records_across_chunks(self, event_loop):
+        """Test CSV records survive chunk splits inside quotes and UTF-8 characters"""
+        rows = collect(event_loop, iter_csv(iter_lines(stream(CSV_FEED.encode(), 7))))
+
+        assert [number for number, _ in rows] == [1, 2, 3]
+        assert rows[0][1]["description"] == 'Warm light,\r\n"dimmable"'
+        assert rows[2][1]["description"] == "Café mug"
+
+    def test_csv_stray_quote_in_field(self, event_loop):
+        """Test a quote inside an unquoted field does not swallow later records"""
+        feed = (
+            "sku,name,price,category,stock\n"
+            'A1,TV 55" OLED,999,tv,3\n'
+            "A2,Remote,19,tv,10\n"
+            "A3,Cable,5,tv,40\n"
+        )
+        rows = collect(event_loop, iter_csv(iter_lines(stream(feed.encode(), 6))))
+
+        assert [number for number, _ in rows] == [1, 2, 3]
+        assert rows[0][1]["name"] == 'TV 55" OLED'
+        assert rows[2][1]["sku"] == "A3"
+
+    def test_csv_unterminated_quote(self, event_loop):
+        """Test a quoted field left open at the end of the feed is reported"""
+        feed = b'sku,name\nA1,Lamp\nA2,"Chair\n'
+        rows = collect(event_loop, iter_csv(iter_lines(stream(feed, 4))))
+
+        assert rows[0] == (1, {"sku": "A1", "name": "Lamp"})
+        assert rows[1][0] == 2 and rows[1][1].startswith("malformed CSV")
+
+    def test_csv_without_header(self, event_loop):
+        """Test an empty CSV feed is rejected as a whole"""
+        with pytest.raises(ImportFormatError):
+            collect(event_loop, iter_csv(iter_lines(stream(b"\n", 10))))
+
+    def test_ndjson_reports_bad_lines(self, event_loop):
+        """Test NDJSON rows are numbered by line and bad JSON is reported"""
+        feed = b'{"sku": "A"}\n\n{oops\n{"sku": "B"}'
+        rows = collect(event_loop, iter_ndjson(iter_lines(stream(feed, 5))))
+
+        assert rows[0] == (1, {"sku": "A"})
+        assert rows[1][0] == 3 and rows[1][1].startswith("invalid JSON")
+        assert rows[2] == (4, {"sku": "B"})
+
+
+class TestBulkImport:
+    def test_csv_import_with_errors(self, client, db_session, published):
+        """Test valid rows are created and invalid ones reported by row"""
+        response = client.post(
+            "/products/import",
+            content=CSV_FEED.encode(),
+            headers={"Content-Type": "text/csv"},
+        )
+
+        assert response.status_code == 200
+        report = response.json()
+        assert (report["received"], report["created"], report["failed"]) == (3, 2, 1)
+        assert report["errors"][0]["row"] == 2
+        assert report["errors"][0]["sku"] == "SKU-2"
+        assert report["errors"][0]["errors"][0].startswith("price")
+        assert db_session.query(Product).filter(Product.sku == "SKU-3").one().stock == 0
+
+    def test_failed_publish_keeps_importing(self, client, db_session, monkeypatch):
+        """Test a chunk whose event is not sent is counted and later chunks land"""
+        monkeypatch.setattr(bulk_import, "IMPORT_CHUNK_SIZE", 1)
+        publish = AsyncMock(side_effect=[ConnectionError("broker down"), None])
+        monkeypatch.setattr(event_handlers.message_queue, "publish_message", publish)
+
+        response = client.post(
+            "/products/import",
+            content=CSV_FEED.encode(),
+            headers={"Content-Type": "text/csv"},
+        )
+
+        assert response.status_code == 200
+        report = response.json()
+        assert (report["created"], report["unpublished"]) == (2, 1)
+        assert publish.await_count == 2
+        assert db_session.query(Product).count() == 2
+
+    def test_reimport_updates_by_sku(self, client, db_session, published, monkeypatch):
+        """Test a second import updates existing SKUs, one event per chunk"""
+        monkeypatch.setattr(bulk_import, "IMPORT_CHUNK_SIZE", 2)
+        line = '{{"sku": "SKU-{0}", "name": "Item {0}", "description": "", "price": {1}, "category": "misc", "stock": 1}}\n'
+        first = "".join(line.format(i, 1.0) for i in range(3)).encode()
+        client.post(
+            "/products/import",
+            content=first,
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+        ids = dict(db_session.query(Product.sku, Product.id))
+        published.reset_mock()
+
+        second = "".join(line.format(i, 2.0) for i in range(1, 5)).encode()
+        report = client.post(
+            "/products/import",
+            content=second,
+            headers={"Content-Type": "application/x-ndjson"},
+        ).json()
+
+        assert (report["created"], report["updated"]) == (2, 2)
+        db_session.expire_all()
+        products = {p.sku: p for p in db_session.query(Product)}
+        assert len(products) == 5
+        assert products["SKU-0"].price == 1.0
+        assert products["SKU-1"].price == 2.0 and products["SKU-1"].id == ids["SKU-1"]
+        assert published.await_count == 2
+        chunk = published.await_args_list[0].args[0]["products"]
+        assert [p["sku"] for p in chunk] == ["SKU-1", "SKU-2"]
+
+    def test_unsupported_content_type(self, client, db_session):
+        """Test feeds other than CSV and NDJSON are refused"""
+        response = client.post(
+            "/products/import", content=b"{}", headers={"Content-Type": "text/plain"}
+        )
+
+        assert response.status_code == 415
@@ -0,0 +1,156 @@
+import pytest
+from contextlib import contextmanager
+from unittest.mock import AsyncMock
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from product_service import event_handlers
+from product_service.event_handlers import _stock_deltas, update_stock
+from product_service.models import Base, Product
+
+
+@pytest.fixture
+def db():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all(
+        [
+            Product(id="prod-1", name="Mouse", price=20.0, category="tech", stock=50),
+            Product(id="prod-2", name="Cable", price=5.0, category="tech", stock=12),
+        ]
+    )
+    session.commit()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def failing_publish(db, monkeypatch):
+    """Handlers use the test session and every alert publish fails"""
+
+    @contextmanager
+    def get_db():
+        yield db
+
+    publish = AsyncMock(side_effect=ConnectionError("broker down"))
+    monkeypatch.setattr(event_handlers, "get_db", get_db)
+    monkeypatch.setattr(event_handlers.message_queue, "publish_many", publish)
+    return publish
+
+
+def order(*items):
+    return {
+        "data": {
+            "items": [
+                {"product_id": product_id, "quantity": quantity}
+                for product_id, quantity in items
+            ]
+        }
+    }
+
+
+class TestUpdateStock:
+    def test_deltas_applied(self, db):
+        """Test stock changes of several orders are summed and applied"""
+        deltas = _stock_deltas(
+            [order(("prod-1", 2), ("prod-2", 1)), order(("prod-1", 3))], -1
+        )
+
+        update_stock(db, deltas)
+
+        stock = dict(db.query(Product.id, Product.stock).all())
+        assert stock == {"prod-1": 45, "prod-2": 11}
+
+    def test_single_update_statement(self, db):
+        """Test one UPDATE and no SELECT is issued for a batch"""
+        statements = []
+        event.listen(
+            db.get_bind(),
+            "before_cursor_execute",
+            lambda conn, cursor, sql, *args: statements.append(sql.split()[0]),
+        )
+
+        update_stock(db, {"prod-1": -1, "prod-2": -1})
+
+        assert statements == ["UPDATE"]
+
+    def test_large_batches_chunked(self, db, monkeypatch):
+        """Test products are updated in chunks below the IN-list limit"""
+        monkeypatch.setattr(event_handlers, "STOCK_UPDATE_CHUNK", 1)
+
+        update_stock(db, {"prod-1": -1, "prod-2": 4})
+
+        stock = dict(db.query(Product.id, Product.stock).all())
+        assert stock == {"prod-1": 49, "prod-2": 16}
+
+    def test_low_stock_from_returned_levels(self, db):
+        """Test low-stock alerts use the levels returned by the update"""
+        alerts = update_stock(db, {"prod-1": -1, "prod-2": -5})
+
+        assert alerts == [{"product_id": "prod-2", "stock": 7}]
+
+    def test_restock_raises_no_alert(self, db):
+        """Test increasing stock never reports it as low"""
+        db.query(Product).filter(Product.id == "prod-2").update({"stock": 1})
+        db.commit()
+
+        assert update_stock(db, {"prod-2": 2}) == []
+
+    def test_unknown_product_ignored(self, db):
+        """Test deltas for missing products change nothing"""
+        assert update_stock(db, {"prod-9": -1}) == []
+
+
+class TestReservedOrders:
+    def test_confirmed_reservations_skip_database(self, event_loop, monkeypatch):
+        """Test orders whose reservation is confirmed take no stock again"""
+        confirmed = {"res-1"}
+
+        async def confirm(reservation_id):
+            return reservation_id in confirmed
+
+        monkeypatch.setattr(event_handlers.reservations, "confirm", confirm)
+        reserved = order(("prod-1", 1))
+        reserved["data"]["reservation_id"] = "res-1"
+        expired = order(("prod-1", 2))
+        expired["data"]["reservation_id"] = "res-2"
+        plain = order(("prod-2", 1))
+
+        remaining = event_loop.run_until_complete(
+            event_handlers.unreserved_orders([reserved, expired, plain])
+        )
+
+        assert remaining == [expired, plain]
+
+
+class TestLowStockAlerts:
+    def test_failed_publish_keeps_batch_applied(
+        self, db, failing_publish, event_loop
+    ):
+        """Test a failed alert publish does not fail the committed batch"""
+        event_loop.run_until_complete(
+            event_handlers.handle_order_created_batch([order(("prod-2", 5))])
+        )
+
+        failing_publish.assert_awaited_once()
+        db.expire_all()
+        assert db.get(Product, "prod-2").stock == 7
+
+    def test_failed_publish_keeps_lane_order_applied(
+        self, db, failing_publish, event_loop
+    ):
+        """Test a partitioned order is not failed by its alert publish"""
+        event_loop.run_until_complete(
+            event_handlers.handle_order_created_partitioned(order(("prod-2", 5)))
+        )
+
+        failing_publish.assert_awaited_once()
+        db.expire_all()
+        assert db.get(Product, "prod-2").stock == 7
@@ -0,0 +1,128 @@
+from unittest.mock import AsyncMock, patch
+
+from prometheus_client import REGISTRY
+
+from product_service import event_handlers
+from product_service.facets import CategoryFacets
+
+
+def product(product_id, category, stock=5):
+    return {"id": product_id, "name": product_id, "category": category, "stock": stock}
+
+
+def counts(facets):
+    return {
+        entry["category"]: (entry["products"], entry["in_stock"])
+        for entry in facets.snapshot()["categories"]
+    }
+
+
+def gauge(category):
+    return REGISTRY.get_sample_value("product_inventory_total", {"category": category})
+
+
+class TestCategoryFacets:
+    def test_counts_products_per_category(self):
+        """Test products and in-stock products are counted per category"""
+        facets = CategoryFacets()
+        facets.apply_event(product("a", "books"))
+        facets.apply_event(product("b", "books", stock=0))
+        facets.apply_event(product("c", "toys"))
+
+        assert counts(facets) == {"books": (2, 1), "toys": (1, 1)}
+        snapshot = facets.snapshot()
+        assert snapshot["total"] == 3
+        assert snapshot["in_stock"] == 2
+
+    def test_update_moves_product_between_categories(self):
+        """Test re-categorizing a product moves its count"""
+        facets = CategoryFacets()
+        facets.apply_event(product("a", "books"))
+        facets.apply_event(product("a", "toys"))
+
+        assert counts(facets) == {"toys": (1, 1)}
+
+    def test_stock_changes(self):
+        """Test stock events flip a product in and out of stock"""
+        facets = CategoryFacets()
+        facets.apply_event(product("a", "books"))
+        # Low-stock alert of an order that sold the product out
+        facets.apply_event({"product_id": "a", "stock": 0})
+        assert counts(facets) == {"books": (1, 0)}
+
+        facets.apply_event({"product_id": "a", "stock": 12})
+        assert counts(facets) == {"books": (1, 1)}
+
+        # Stock of a product never counted is ignored
+        facets.apply_event({"product_id": "unknown", "stock": 3})
+        assert facets.snapshot()["total"] == 1
+
+    def test_delete_drops_empty_category(self):
+        """Test deleting the last product of a category removes the category"""
+        facets = CategoryFacets()
+        facets.apply_event(product("a", "books"))
+        facets.apply_event(product("b", "toys"))
+        facets.apply_event({"id": "a", "deleted": True})
+
+        assert counts(facets) == {"toys": (1, 1)}
+
+    def test_gauge_follows_counts(self):
+        """Test the product_inventory_total gauge exports the same counts"""
+        facets = CategoryFacets()
+        facets.apply_event(product("a", "gauge-books"))
+        facets.apply_event(product("b", "gauge-books"))
+        assert gauge("gauge-books") == 2
+
+        facets.apply_event({"id": "a", "deleted": True})
+        facets.apply_event({"id": "b", "deleted": True})
+        assert gauge("gauge-books") is None
+
+    def test_reconcile_replays_events_received_during_scan(self, event_loop):
+        """Test reconciliation swaps in database counts, keeping newer events"""
+        facets = CategoryFacets()
+        facets.apply_event(product("a", "books"))
+
+        def scan():
+            facets.apply_event(product("c", "games"))
+            counted = CategoryFacets()
+            counted.set("a", "books", 0)
+            counted.set("b", "toys", 4)
+            return counted
+
+        with patch.object(CategoryFacets, "_scan", side_effect=scan):
+            event_loop.run_until_complete(facets.reconcile())
+
+        assert counts(facets) == {
+            "books": (1, 0),
+            "games": (1, 1),
+            "toys": (1, 1),
+        }
+
+    def test_cancellation_restock_counted(self, event_loop, monkeypatch):
+        """Test stock returned by a cancelled order reaches the counts"""
+        facets = CategoryFacets()
+        facets.apply_event(product("a", "lamps", stock=0))
+        published = []
+
+        async def publish_many(events):
+            for message_type, data in events:
+                published.append(message_type)
+                facets.apply_event(data)
+
+        monkeypatch.setattr(
+            event_handlers, "_restock_in_session", lambda deltas: {"a": 2}
+        )
+        monkeypatch.setattr(
+            event_handlers.message_queue,
+            "publish_many",
+            AsyncMock(side_effect=publish_many),
+        )
+
+        event_loop.run_until_complete(
+            event_handlers.handle_order_cancelled_partitioned(
+                {"data": {"items": [{"product_id": "a", "quantity": 2}]}}
+            )
+        )
+
+        assert published == [event_handlers.MessageType.PRODUCT_UPDATED]
+        assert counts(facets) == {"lamps": (1, 1)}
@@ -0,0 +1,88 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import oracle
+from sqlalchemy.orm import sessionmaker
+
+from product_service.models import Base, Product
+from product_service.pagination import (
+    InvalidCursor,
+    after,
+    decode_cursor,
+    encode_cursor,
+    keyset_order,
+)
+
+ORDER = (Product.created_at, Product.id)
+
+
+class TestCursors:
+    def test_round_trip(self):
+        """Test a cursor decodes to the typed sort key it was made from"""
+        created_at = datetime(2024, 5, 1, 12, 30, 15, 250000)
+        cursor = encode_cursor("created_at", [created_at, "prod-1"])
+
+        assert decode_cursor(cursor, "created_at", ORDER) == [created_at, "prod-1"]
+
+    def test_cursor_is_url_safe(self):
+        """Test cursors need no escaping in query strings"""
+        cursor = encode_cursor("created_at", [datetime(2024, 1, 1), "a/b+c?"])
+
+        assert all(c.isalnum() or c in "-_" for c in cursor)
+
+    def test_other_sort_rejected(self):
+        """Test a cursor cannot be replayed against another sort order"""
+        cursor = encode_cursor("name", ["Mouse", "prod-1"])
+
+        with pytest.raises(InvalidCursor):
+            decode_cursor(cursor, "created_at", ORDER)
+
+    def test_garbage_rejected(self):
+        """Test malformed cursors raise InvalidCursor"""
+        with pytest.raises(InvalidCursor):
+            decode_cursor("%%%", "created_at", ORDER)
+
+    def test_after_avoids_row_values_on_oracle(self):
+        """Test the keyset predicate compiles without tuple comparison"""
+        sql = str(
+            after(ORDER, [datetime(2024, 1, 1), "prod-1"]).compile(
+                dialect=oracle.dialect()
+            )
+        )
+
+        assert "products.created_at >" in sql
+        assert "products.created_at = " in sql and "products.id >" in sql
+
+    def test_after_bounds_leading_column(self):
+        """Test the keyset predicate bounds the leading column for an index seek"""
+        sql = str(
+            after(ORDER, [datetime(2024, 1, 1), "prod-1"]).compile(
+                dialect=oracle.dialect()
+            )
+        )
+
+        assert "products.created_at >= " in sql
+
+    def test_null_sort_values(self):
+        """Test NULLs sort last and follow each other, apart from the values"""
+        engine = create_engine("sqlite:///:memory:")
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        prices = [3.0, None, 1.0, None, 2.0]
+        db.add_all(
+            Product(id=f"prod-{i}", name="Item", price=price)
+            for i, price in enumerate(prices)
+        )
+        db.commit()
+        columns = (Product.price, Product.id)
+
+        def ids_after(values):
+            query = db.query(Product.id).order_by(*keyset_order(columns))
+            return [row.id for row in query.filter(after(columns, values))]
+
+        assert [
+            row.id for row in db.query(Product.id).order_by(*keyset_order(columns))
+        ] == ["prod-2", "prod-4", "prod-0", "prod-1", "prod-3"]
+        assert ids_after([1.0, "prod-2"]) == ["prod-4", "prod-0"]
+        assert ids_after([None, "prod-1"]) == ["prod-3"]
@@ -0,0 +1,322 @@
+import asyncio
+from contextlib import contextmanager
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from product_service import event_handlers
+from product_service import reservations as reservations_module
+from product_service.models import Base, Product
+from product_service.reservations import (
+    FLUSH_EPOCH,
+    FLUSH_ID,
+    FLUSH_LOCK,
+    FLUSHING,
+    PENDING,
+    InsufficientStock,
+    InventoryReservations,
+    ProductNotFound,
+)
+
+
+@pytest.fixture
+def redis_client():
+    """Redis double: every Lua script is an AsyncMock, keyed by its source"""
+    client = MagicMock()
+    client.scripts = {}
+
+    def register_script(source):
+        return client.scripts.setdefault(source, AsyncMock())
+
+    client.register_script.side_effect = register_script
+    client.get = AsyncMock(return_value="4")
+    client.set = AsyncMock(return_value=True)
+    client.delete = AsyncMock()
+    client.rename = AsyncMock()
+    client.hgetall = AsyncMock(return_value={})
+
+    pipe = MagicMock()
+    pipe.execute = AsyncMock()
+    client.pipeline.return_value.__aenter__ = AsyncMock(return_value=pipe)
+    client.pipeline.return_value.__aexit__ = AsyncMock(return_value=False)
+    client.pipe = pipe
+    return client
+
+
+@pytest.fixture
+def engine(redis_client, monkeypatch):
+    engine = InventoryReservations(redis_client, ttl=60, counter_ttl=30)
+    monkeypatch.setattr(
+        InventoryReservations, "_read_stock", staticmethod(lambda ids: {"prod-1": 8})
+    )
+    return engine
+
+
+@pytest.fixture
+def scripted_engine(monkeypatch):
+    """
+    Reservations on fakeredis with Lua scripting (``fakeredis[lua]``), so
+    the scripts themselves run, over an in-memory products table.
+    """
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+
+    db_engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=db_engine)
+    session_factory = sessionmaker(bind=db_engine)
+    with session_factory() as db:
+        db.add_all(
+            [
+                Product(id="prod-1", name="Phone", price=500.0, stock=5),
+                Product(id="prod-2", name="Case", price=20.0, stock=50),
+            ]
+        )
+        db.commit()
+
+    @contextmanager
+    def get_db():
+        with session_factory() as db:
+            yield db
+
+    monkeypatch.setattr(reservations_module, "get_db", get_db)
+    monkeypatch.setattr(event_handlers, "get_db", get_db)
+    engine = InventoryReservations(
+        fakeredis.FakeAsyncRedis(decode_responses=True), ttl=60, counter_ttl=30
+    )
+    engine.session_factory = session_factory
+    return engine
+
+
+def stock(engine, product_id):
+    with engine.session_factory() as db:
+        return db.get(Product, product_id).stock
+
+
+def script(redis_client, source):
+    return redis_client.scripts[source]
+
+
+class TestReservations:
+    def test_reserve_holds_all_items(self, event_loop, engine, redis_client):
+        """Test one script call reserves every item with merged quantities"""
+        reserve = script(redis_client, reservations_module.RESERVE_SCRIPT)
+        reserve.return_value = ["ok", 0]
+
+        reservation = event_loop.run_until_complete(
+            engine.reserve(
+                [
+                    {"product_id": "prod-1", "quantity": 2},
+                    {"product_id": "prod-2", "quantity": 1},
+                    {"product_id": "prod-1", "quantity": 1},
+                ]
+            )
+        )
+
+        assert reservation["items"] == [
+            {"product_id": "prod-1", "quantity": 3},
+            {"product_id": "prod-2", "quantity": 1},
+        ]
+        args = reserve.call_args.kwargs["args"]
+        assert args[2:] == [2, "prod-1", "prod-2", 3, 1]
+        assert reserve.await_count == 1
+
+    def test_missing_counter_loaded_from_database(
+        self, event_loop, engine, redis_client
+    ):
+        """Test a product without a counter is seeded, then reserved"""
+        reserve = script(redis_client, reservations_module.RESERVE_SCRIPT)
+        reserve.side_effect = [["missing", 1], ["ok", 0]]
+        load = script(redis_client, reservations_module.LOAD_SCRIPT)
+
+        event_loop.run_until_complete(
+            engine.reserve([{"product_id": "prod-1", "quantity": 1}])
+        )
+
+        load.assert_awaited_once()
+        # Database stock plus the flush epoch read before it
+        assert load.call_args.kwargs["args"] == ["prod-1", 8, "4", 30]
+        assert reserve.await_count == 2
+
+    def test_short_stock_rejected(self, event_loop, engine, redis_client):
+        """Test a reservation fails on the first product that is short"""
+        script(redis_client, reservations_module.RESERVE_SCRIPT).return_value = [
+            "short",
+            2,
+        ]
+
+        with pytest.raises(InsufficientStock) as error:
+            event_loop.run_until_complete(
+                engine.reserve(
+                    [
+                        {"product_id": "prod-1", "quantity": 1},
+                        {"product_id": "prod-2", "quantity": 5},
+                    ]
+                )
+            )
+        assert error.value.product_id == "prod-2"
+
+    def test_unknown_product(self, event_loop, engine, redis_client):
+        """Test reserving a product missing from the database fails"""
+        script(redis_client, reservations_module.RESERVE_SCRIPT).return_value = [
+            "missing",
+            1,
+        ]
+
+        with pytest.raises(ProductNotFound):
+            event_loop.run_until_complete(
+                engine.reserve([{"product_id": "prod-9", "quantity": 1}])
+            )
+
+    def test_flush_writes_back_pending_sales(self, event_loop, engine, redis_client):
+        """Test confirmed sales are written back once and the epoch bumped"""
+        redis_client.exists = AsyncMock(side_effect=[False, True])
+        redis_client.hgetall.return_value = {"prod-1": "-3", "prod-2": "0"}
+        engine._write_back = AsyncMock(return_value=[])
+
+        flushed = event_loop.run_until_complete(engine.flush())
+
+        assert flushed == 1
+        redis_client.pipe.rename.assert_called_once_with(PENDING, FLUSHING)
+        engine._write_back.assert_awaited_once_with({"prod-1": -3}, "4")
+        redis_client.pipe.delete.assert_called_once_with(FLUSHING, FLUSH_ID)
+        redis_client.pipe.incr.assert_called_once()
+
+    def test_failed_write_back_retried_first(self, event_loop, engine, redis_client):
+        """Test deltas left from a failed flush are written before new ones"""
+        redis_client.exists = AsyncMock(return_value=True)
+        redis_client.hgetall.return_value = {"prod-1": "-1"}
+        engine._write_back = AsyncMock(return_value=[])
+
+        event_loop.run_until_complete(engine.flush())
+
+        redis_client.pipe.rename.assert_not_called()
+        engine._write_back.assert_awaited_once_with({"prod-1": -1}, "4")
+
+    def test_single_flusher(self, event_loop, engine, redis_client):
+        """Test a replica skips the flush while another one holds the lock"""
+        redis_client.set.return_value = None
+        engine._write_back = AsyncMock(return_value=[])
+
+        assert event_loop.run_until_complete(engine.flush()) == 0
+        engine._write_back.assert_not_called()
+
+
+class TestReservationScripts:
+    def test_reserve_is_all_or_nothing(self, event_loop, scripted_engine):
+        """Test a short item leaves the counters of the other items untouched"""
+        engine = scripted_engine
+
+        async def run():
+            with pytest.raises(InsufficientStock):
+                await engine.reserve(
+                    [
+                        {"product_id": "prod-2", "quantity": 2},
+                        {"product_id": "prod-1", "quantity": 6},
+                    ]
+                )
+            return [
+                await engine.redis.get(engine.available_key(product_id))
+                for product_id in ("prod-1", "prod-2")
+            ]
+
+        assert event_loop.run_until_complete(run()) == ["5", "50"]
+
+    def test_release_and_confirm(self, event_loop, scripted_engine):
+        """Test released stock returns and confirming twice sells once"""
+        engine = scripted_engine
+        item = [{"product_id": "prod-1", "quantity": 2}]
+
+        async def run():
+            released = await engine.reserve(item)
+            assert await engine.release(released["reservation_id"])
+            assert not await engine.release(released["reservation_id"])
+            sold = await engine.reserve(item)
+            assert await engine.confirm(sold["reservation_id"])
+            assert await engine.confirm(sold["reservation_id"])
+            return (
+                await engine.redis.get(engine.available_key("prod-1")),
+                await engine.redis.hgetall(PENDING),
+            )
+
+        available, pending = event_loop.run_until_complete(run())
+
+        assert available == "3"
+        assert pending == {"prod-1": "-2"}
+
+    def test_failed_alert_never_writes_back_twice(
+        self, event_loop, scripted_engine, monkeypatch
+    ):
+        """Test a sale is written back once even when its alert cannot be sent"""
+        engine = scripted_engine
+        publish = AsyncMock(side_effect=ConnectionError("broker down"))
+        monkeypatch.setattr(event_handlers.message_queue, "publish_many", publish)
+
+        async def run():
+            sold = await engine.reserve([{"product_id": "prod-1", "quantity": 2}])
+            await engine.confirm(sold["reservation_id"])
+            for _ in range(3):
+                await engine.flush()
+            return await engine.redis.exists(FLUSHING), await engine.redis.get(
+                FLUSH_EPOCH
+            )
+
+        flushing, epoch = event_loop.run_until_complete(run())
+
+        assert stock(engine, "prod-1") == 3
+        publish.assert_awaited_once()
+        assert not flushing and epoch == "1"
+
+    def test_failed_retire_never_writes_back_twice(
+        self, event_loop, scripted_engine, monkeypatch
+    ):
+        """Test a committed flush whose deltas stayed in Redis is not reapplied"""
+        engine = scripted_engine
+        pipeline = engine.redis.pipeline
+        calls = []
+
+        def retire_fails_once(*args, **kwargs):
+            # First call renames the pending sales aside, second retires them
+            calls.append(1)
+            if len(calls) == 2:
+                raise ConnectionError("redis down")
+            return pipeline(*args, **kwargs)
+
+        async def run():
+            sold = await engine.reserve([{"product_id": "prod-1", "quantity": 2}])
+            await engine.confirm(sold["reservation_id"])
+            monkeypatch.setattr(engine.redis, "pipeline", retire_fails_once)
+            with pytest.raises(ConnectionError):
+                await engine.flush()
+            flushing = await engine.redis.exists(FLUSHING)
+            await engine.flush()
+            return flushing, await engine.redis.exists(FLUSHING, FLUSH_ID)
+
+        left_over, retired = event_loop.run_until_complete(run())
+
+        assert left_over and not retired
+        assert stock(engine, "prod-1") == 3
+
+    def test_flush_keeps_lock_of_another_replica(self, event_loop, scripted_engine):
+        """Test a flush that outlived its lock does not release the new holder's"""
+        engine = scripted_engine
+
+        async def write_back(deltas, flush_id):
+            # Our lock expired during the write-back and another replica took it
+            await engine.redis.set(FLUSH_LOCK, "other-replica")
+            return []
+
+        engine._write_back = write_back
+
+        async def run():
+            await engine.redis.hset(PENDING, "prod-1", -1)
+            await engine.flush()
+            return await engine.redis.get(FLUSH_LOCK)
+
+        assert event_loop.run_until_complete(run()) == "other-replica"
@@ -1,4 +1,10 @@
 import pytest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock
+
+from product_service import event_handlers
+from product_service.models import Product
+from product_service.listing import ProductSort, next_cursor, products_page
 
 
 class TestProductRoutes:
@@ -66,3 +72,243 @@ class TestProductRoutes:
         # Verify product is actually deleted
         get_response = client.get(f"/products/{test_product.id}")
         assert get_response.status_code == 404
+
+
+class TestProductEvents:
+    @pytest.fixture
+    def failing_publish(self, monkeypatch):
+        publish = AsyncMock(side_effect=ConnectionError("broker down"))
+        monkeypatch.setattr(event_handlers.message_queue, "publish_message", publish)
+        return publish
+
+    def test_failed_publish_keeps_create(self, client, db_session, failing_publish):
+        """Test a committed product is returned even when its event is not sent"""
+        product_data = {
+            "name": "Lamp",
+            "description": "Warm light",
+            "price": 19.5,
+            "category": "home",
+            "stock": 4,
+        }
+
+        response = client.post("/products/", json=product_data)
+
+        assert response.status_code == 201
+        failing_publish.assert_awaited_once()
+        assert db_session.get(Product, response.json()["id"]) is not None
+
+    def test_failed_publish_keeps_delete(
+        self, client, db_session, test_product, failing_publish
+    ):
+        """Test a committed delete succeeds even when its event is not sent"""
+        product_id = test_product.id
+
+        response = client.delete(f"/products/{product_id}")
+
+        assert response.status_code == 204
+        failing_publish.assert_awaited_once()
+        db_session.expire_all()
+        assert db_session.get(Product, product_id) is None
+
+
+class TestProductPagination:
+    @pytest.fixture
+    def catalog(self, db_session):
+        products = [
+            Product(
+                id=f"prod-{i:02d}",
+                name=f"Product {i}",
+                description="",
+                price=10.0,
+                category="books" if i % 2 else "toys",
+                stock=1,
+                created_at=datetime(2024, 1, 1) + timedelta(minutes=i // 2),
+            )
+            for i in range(10)
+        ]
+        db_session.add_all(products)
+        db_session.commit()
+        return products
+
+    def test_cursor_walks_all_pages(self, client, db_session, catalog):
+        """Test following X-Next-Cursor returns every product exactly once"""
+        seen = []
+        params = {"limit": 3}
+        while True:
+            response = client.get("/products/", params=params)
+            assert response.status_code == 200
+            seen.extend(product["id"] for product in response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+            assert f"cursor={cursor}" in response.headers["Link"]
+            params = {"limit": 3, "cursor": cursor}
+
+        assert seen == [f"prod-{i:02d}" for i in range(10)]
+
+    def test_cursor_with_category(self, client, db_session, catalog):
+        """Test cursors page through a single category"""
+        first = client.get("/products/", params={"category": "books", "limit": 3})
+        second = client.get(
+            "/products/",
+            params={
+                "category": "books",
+                "limit": 3,
+                "cursor": first.headers["X-Next-Cursor"],
+            },
+        )
+
+        ids = [p["id"] for p in first.json() + second.json()]
+        assert ids == [f"prod-{i:02d}" for i in range(1, 10, 2)]
+        assert "X-Next-Cursor" not in second.headers
+
+    def test_invalid_cursor(self, client, db_session):
+        """Test a malformed cursor is rejected"""
+        response = client.get("/products/", params={"cursor": "not-a-cursor"})
+
+        assert response.status_code == 400
+
+
+class TestProductListingFilters:
+    @pytest.fixture
+    def catalog(self, db_session):
+        # Prices repeat so that the id breaks ties between pages
+        products = [
+            Product(
+                id=f"prod-{i:02d}",
+                name=name,
+                description="",
+                price=float(5 * (i % 4)),
+                category="books" if i % 2 else "toys",
+                stock=i % 3,
+                created_at=datetime(2024, 1, 1) + timedelta(minutes=i),
+            )
+            for i, name in enumerate("jihgfedcba")
+        ]
+        db_session.add_all(products)
+        db_session.commit()
+        return products
+
+    def walk(self, client, params):
+        seen = []
+        params = dict(params, limit=2)
+        while True:
+            response = client.get("/products/", params=params)
+            assert response.status_code == 200
+            seen.extend(product["id"] for product in response.json())
+            if "X-Next-Cursor" not in response.headers:
+                return seen
+            params["cursor"] = response.headers["X-Next-Cursor"]
+
+    def test_price_range_sorted_by_price(self, client, db_session, catalog):
+        """Test a price range walks pages in (price, id) order"""
+        seen = self.walk(client, {"sort": "price", "min_price": 5, "max_price": 10})
+
+        expected = sorted(
+            (p for p in catalog if 5 <= p.price <= 10), key=lambda p: (p.price, p.id)
+        )
+        assert seen == [p.id for p in expected]
+
+    def test_sort_by_name_in_stock(self, client, db_session, catalog):
+        """Test in_stock filters sold-out products and name sorts ascending"""
+        seen = self.walk(client, {"sort": "name", "in_stock": True})
+
+        expected = sorted((p for p in catalog if p.stock > 0), key=lambda p: p.name)
+        assert seen == [p.id for p in expected]
+
+    def test_filters_with_category(self, client, db_session, catalog):
+        """Test filters combine with the category filter"""
+        seen = self.walk(
+            client, {"category": "books", "in_stock": False, "sort": "price"}
+        )
+
+        expected = sorted(
+            (p for p in catalog if p.category == "books" and p.stock == 0),
+            key=lambda p: (p.price, p.id),
+        )
+        assert seen == [p.id for p in expected]
+
+    @pytest.mark.parametrize("sort", [ProductSort.PRICE, ProductSort.NAME])
+    def test_null_sort_values_last(self, db_session, catalog, sort):
+        """Test products without a price or name are paged through, last"""
+        db_session.add_all(
+            [
+                Product(id="prod-n1", name=None, price=None, category="toys"),
+                Product(id="prod-n0", name=None, price=None, category="toys"),
+            ]
+        )
+        db_session.commit()
+
+        seen, cursor = [], None
+        while True:
+            page = products_page(db_session.query(Product), sort, cursor, size=3)
+            if not page:
+                break
+            seen += [product.id for product in page]
+            cursor = next_cursor(page[-1], sort)
+
+        assert len(seen) == len(catalog) + 2
+        assert seen[-2:] == ["prod-n0", "prod-n1"]
+
+    def test_cursor_of_another_sort(self, client, db_session, catalog):
+        """Test a cursor is only valid for the sort it was issued for"""
+        first = client.get("/products/", params={"sort": "price", "limit": 2})
+        response = client.get(
+            "/products/",
+            params={"sort": "name", "cursor": first.headers["X-Next-Cursor"]},
+        )
+
+        assert response.status_code == 400
+
+    def test_unknown_sort(self, client, db_session):
+        """Test sorting by an unsupported field is rejected"""
+        response = client.get("/products/", params={"sort": "stock"})
+
+        assert response.status_code == 422
+
+
+class TestProductBatch:
+    @pytest.fixture
+    def catalog(self, db_session):
+        products = [
+            Product(
+                id=f"prod-{i}",
+                name=f"Product {i}",
+                description="",
+                price=1.0,
+                category="misc",
+                stock=1,
+            )
+            for i in range(5)
+        ]
+        db_session.add_all(products)
+        db_session.commit()
+        return products
+
+    def test_get_preserves_order_and_reports_missing(self, client, db_session, catalog):
+        """Test a GET batch returns products in request order and missing ids"""
+        response = client.get(
+            "/products/batch", params={"ids": "prod-3,nope,prod-0,prod-3"}
+        )
+
+        assert response.status_code == 200
+        body = response.json()
+        assert [p["id"] for p in body["products"]] == ["prod-3", "prod-0"]
+        assert body["missing"] == ["nope"]
+
+    def test_post_chunks_long_lists(self, client, db_session, catalog, monkeypatch):
+        """Test a POST batch spanning several IN chunks returns every product"""
+        monkeypatch.setattr("product_service.listing.ID_CHUNK_SIZE", 2)
+        ids = [f"prod-{i}" for i in (4, 2, 0, 1, 3)]
+
+        response = client.post("/products/batch", json={"ids": ids})
+
+        assert [p["id"] for p in response.json()["products"]] == ids
+        assert response.json()["missing"] == []
+
+    def test_too_many_ids(self, client, db_session):
+        """Test a batch over the id limit is rejected"""
+        ids = ",".join(f"prod-{i}" for i in range(1001))
+        response = client.get("/products/batch", params={"ids": ids})
+
+        assert response.status_code == 400
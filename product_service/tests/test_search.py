@@ -0,0 +1,169 @@
+from contextlib import contextmanager
+from datetime import datetime
+from unittest.mock import patch
+
+from product_service.models import Product
+from product_service.search import SearchIndex, search_index, tokenize
+
+
+def product(product_id, name, description="", category="misc", stock=10):
+    return {
+        "id": product_id,
+        "name": name,
+        "description": description,
+        "category": category,
+        "price": 10.0,
+        "stock": stock,
+    }
+
+
+def ids(hits):
+    return [hit["id"] for hit in hits]
+
+
+class TestTokenize:
+    def test_tokenize(self):
+        """Test text is lowercased and split on punctuation and underscores"""
+        assert tokenize("Wireless-Headphones, USB_C 2.0") == [
+            "wireless",
+            "headphones",
+            "usb",
+            "c",
+            "2",
+            "0",
+        ]
+        assert tokenize(None) == []
+
+
+class TestSearchIndex:
+    def test_name_match_ranks_above_description(self):
+        """Test a term in the name outranks the same term in the description"""
+        index = SearchIndex()
+        index.add(product("a", "Phone case", "Fits any laptop"))
+        index.add(product("b", "Laptop stand", "Aluminium"))
+        index.add(product("c", "Desk lamp", "LED"))
+
+        assert ids(index.search("laptop")) == ["b", "a"]
+
+    def test_prefix_match(self):
+        """Test the query matches words it is a prefix of, below exact matches"""
+        index = SearchIndex()
+        index.add(product("a", "Wireless headphones"))
+        index.add(product("b", "Head lamp"))
+        index.add(product("c", "Keyboard"))
+
+        assert ids(index.search("head")) == ["b", "a"]
+        assert ids(index.search("wire head")) == ["a", "b"]
+
+    def test_category_filter_and_limit(self):
+        """Test hits are filtered by category and cut at the limit"""
+        index = SearchIndex()
+        for i in range(5):
+            index.add(product(f"a{i}", f"Cable {i}", category="audio"))
+            index.add(product(f"v{i}", f"Cable {i}", category="video"))
+
+        hits = index.search("cable", limit=3, category="video")
+        assert len(hits) == 3
+        assert all(hit["category"] == "video" for hit in hits)
+        assert index.search("") == []
+
+    def test_update_replaces_postings(self):
+        """Test a full product event re-indexes the product's text"""
+        index = SearchIndex()
+        index.add(product("a", "Old name"))
+        index.apply_event(product("a", "New name"))
+
+        assert index.search("old") == []
+        assert ids(index.search("new")) == ["a"]
+        assert "old" not in index.terms
+        assert len(index) == 1
+
+    def test_partial_stock_update(self):
+        """Test a stock-only event updates the stored product, not the postings"""
+        index = SearchIndex()
+        index.add(product("a", "Mouse", stock=10))
+        index.apply_event({"product_id": "a", "stock": 3})
+
+        [hit] = index.search("mouse")
+        assert hit["stock"] == 3
+        assert "product_id" not in hit
+
+    def test_delete(self):
+        """Test a deletion event drops the product and its terms"""
+        index = SearchIndex()
+        index.add(product("a", "Monitor"))
+        index.add(product("b", "Monitor arm"))
+        index.apply_event({"id": "a", "deleted": True})
+
+        assert ids(index.search("monitor")) == ["b"]
+        assert index.total_length == index.lengths["b"]
+
+    def test_events_during_rebuild_are_replayed(self, event_loop):
+        """Test events received while the database is scanned survive the swap"""
+        index = SearchIndex()
+        index.add(product("a", "Stale"))
+
+        def scan():
+            # An event arrives while the rebuild is running
+            index.apply_event(product("b", "Fresh arrival"))
+            fresh = SearchIndex()
+            fresh.add(product("a", "Scanned"))
+            return fresh
+
+        with patch.object(SearchIndex, "_scan", side_effect=scan):
+            event_loop.run_until_complete(index.rebuild())
+
+        assert ids(index.search("scanned")) == ["a"]
+        assert ids(index.search("fresh")) == ["b"]
+        assert index.search("stale") == []
+
+    def test_scan_sorts_vocabulary(self, db_session):
+        """Test a rebuild scan yields the sorted vocabulary prefix lookups need"""
+        db_session.add_all(
+            [
+                Product(id="a", name="Zebra lamp", description="", price=1.0),
+                Product(id="b", name="Apple stand", description="", price=1.0),
+            ]
+        )
+        db_session.commit()
+
+        @contextmanager
+        def get_db():
+            yield db_session
+
+        with patch("product_service.search.get_db", get_db):
+            index = SearchIndex._scan()
+
+        assert index.terms == sorted(index.postings)
+        assert ids(index.search("zeb")) == ["a"]
+
+    def test_stock_alert_updates_document(self):
+        """Test an INVENTORY_LOW alert updates the stock of a search hit"""
+        index = SearchIndex()
+        index.add(product("a", "Lamp", stock=12))
+
+        index.apply_event({"product_id": "a", "stock": 0})
+
+        assert index.search("lamp")[0]["stock"] == 0
+
+
+class TestSearchRoute:
+    def test_results_follow_response_schema(self, client, monkeypatch):
+        """Test search hits are shaped by ProductResponse"""
+        index = SearchIndex()
+        index.add(
+            dict(
+                product("a", "Desk lamp"),
+                sku="SKU-1",
+                created_at=datetime(2024, 1, 1),
+                updated_at=datetime(2024, 1, 2),
+            )
+        )
+        monkeypatch.setattr(search_index, "search", index.search)
+
+        response = client.get("/products/search", params={"q": "lamp"})
+
+        assert response.status_code == 200
+        hit = response.json()[0]
+        assert hit["id"] == "a" and hit["sku"] == "SKU-1"
+        assert "updated_at" not in hit
@@ -1,9 +1,10 @@
 import redis
-import json
 import os
 from functools import wraps
 from fastapi import HTTPException
 
+from .serialization import dumps, loads
+
 # Redis connection
 redis_client = redis.Redis(
     host=os.getenv("REDIS_HOST", "localhost"),
@@ -28,13 +29,13 @@ def cache_response(expire_time: int = 300):
             # Try to get cached result
             cached_result = redis_client.get(cache_key)
             if cached_result:
-                return json.loads(cached_result)
+                return loads(cached_result)
 
             # Execute function if not cached
             result = await func(*args, **kwargs)
 
             # Cache the result
-            redis_client.setex(cache_key, expire_time, json.dumps(result))
+            redis_client.setex(cache_key, expire_time, dumps(result))
 
             return result
 
@@ -0,0 +1,182 @@
+"""
+Request deadline propagation.
+
+The API gateway stamps every downstream call with an absolute deadline
+(``X-Request-Deadline``, Unix epoch in milliseconds). Services read it back,
+reject requests that are already late, and derive httpx timeouts and database
+call timeouts from whatever budget is left, so abandoned requests stop
+consuming capacity.
+"""
+
+import asyncio
+import contextvars
+import logging
+import time
+from typing import Dict, Optional
+
+from fastapi.responses import JSONResponse
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+DEADLINE_HEADER = "X-Request-Deadline"
+TIMEOUT_HEADER = "X-Request-Timeout"
+
+_deadline: contextvars.ContextVar = contextvars.ContextVar(
+    "request_deadline", default=None
+)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when work is attempted after the request deadline passed"""
+
+
+def get_deadline() -> Optional[float]:
+    """Return the current request deadline as epoch seconds, if any"""
+    return _deadline.get()
+
+
+def set_deadline(deadline: Optional[float]):
+    """Set the deadline for the current context, returns a reset token"""
+    return _deadline.set(deadline)
+
+
+def reset_deadline(token):
+    _deadline.reset(token)
+
+
+def remaining(default: Optional[float] = None) -> Optional[float]:
+    """Seconds left until the deadline, or ``default`` when none is set"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return default
+    return deadline - time.time()
+
+
+def check_deadline():
+    """Raise DeadlineExceeded if the current deadline already passed"""
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+
+
+def deadline_headers() -> Dict[str, str]:
+    """Headers that carry the current deadline to a downstream service"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return {}
+    return {DEADLINE_HEADER: str(int(deadline * 1000))}
+
+
+def downstream_timeout(default: float) -> float:
+    """Timeout for a downstream call: the default capped by the deadline"""
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+    return min(default, left)
+
+
+def parse_deadline(
+    headers,
+    default_timeout: Optional[float] = None,
+    max_timeout: Optional[float] = None,
+) -> Optional[float]:
+    """
+    Work out the deadline for an incoming request.
+
+    An explicit ``X-Request-Deadline`` wins; otherwise a relative
+    ``X-Request-Timeout`` (seconds) sent by the client is used, falling back
+    to ``default_timeout``. ``max_timeout`` caps whatever the caller asked for.
+    """
+    now = time.time()
+    deadline = None
+
+    raw_deadline = headers.get(DEADLINE_HEADER)
+    if raw_deadline:
+        try:
+            deadline = int(raw_deadline) / 1000
+        except ValueError:
+            logger.warning(f"Ignoring malformed {DEADLINE_HEADER}: {raw_deadline}")
+
+    if deadline is None:
+        timeout = default_timeout
+        raw_timeout = headers.get(TIMEOUT_HEADER)
+        if raw_timeout:
+            try:
+                timeout = float(raw_timeout)
+            except ValueError:
+                logger.warning(f"Ignoring malformed {TIMEOUT_HEADER}: {raw_timeout}")
+        if timeout is not None:
+            deadline = now + timeout
+
+    if deadline is not None and max_timeout is not None:
+        deadline = min(deadline, now + max_timeout)
+
+    return deadline
+
+
+def _deadline_response():
+    return JSONResponse(
+        status_code=504, content={"detail": "Request deadline exceeded"}
+    )
+
+
+def install_deadline_middleware(
+    app, default_timeout: Optional[float] = None, max_timeout: Optional[float] = None
+):
+    """
+    Enforce request deadlines for a FastAPI app.
+
+    Requests arriving after their deadline are rejected with 504 before any
+    work is done. Otherwise the handler runs with the deadline in context and
+    is cancelled once it elapses.
+    """
+
+    @app.exception_handler(DeadlineExceeded)
+    async def deadline_exceeded_handler(request, exc):
+        return _deadline_response()
+
+    @app.middleware("http")
+    async def enforce_deadline(request, call_next):
+        deadline = parse_deadline(request.headers, default_timeout, max_timeout)
+        if deadline is None:
+            return await call_next(request)
+
+        budget = deadline - time.time()
+        if budget <= 0:
+            return _deadline_response()
+
+        token = set_deadline(deadline)
+        try:
+            return await asyncio.wait_for(call_next(request), timeout=budget)
+        except asyncio.TimeoutError:
+            logger.warning(f"Deadline exceeded for {request.method} {request.url.path}")
+            return _deadline_response()
+        finally:
+            reset_deadline(token)
+
+
+def install_statement_timeout(engine):
+    """
+    Bound every database call by the remaining request budget.
+
+    Drivers exposing a per-connection call timeout (python-oracledb's
+    ``call_timeout``, in milliseconds) get it set before each statement;
+    statements issued after the deadline are refused outright.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def apply_statement_timeout(
+        conn, cursor, statement, parameters, context, executemany
+    ):
+        left = remaining()
+        if left is not None and left <= 0:
+            raise DeadlineExceeded("Request deadline exceeded")
+
+        driver_connection = getattr(conn.connection, "driver_connection", None)
+        if driver_connection is None or not hasattr(driver_connection, "call_timeout"):
+            return
+        # 0 disables the timeout for calls made outside a request
+        driver_connection.call_timeout = 0 if left is None else max(1, int(left * 1000))
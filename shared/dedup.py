@@ -0,0 +1,115 @@
+"""
+Idempotent consumption for at-least-once delivery.
+
+Every published message carries a unique ``message_id``. A Deduplicator
+remembers which ids a queue has already processed: recent ones in an
+in-process LRU, all of them for ``ttl`` seconds in Redis. Before a handler
+runs, the consumer claims the id with ``SET NX``; a redelivered or
+duplicated message finds the id marked done and is acked without running
+the handler again. A claim held by another consumer raises MessageInFlight,
+so the duplicate goes through the retry queues instead of racing it.
+
+If Redis is unreachable the store falls back to the LRU alone rather than
+stopping consumption.
+"""
+
+import logging
+import os
+from collections import OrderedDict
+from typing import Optional
+
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+_PROCESSING = "processing"
+_DONE = "done"
+
+
+class MessageInFlight(Exception):
+    """Another consumer is currently processing the same message id"""
+
+
+class Deduplicator:
+    def __init__(
+        self,
+        redis_client=None,
+        namespace: str = "dedup",
+        ttl: int = None,
+        lease: int = None,
+        lru_size: int = None,
+    ):
+        self.redis = redis_client or redis.Redis(
+            host=os.getenv("REDIS_HOST", "localhost"),
+            port=int(os.getenv("REDIS_PORT", 6379)),
+            db=0,
+            decode_responses=True,
+        )
+        self.namespace = namespace
+        # How long processed ids are remembered; must exceed the retry window
+        self.ttl = ttl or int(os.getenv("DEDUP_TTL", 86400))
+        # How long a claim survives a consumer that died mid-message
+        self.lease = lease or int(os.getenv("DEDUP_LEASE", 60))
+        self.lru_size = lru_size or int(os.getenv("DEDUP_LRU_SIZE", 10000))
+        self._recent: OrderedDict = OrderedDict()
+
+    def _key(self, message_id: str) -> str:
+        return f"{self.namespace}:{message_id}"
+
+    def _remember(self, key: str):
+        self._recent[key] = True
+        self._recent.move_to_end(key)
+        if len(self._recent) > self.lru_size:
+            self._recent.popitem(last=False)
+
+    async def claim(self, message_id: Optional[str]) -> bool:
+        """
+        Claim ``message_id`` for processing.
+
+        Returns False when it was already processed. Raises MessageInFlight
+        when another consumer holds the claim.
+        """
+        if not message_id:
+            return True
+        key = self._key(message_id)
+        if key in self._recent:
+            self._recent.move_to_end(key)
+            return False
+
+        try:
+            if await self.redis.set(key, _PROCESSING, nx=True, ex=self.lease):
+                return True
+            state = await self.redis.get(key)
+            if state is None and await self.redis.set(
+                key, _PROCESSING, nx=True, ex=self.lease
+            ):
+                # The other claim expired between our SET and GET
+                return True
+        except Exception as e:
+            logger.warning(f"Dedup store unavailable, using local cache only: {e}")
+            return True
+
+        if state == _DONE:
+            self._remember(key)
+            return False
+        raise MessageInFlight(message_id)
+
+    async def complete(self, message_id: Optional[str]):
+        """Mark ``message_id`` as processed"""
+        if not message_id:
+            return
+        key = self._key(message_id)
+        self._remember(key)
+        try:
+            await self.redis.set(key, _DONE, ex=self.ttl)
+        except Exception as e:
+            logger.warning(f"Could not record processed message {message_id}: {e}")
+
+    async def release(self, message_id: Optional[str]):
+        """Drop a claim after a failure so a retry can process the message"""
+        if not message_id:
+            return
+        try:
+            await self.redis.delete(self._key(message_id))
+        except Exception as e:
+            logger.warning(f"Could not release message {message_id}: {e}")
@@ -0,0 +1,547 @@
+"""
+In-process message broker.
+
+Implements the part of the aio_pika API that MessageQueue uses, so the
+whole event flow runs without RabbitMQ: load tests, benchmarks and
+single-node deployments select it with ``MESSAGE_BROKER=memory``.
+
+The AMQP semantics the services rely on are kept:
+
+- direct, topic and fanout exchanges plus the default exchange, which
+  routes to the queue named by the routing key
+- ``x-consistent-hash`` exchanges (the RabbitMQ plugin), hashing the
+  routing key or the ``hash-header`` argument onto bindings weighted by
+  their binding key, and exchange-to-exchange bindings
+- per-consumer prefetch; a message stays unacked until ``ack``, ``nack`` or
+  ``reject``, and ``ack(multiple=True)`` settles every earlier delivery on
+  the channel
+- unacked messages are requeued (flagged ``redelivered``) when their
+  channel or connection closes
+- ``x-message-ttl``, ``x-dead-letter-exchange`` and
+  ``x-dead-letter-routing-key`` queue arguments, so retry queues work
+- exclusive queues are deleted with the connection that declared them
+
+Durable queues and their messages outlive connections, but not the
+process: nothing is written to disk.
+"""
+
+import asyncio
+import bisect
+import itertools
+import logging
+import time
+import uuid
+from collections import deque
+from functools import lru_cache
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Union
+from zlib import crc32
+
+logger = logging.getLogger(__name__)
+
+
+class Envelope:
+    """A published message as stored in a queue"""
+
+    def __init__(self, message, exchange: str, routing_key: str):
+        self.body = message.body
+        self.headers = dict(message.headers or {})
+        self.content_type = message.content_type
+        self.content_encoding = message.content_encoding
+        self.message_id = message.message_id
+        self.delivery_mode = message.delivery_mode
+        self.exchange = exchange
+        self.routing_key = routing_key
+        self.redelivered = False
+        self.expires_at: Optional[float] = None
+
+    def copy(self) -> "Envelope":
+        return Envelope(self, self.exchange, self.routing_key)
+
+
+class IncomingMessage:
+    """A delivery handed to a consumer or returned by ``Queue.get``"""
+
+    def __init__(self, channel: "Channel", queue: "Queue", envelope: Envelope, tag):
+        self.channel = channel
+        self.queue = queue
+        self.envelope = envelope
+        self.delivery_tag = tag
+        self.body = envelope.body
+        self.headers = envelope.headers
+        self.content_type = envelope.content_type
+        self.content_encoding = envelope.content_encoding
+        self.message_id = envelope.message_id
+        self.exchange = envelope.exchange
+        self.routing_key = envelope.routing_key
+        self.redelivered = envelope.redelivered
+
+    async def ack(self, multiple: bool = False):
+        self.channel._settle(self.delivery_tag, multiple, "ack")
+
+    async def nack(self, multiple: bool = False, requeue: bool = True):
+        self.channel._settle(
+            self.delivery_tag, multiple, "requeue" if requeue else "reject"
+        )
+
+    async def reject(self, requeue: bool = False):
+        self.channel._settle(
+            self.delivery_tag, False, "requeue" if requeue else "reject"
+        )
+
+
+class Exchange:
+    def __init__(
+        self,
+        broker: "MemoryBroker",
+        name: str,
+        type: str,
+        arguments: Optional[Dict[str, Any]] = None,
+    ):
+        self.broker = broker
+        self.name = name
+        self.type = type
+        self.arguments = arguments or {}
+        self.bindings: List[tuple] = []
+        self._ring: Optional[tuple] = None
+
+    def add_binding(self, destination: Union["Queue", "Exchange"], routing_key: str):
+        if (destination, routing_key) not in self.bindings:
+            self.bindings.append((destination, routing_key))
+            self._ring = None
+
+    def remove_destination(self, destination: Union["Queue", "Exchange"]):
+        self.bindings = [b for b in self.bindings if b[0] is not destination]
+        self._ring = None
+
+    async def bind(self, exchange, routing_key: str = "", **kwargs):
+        """Exchange-to-exchange binding: ``exchange`` routes into this one"""
+        source = self.broker.exchanges[getattr(exchange, "name", exchange)]
+        source.add_binding(self, routing_key)
+
+    def route(self, envelope: "Envelope", routing_key: str) -> List["Queue"]:
+        if self.name == "":
+            queue = self.broker.queues.get(routing_key)
+            return [queue] if queue else []
+        if self.type == "x-consistent-hash":
+            destinations = self._hash_destination(envelope, routing_key)
+        else:
+            destinations = [
+                destination
+                for destination, binding_key in self.bindings
+                if self.type == "fanout"
+                or (
+                    _topic_matches(binding_key, routing_key)
+                    if self.type == "topic"
+                    else binding_key == routing_key
+                )
+            ]
+
+        matched = []
+        for destination in destinations:
+            if isinstance(destination, Exchange):
+                queues = destination.route(envelope, routing_key)
+            else:
+                queues = [destination]
+            matched.extend(queue for queue in queues if queue not in matched)
+        return matched
+
+    def _hash_destination(self, envelope: "Envelope", routing_key: str) -> list:
+        """Pick one binding on a hash ring; binding keys are integer weights"""
+        if not self.bindings:
+            return []
+        if self._ring is None:
+            points = sorted(
+                (
+                    (crc32(f"{index}:{point}".encode()), destination)
+                    for index, (destination, weight) in enumerate(self.bindings)
+                    for point in range(int(weight or 1) * 16)
+                ),
+                key=lambda point: point[0],
+            )
+            self._ring = ([p[0] for p in points], [p[1] for p in points])
+        hashes, destinations = self._ring
+        header = self.arguments.get("hash-header")
+        key = envelope.headers.get(header) if header else routing_key
+        position = bisect.bisect(hashes, crc32(str(key).encode()))
+        return [destinations[position % len(destinations)]]
+
+    async def publish(self, message, routing_key: str, **kwargs):
+        self.broker.publish(self, message, routing_key)
+
+
+@lru_cache(maxsize=4096)
+def _topic_matches(binding_key: str, routing_key: str) -> bool:
+    """AMQP topic match: ``*`` is one word, ``#`` is zero or more words"""
+    return _match_words(tuple(binding_key.split(".")), tuple(routing_key.split(".")))
+
+
+def _match_words(pattern: tuple, words: tuple) -> bool:
+    if not pattern:
+        return not words
+    head, rest = pattern[0], pattern[1:]
+    if head == "#":
+        return any(_match_words(rest, words[i:]) for i in range(len(words) + 1))
+    if not words:
+        return False
+    return head in ("*", words[0]) and _match_words(rest, words[1:])
+
+
+class Consumer:
+    def __init__(self, queue: "Queue", channel: "Channel"):
+        self.queue = queue
+        self.channel = channel
+        self.prefetch = channel.prefetch_count
+        self.unacked = 0
+        self.deliveries: asyncio.Queue = asyncio.Queue()
+        self.cancelled = False
+
+    @property
+    def has_capacity(self) -> bool:
+        return not self.cancelled and (
+            not self.prefetch or self.unacked < self.prefetch
+        )
+
+
+class Queue:
+    def __init__(
+        self,
+        broker: "MemoryBroker",
+        name: str,
+        durable: bool,
+        exclusive: bool,
+        arguments: Dict[str, Any],
+        owner: Optional["Connection"],
+    ):
+        self.broker = broker
+        self.name = name
+        self.durable = durable
+        self.exclusive = exclusive
+        self.arguments = arguments
+        self.owner = owner
+        self.ready: deque = deque()
+        self.consumers: List[Consumer] = []
+        self._next_consumer = 0
+        self._expiry = None
+
+    def enqueue(self, envelope: Envelope):
+        ttl = self.arguments.get("x-message-ttl")
+        if ttl is not None:
+            envelope.expires_at = time.monotonic() + ttl / 1000
+        self.ready.append(envelope)
+        if ttl is not None:
+            self._schedule_expiry()
+        self.dispatch()
+
+    def requeue(self, envelope: Envelope):
+        envelope.redelivered = True
+        self.ready.appendleft(envelope)
+
+    def dispatch(self):
+        """Hand ready messages to consumers, round-robin, within prefetch"""
+        self._expire()
+        while self.ready and self.consumers:
+            for _ in range(len(self.consumers)):
+                self._next_consumer %= len(self.consumers)
+                consumer = self.consumers[self._next_consumer]
+                self._next_consumer += 1
+                if consumer.has_capacity:
+                    break
+            else:
+                return
+            envelope = self.ready.popleft()
+            consumer.unacked += 1
+            consumer.deliveries.put_nowait(
+                consumer.channel._deliver(self, envelope, consumer, False)
+            )
+
+    def dead_letter(self, envelope: Envelope, reason: str):
+        exchange = self.broker.exchanges.get(
+            self.arguments.get("x-dead-letter-exchange")
+        )
+        if exchange is None:
+            return
+        routing_key = self.arguments.get(
+            "x-dead-letter-routing-key", envelope.routing_key
+        )
+        envelope = envelope.copy()
+        envelope.headers["x-death"] = [
+            {"queue": self.name, "reason": reason, "exchange": envelope.exchange}
+        ] + list(envelope.headers.get("x-death", []))
+        envelope.expires_at = None
+        self.broker.route(exchange, envelope, routing_key)
+
+    def _expire(self):
+        now = time.monotonic()
+        while self.ready and self.ready[0].expires_at is not None:
+            if self.ready[0].expires_at > now:
+                break
+            self.dead_letter(self.ready.popleft(), "expired")
+
+    def _schedule_expiry(self):
+        """Wake up when the message at the head of the queue expires"""
+        if self._expiry is not None or not self.ready:
+            return
+
+        def run():
+            self._expiry = None
+            self._expire()
+            self._schedule_expiry()
+
+        delay = max(self.ready[0].expires_at - time.monotonic(), 0)
+        self._expiry = asyncio.get_running_loop().call_later(delay, run)
+
+
+class BoundQueue:
+    """A queue as seen through one channel, like ``aio_pika.Queue``"""
+
+    def __init__(self, queue: Queue, channel: "Channel"):
+        self.queue = queue
+        self.channel = channel
+        self.name = queue.name
+        self.arguments = queue.arguments
+
+    async def bind(self, exchange, routing_key: str = None, **kwargs):
+        target = self.queue.broker.exchanges[getattr(exchange, "name", exchange)]
+        target.add_binding(
+            self.queue, self.name if routing_key is None else routing_key
+        )
+
+    async def get(self, no_ack: bool = False, fail: bool = True, **kwargs):
+        self.queue._expire()
+        if not self.queue.ready:
+            if fail:
+                raise LookupError(f"Queue {self.name} is empty")
+            return None
+        envelope = self.queue.ready.popleft()
+        return self.channel._deliver(self.queue, envelope, None, no_ack)
+
+    def iterator(self, **kwargs) -> "QueueIterator":
+        return QueueIterator(self.queue, self.channel)
+
+    @property
+    def declaration_result(self) -> SimpleNamespace:
+        return SimpleNamespace(
+            message_count=len(self.queue.ready),
+            consumer_count=len(self.queue.consumers),
+        )
+
+
+class QueueIterator:
+    def __init__(self, queue: Queue, channel: "Channel"):
+        self.queue = queue
+        self.channel = channel
+        self.consumer: Optional[Consumer] = None
+
+    async def __aenter__(self):
+        self._start()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    def __aiter__(self):
+        self._start()
+        return self
+
+    async def __anext__(self) -> IncomingMessage:
+        message = await self.consumer.deliveries.get()
+        if message is None:
+            raise StopAsyncIteration
+        return message
+
+    def _start(self):
+        if self.consumer is None:
+            self.consumer = Consumer(self.queue, self.channel)
+            self.queue.consumers.append(self.consumer)
+            self.channel.consumers.append(self.consumer)
+            self.queue.dispatch()
+
+    async def close(self):
+        if self.consumer and not self.consumer.cancelled:
+            self.consumer.cancelled = True
+            if self.consumer in self.queue.consumers:
+                self.queue.consumers.remove(self.consumer)
+            self.consumer.deliveries.put_nowait(None)
+
+
+class Channel:
+    def __init__(self, connection: "Connection", publisher_confirms: bool = True):
+        self.connection = connection
+        self.broker = connection.broker
+        self.publisher_confirms = publisher_confirms
+        self.prefetch_count = 0
+        self.consumers: List[Consumer] = []
+        self.unacked: Dict[int, tuple] = {}
+        self._tags = itertools.count(1)
+        self.is_closed = False
+
+    @property
+    def default_exchange(self) -> Exchange:
+        return self.broker.exchanges[""]
+
+    async def set_qos(self, prefetch_count: int = 0, **kwargs):
+        self.prefetch_count = prefetch_count
+
+    async def declare_exchange(
+        self,
+        name: str,
+        type="direct",
+        durable: bool = False,
+        arguments: Dict[str, Any] = None,
+        **kwargs,
+    ) -> Exchange:
+        return self.broker.declare_exchange(
+            name, getattr(type, "value", type), arguments
+        )
+
+    async def declare_queue(
+        self,
+        name: str = None,
+        durable: bool = False,
+        exclusive: bool = False,
+        auto_delete: bool = False,
+        arguments: Dict[str, Any] = None,
+        passive: bool = False,
+        **kwargs,
+    ) -> BoundQueue:
+        if passive:
+            if name not in self.broker.queues:
+                raise LookupError(f"Queue {name} does not exist")
+            return BoundQueue(self.broker.queues[name], self)
+        queue = self.broker.declare_queue(
+            name, durable, exclusive, arguments or {}, self.connection
+        )
+        return BoundQueue(queue, self)
+
+    def _deliver(self, queue: Queue, envelope: Envelope, consumer, no_ack: bool):
+        tag = next(self._tags)
+        if not no_ack:
+            self.unacked[tag] = (queue, envelope, consumer)
+        return IncomingMessage(self, queue, envelope, tag)
+
+    def _settle(self, tag: int, multiple: bool, outcome: str):
+        if tag not in self.unacked:
+            raise RuntimeError(f"Unknown delivery tag {tag}")
+        tags = [t for t in self.unacked if t <= tag] if multiple else [tag]
+        queues = set()
+        for t in tags:
+            queue, envelope, consumer = self.unacked.pop(t)
+            if consumer is not None:
+                consumer.unacked -= 1
+            if outcome == "requeue":
+                queue.requeue(envelope)
+            elif outcome == "reject":
+                queue.dead_letter(envelope, "rejected")
+            queues.add(queue)
+        for queue in queues:
+            queue.dispatch()
+
+    async def close(self):
+        if self.is_closed:
+            return
+        self.is_closed = True
+        for consumer in self.consumers:
+            consumer.cancelled = True
+            if consumer in consumer.queue.consumers:
+                consumer.queue.consumers.remove(consumer)
+            # Deliveries not yet handed out are requeued below, not consumed
+            while not consumer.deliveries.empty():
+                consumer.deliveries.get_nowait()
+            consumer.deliveries.put_nowait(None)
+        # Unacked deliveries go back to their queues, oldest first
+        queues = set()
+        for tag in sorted(self.unacked, reverse=True):
+            queue, envelope, _ = self.unacked.pop(tag)
+            queue.requeue(envelope)
+            queues.add(queue)
+        for queue in queues:
+            queue.dispatch()
+        self.connection.channels.discard(self)
+
+
+class Connection:
+    def __init__(self, broker: "MemoryBroker"):
+        self.broker = broker
+        self.channels = set()
+        self.is_closed = False
+
+    async def channel(self, publisher_confirms: bool = True, **kwargs) -> Channel:
+        channel = Channel(self, publisher_confirms)
+        self.channels.add(channel)
+        return channel
+
+    async def close(self):
+        for channel in list(self.channels):
+            await channel.close()
+        self.broker.drop_exclusive_queues(self)
+        self.is_closed = True
+
+
+class MemoryBroker:
+    def __init__(self):
+        self.exchanges: Dict[str, Exchange] = {"": Exchange(self, "", "direct")}
+        self.queues: Dict[str, Queue] = {}
+
+    def declare_exchange(
+        self, name: str, type: str, arguments: Optional[Dict[str, Any]] = None
+    ) -> Exchange:
+        exchange = self.exchanges.get(name)
+        if exchange is None:
+            exchange = self.exchanges[name] = Exchange(self, name, type, arguments)
+        elif exchange.type != type:
+            raise ValueError(
+                f"Exchange {name} exists with type {exchange.type}, not {type}"
+            )
+        return exchange
+
+    def declare_queue(
+        self,
+        name: Optional[str],
+        durable: bool,
+        exclusive: bool,
+        arguments: Dict[str, Any],
+        owner: Connection,
+    ) -> Queue:
+        name = name or f"amq.gen-{uuid.uuid4().hex}"
+        queue = self.queues.get(name)
+        if queue is None:
+            queue = self.queues[name] = Queue(
+                self, name, durable, exclusive, arguments, owner if exclusive else None
+            )
+        elif queue.arguments != arguments:
+            raise ValueError(f"Queue {name} exists with different arguments")
+        return queue
+
+    def publish(self, exchange: Exchange, message, routing_key: str):
+        envelope = Envelope(message, exchange.name, routing_key)
+        self.route(exchange, envelope, routing_key)
+
+    def route(self, exchange: Exchange, envelope: Envelope, routing_key: str):
+        queues = exchange.route(envelope, routing_key)
+        if not queues:
+            logger.debug(f"Unroutable message to {exchange.name!r} ({routing_key})")
+        for index, queue in enumerate(queues):
+            queue.enqueue(envelope if index == 0 else envelope.copy())
+
+    def drop_exclusive_queues(self, connection: Connection):
+        for name, queue in list(self.queues.items()):
+            if queue.owner is connection:
+                del self.queues[name]
+                for exchange in self.exchanges.values():
+                    exchange.remove_destination(queue)
+
+
+_brokers: Dict[str, MemoryBroker] = {}
+
+
+def get_broker(url: str = "memory://") -> MemoryBroker:
+    """Brokers are per process and per URL, shared by every connection"""
+    if url not in _brokers:
+        _brokers[url] = MemoryBroker()
+    return _brokers[url]
+
+
+async def connect(url: str = "memory://", **kwargs) -> Connection:
+    """Drop-in for ``aio_pika.connect_robust``"""
+    return Connection(get_broker(url if url.startswith("memory://") else "memory://"))
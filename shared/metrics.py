@@ -0,0 +1,106 @@
+"""
+Prometheus metrics for the shared message queue.
+
+Registered on the default registry, so every service exposes them through
+its existing ``/metrics`` endpoint.
+"""
+
+from prometheus_client import Counter, Histogram, Gauge
+
+MQ_PUBLISHED = Counter(
+    "mq_published_total", "Messages published to the broker", ["message_type"]
+)
+
+MQ_PUBLISH_DURATION = Histogram(
+    "mq_publish_duration_seconds",
+    "Time from publish to broker confirm",
+    ["message_type"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+MQ_PUBLISH_ERRORS = Counter(
+    "mq_publish_errors_total", "Publishes rejected or failed", ["message_type"]
+)
+
+MQ_CONFIRMS_IN_FLIGHT = Gauge(
+    "mq_publisher_confirms_in_flight", "Publishes awaiting a broker confirm"
+)
+
+MQ_MESSAGES_HANDLED = Counter(
+    "mq_messages_handled_total",
+    "Messages handled by consumers",
+    ["queue", "status"],
+)
+
+MQ_HANDLER_DURATION = Histogram(
+    "mq_handler_duration_seconds",
+    "Time spent in message handlers",
+    ["queue"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+
+MQ_HANDLERS_IN_FLIGHT = Gauge(
+    "mq_handlers_in_flight", "Messages currently being handled", ["queue"]
+)
+
+MQ_BATCH_SIZE = Histogram(
+    "mq_batch_size",
+    "Messages per batch delivered to batch handlers",
+    ["queue"],
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500),
+)
+
+MQ_CONSUMER_LAG = Histogram(
+    "mq_consumer_lag_seconds",
+    "Time from publish until a consumer finished handling the message",
+    ["queue"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0),
+)
+
+MQ_REDELIVERED = Counter(
+    "mq_messages_redelivered_total",
+    "Deliveries flagged by the broker as redelivered",
+    ["queue"],
+)
+
+MQ_QUEUE_DEPTH = Gauge(
+    "mq_queue_depth", "Messages ready in a queue, sampled by the probe", ["queue"]
+)
+
+MQ_QUEUE_CONSUMERS = Gauge(
+    "mq_queue_consumers",
+    "Consumers attached to a queue, sampled by the probe",
+    ["queue"],
+)
+
+MQ_RETRIED = Counter(
+    "mq_messages_retried_total",
+    "Failed messages moved to a delayed retry queue",
+    ["queue"],
+)
+
+MQ_DEAD_LETTERED = Counter(
+    "mq_messages_dead_lettered_total",
+    "Messages moved to the dead-letter queue",
+    ["queue"],
+)
+
+MQ_REDRIVEN = Counter(
+    "mq_messages_redriven_total",
+    "Dead letters replayed onto their work queue",
+    ["queue"],
+)
+
+MQ_BUFFER_DEPTH = Gauge(
+    "mq_buffer_depth", "Events waiting in the local fire-and-forget buffer"
+)
+
+MQ_BUFFER_DROPPED = Counter(
+    "mq_buffer_dropped_total",
+    "Buffered events dropped before reaching the broker",
+    ["policy"],
+)
+
+MQ_BUFFER_SPILLED = Counter(
+    "mq_buffer_spilled_total", "Buffered events spilled to the local file"
+)
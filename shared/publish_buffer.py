@@ -0,0 +1,229 @@
+"""
+Fire-and-forget publishing through a bounded local buffer.
+
+For events where losing a message is acceptable (registrations, analytics)
+request handlers should not wait for RabbitMQ. BufferedPublisher keeps
+pending events in an in-memory ring buffer that a background task flushes
+with ``MessageQueue.publish_many``. When the buffer is full the overflow
+policy decides what happens:
+
+- ``drop_oldest``: evict the oldest pending event (default)
+- ``block``: make the caller wait for room
+- ``spill``: append the event to a local NDJSON file, replayed once the
+  broker keeps up again
+"""
+
+import asyncio
+import contextlib
+import logging
+import os
+from collections import deque
+from enum import Enum
+from typing import Any, Dict, List, Tuple
+
+from .metrics import MQ_BUFFER_DEPTH, MQ_BUFFER_DROPPED, MQ_BUFFER_SPILLED
+from .serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+
+class OverflowPolicy(str, Enum):
+    DROP_OLDEST = "drop_oldest"
+    BLOCK = "block"
+    SPILL = "spill"
+
+
+class BufferedPublisher:
+    def __init__(
+        self,
+        message_queue,
+        capacity: int = None,
+        batch_size: int = None,
+        flush_interval: float = None,
+        overflow: OverflowPolicy = None,
+        spill_path: str = None,
+    ):
+        self.message_queue = message_queue
+        self.capacity = capacity or int(os.getenv("RABBITMQ_BUFFER_CAPACITY", 10000))
+        self.batch_size = batch_size or int(
+            os.getenv("RABBITMQ_BUFFER_BATCH_SIZE", 100)
+        )
+        self.flush_interval = flush_interval or float(
+            os.getenv("RABBITMQ_BUFFER_FLUSH_INTERVAL", 0.05)
+        )
+        self.overflow = OverflowPolicy(
+            overflow
+            or os.getenv("RABBITMQ_BUFFER_OVERFLOW", OverflowPolicy.DROP_OLDEST)
+        )
+        self.spill_path = spill_path or os.getenv(
+            "RABBITMQ_BUFFER_SPILL_PATH", "mq_buffer_spill.ndjson"
+        )
+        self.max_backoff = 30.0
+
+        self._buffer: deque = deque()
+        # Events taken for the publish in progress; they keep their room in
+        # the buffer until the broker has them
+        self._in_flight = 0
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+        self._task = None
+
+    @property
+    def depth(self) -> int:
+        return len(self._buffer)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def put(self, message_type, data: Dict[str, Any]):
+        """Queue an event for publishing; only waits under the block policy"""
+        while len(self._buffer) + self._in_flight >= self.capacity:
+            if self.overflow == OverflowPolicy.BLOCK:
+                self._not_full.clear()
+                await self._not_full.wait()
+            elif self.overflow == OverflowPolicy.SPILL:
+                self._spill([(message_type, data)])
+                return
+            elif self._buffer:
+                self._buffer.popleft()
+                MQ_BUFFER_DROPPED.labels(policy=self.overflow.value).inc()
+            else:
+                break
+
+        self._buffer.append((message_type, data))
+        MQ_BUFFER_DEPTH.set(len(self._buffer))
+        self._not_empty.set()
+
+    def _take_batch(self) -> List[Tuple[Any, Dict[str, Any]]]:
+        batch = []
+        while self._buffer and len(batch) < self.batch_size:
+            batch.append(self._buffer.popleft())
+        self._in_flight = len(batch)
+        MQ_BUFFER_DEPTH.set(len(self._buffer))
+        return batch
+
+    def _requeue(self, batch):
+        """Put a failed batch back at the front, honouring the capacity"""
+        room = max(self.capacity - len(self._buffer), 0)
+        keep, overflow = batch[:room], batch[room:]
+        self._buffer.extendleft(reversed(keep))
+        if overflow:
+            if self.overflow == OverflowPolicy.SPILL:
+                self._spill(overflow)
+            else:
+                MQ_BUFFER_DROPPED.labels(policy=self.overflow.value).inc(len(overflow))
+        MQ_BUFFER_DEPTH.set(len(self._buffer))
+
+    def _spill(self, events):
+        with open(self.spill_path, "ab") as spill_file:
+            for message_type, data in events:
+                spill_file.write(dumps({"type": message_type, "data": data}) + b"\n")
+        MQ_BUFFER_SPILLED.inc(len(events))
+
+    async def _replay_spill(self):
+        """
+        Publish spilled events once the in-memory buffer is drained.
+
+        The number of events already published is kept next to the draining
+        file, so a replay that failed part-way resumes after them.
+        """
+        draining = f"{self.spill_path}.draining"
+        offset_path = f"{draining}.offset"
+        if not os.path.exists(draining):
+            if not os.path.exists(self.spill_path):
+                return
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(offset_path)
+            os.replace(self.spill_path, draining)
+
+        with open(draining, "rb") as spill_file:
+            events = [loads(line) for line in spill_file if line.strip()]
+        sent = 0
+        if os.path.exists(offset_path):
+            with open(offset_path) as offset_file:
+                sent = int(offset_file.read() or 0)
+        for start in range(sent, len(events), self.batch_size):
+            chunk = events[start : start + self.batch_size]
+            await self.message_queue.publish_many(
+                (self._message_type(event["type"]), event["data"]) for event in chunk
+            )
+            with open(offset_path, "w") as offset_file:
+                offset_file.write(str(start + len(chunk)))
+        os.remove(draining)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(offset_path)
+        logger.info(f"Replayed {len(events) - sent} spilled events")
+
+    def _message_type(self, value):
+        from .message_queue import MessageType
+
+        return MessageType(value)
+
+    async def flush(self):
+        """
+        Publish everything currently buffered.
+
+        A batch is only released once published; if the publish fails or is
+        cancelled it goes back to the front of the buffer. Under the block
+        policy its room was never given away, so it always fits back.
+        """
+        while self._buffer:
+            batch = self._take_batch()
+            try:
+                await self.message_queue.publish_many(batch)
+            except BaseException:
+                self._in_flight = 0
+                self._requeue(batch)
+                raise
+            self._in_flight = 0
+            self._not_full.set()
+
+    async def _run(self):
+        backoff = self.flush_interval
+        while True:
+            if not self._buffer:
+                self._not_empty.clear()
+                try:
+                    await asyncio.wait_for(self._not_empty.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+            try:
+                await self.flush()
+                if self.overflow == OverflowPolicy.SPILL:
+                    await self._replay_spill()
+                backoff = self.flush_interval
+                await asyncio.sleep(self.flush_interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(
+                    f"Buffered publish failed, retrying in {backoff:.2f}s: {e}"
+                )
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+
+    async def stop(self, timeout: float = 5.0):
+        """Stop the flusher, trying to publish what is left first"""
+        if self._task:
+            self._task.cancel()
+            # Let a publish in progress put its batch back before the last flush
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        try:
+            await asyncio.wait_for(self.flush(), timeout=timeout)
+        except Exception as e:
+            pending = self._drain()
+            if self.overflow == OverflowPolicy.SPILL:
+                self._spill(pending)
+            else:
+                MQ_BUFFER_DROPPED.labels(policy="shutdown").inc(len(pending))
+            logger.warning(f"{len(pending)} buffered events not published: {e}")
+
+    def _drain(self):
+        pending = list(self._buffer)
+        self._buffer.clear()
+        MQ_BUFFER_DEPTH.set(0)
+        return pending
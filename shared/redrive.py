@@ -0,0 +1,87 @@
+"""
+Replay dead letters onto their work queue.
+
+Messages land in ``<queue>.dlq`` once they have failed ``max_attempts``
+times. After the cause is fixed they can be re-driven in bulk: each message
+is published back to ``<queue>`` with its attempt count reset, at no more
+than ``rate`` messages per second so a large backlog does not overwhelm the
+consumers or the dependency that failed in the first place.
+
+Usage:
+    python -m shared.redrive product_service.order.created [--rate 50] [--limit 1000]
+"""
+
+import argparse
+import asyncio
+import logging
+from typing import Optional
+
+from .message_queue import ATTEMPT_HEADER, MessageQueue
+from .metrics import MQ_REDRIVEN
+
+logger = logging.getLogger(__name__)
+
+
+async def redrive(
+    message_queue: MessageQueue,
+    queue_name: str,
+    rate: float = 50,
+    limit: Optional[int] = None,
+) -> int:
+    """Move up to ``limit`` dead letters back to ``queue_name``; returns the count"""
+    if not message_queue.connection:
+        await message_queue.connect()
+
+    channel = await message_queue.connection.channel()
+    dead_letters = await channel.declare_queue(
+        message_queue.dead_letter_queue_name(queue_name), durable=True
+    )
+    loop = asyncio.get_running_loop()
+    interval = 1 / rate
+    started = loop.time()
+    moved = 0
+    try:
+        while limit is None or moved < limit:
+            message = await dead_letters.get(no_ack=False, fail=False)
+            if message is None:
+                break
+
+            headers = dict(message.headers or {})
+            headers.pop(ATTEMPT_HEADER, None)
+            try:
+                await message_queue._republish(queue_name, message, headers)
+            except Exception:
+                await message.nack(requeue=True)
+                raise
+            await message.ack()
+            moved += 1
+            MQ_REDRIVEN.labels(queue=queue_name).inc()
+
+            delay = started + moved * interval - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+    finally:
+        await channel.close()
+
+    logger.info(f"Re-drove {moved} dead letters to {queue_name}")
+    return moved
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("queue", help="work queue, e.g. product_service.order.created")
+    parser.add_argument("--rate", type=float, default=50, help="messages per second")
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    message_queue = MessageQueue()
+    try:
+        moved = await redrive(message_queue, args.queue, args.rate, args.limit)
+    finally:
+        await message_queue.close()
+    print(f"Re-drove {moved} messages to {args.queue}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import Optional, List
 from datetime import datetime
 from enum import Enum
@@ -39,6 +39,8 @@ class ProductBase(BaseModel):
     price: float
     category: str
     stock: int
+    # Supplier SKU, unique; bulk imports create or update products by it
+    sku: Optional[str] = Field(None, max_length=64)
 
 
 class ProductCreate(ProductBase):
@@ -53,6 +55,48 @@ class ProductResponse(ProductBase):
         orm_mode = True
 
 
+class ProductImportRow(ProductCreate):
+    sku: str = Field(..., min_length=1, max_length=64)
+
+
+class ProductImportError(BaseModel):
+    row: int
+    sku: Optional[str]
+    errors: List[str]
+
+
+class ProductImportReport(BaseModel):
+    received: int
+    created: int
+    updated: int
+    failed: int
+    # Written products whose PRODUCT_UPDATED event could not be published
+    unpublished: int = 0
+    errors: List[ProductImportError]
+
+
+class ProductBatchRequest(BaseModel):
+    ids: List[str] = Field(..., min_length=1, max_length=1000)
+
+
+class ProductBatch(BaseModel):
+    # In the requested order; ids without a product are listed in missing
+    products: List[ProductResponse]
+    missing: List[str]
+
+
+class CategoryFacet(BaseModel):
+    category: Optional[str]
+    products: int
+    in_stock: int
+
+
+class ProductFacets(BaseModel):
+    total: int
+    in_stock: int
+    categories: List[CategoryFacet]
+
+
 class ProductUpdate(BaseModel):
     name: Optional[str] = None
     description: Optional[str] = None
@@ -71,6 +115,8 @@ class OrderItem(BaseModel):
 class OrderCreate(BaseModel):
     items: List[OrderItem]
     total_amount: float
+    # Stock held through product_service /reservations, confirmed with the order
+    reservation_id: Optional[str] = None
 
 
 class OrderResponse(BaseModel):
@@ -85,6 +131,24 @@ class OrderResponse(BaseModel):
         orm_mode = True
 
 
+# Inventory reservation models
+class ReservationItem(BaseModel):
+    product_id: str
+    quantity: int = Field(..., gt=0)
+
+
+class ReservationCreate(BaseModel):
+    items: List[ReservationItem] = Field(..., min_length=1)
+    # Seconds to hold the stock; the service default when omitted
+    ttl: Optional[int] = Field(None, gt=0, le=3600)
+
+
+class ReservationResponse(BaseModel):
+    reservation_id: str
+    items: List[ReservationItem]
+    expires_at: float
+
+
 # Auth models
 class Token(BaseModel):
     access_token: str
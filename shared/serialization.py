@@ -0,0 +1,46 @@
+"""
+Shared JSON codec.
+
+orjson-backed encoding used for HTTP responses, cache values and message
+bodies in every service. Datetimes, enums and UUIDs are encoded natively;
+Pydantic models, decimals and sets fall back to ``_default``.
+"""
+
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+
+def _default(obj: Any):
+    if isinstance(obj, BaseModel):
+        return obj.dict()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(obj: Any, sort_keys: bool = False) -> bytes:
+    """Encode ``obj`` to JSON bytes"""
+    option = orjson.OPT_NON_STR_KEYS
+    if sort_keys:
+        option |= orjson.OPT_SORT_KEYS
+    return orjson.dumps(obj, default=_default, option=option)
+
+
+def loads(data) -> Any:
+    """Decode JSON from bytes or str"""
+    return orjson.loads(data)
+
+
+class ORJSONResponse(JSONResponse):
+    """Default response class for all services"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
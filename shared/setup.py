@@ -4,5 +4,10 @@ setup(
     name="ecommerce-schemas",
     version="0.1.0",
     packages=find_packages(),
-    install_requires=["pydantic>=1.8.0"],
+    install_requires=[
+        "pydantic>=1.8.0",
+        "orjson>=3.8.0",
+        "msgpack>=1.0.0",
+        "zstandard>=0.19.0",
+    ],
 )
@@ -17,6 +17,34 @@ def event_loop() -> Generator[asyncio.AbstractEventLoop, None, None]:
     loop.close()
 
 
+class FakeRedis:
+    """Dict-backed stand-in for the async Redis commands the store uses"""
+
+    def __init__(self):
+        self.data = {}
+        self.calls = 0
+
+    async def set(self, key, value, nx=False, ex=None):
+        self.calls += 1
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    async def get(self, key):
+        self.calls += 1
+        return self.data.get(key)
+
+    async def delete(self, key):
+        self.calls += 1
+        self.data.pop(key, None)
+
+
+@pytest.fixture
+def fake_redis():
+    return FakeRedis()
+
+
 @pytest.fixture(scope="function")
 def test_db_session():
     """Create a fresh database session for each test."""
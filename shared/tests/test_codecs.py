@@ -0,0 +1,66 @@
+from datetime import datetime
+
+import pytest
+
+from shared.codecs import JSON, MSGPACK, ZSTD, decode, encode
+from shared.message_queue import MessageType
+
+EVENT = {
+    "type": MessageType.ORDER_CREATED,
+    "data": {
+        "id": "order-1",
+        "items": [{"product_id": f"prod-{i}", "quantity": i} for i in range(50)],
+        "created_at": datetime(2024, 1, 2, 3, 4, 5),
+    },
+}
+
+DECODED = {
+    "type": "order.created",
+    "data": {
+        "id": "order-1",
+        "items": [{"product_id": f"prod-{i}", "quantity": i} for i in range(50)],
+        "created_at": "2024-01-02T03:04:05",
+    },
+}
+
+
+class TestCodecs:
+    @pytest.mark.parametrize("content_type", [JSON, MSGPACK])
+    def test_round_trip(self, content_type):
+        """Test each codec decodes to the same payload"""
+        body, returned_type, encoding = encode(EVENT, content_type)
+
+        assert returned_type == content_type
+        assert encoding is None
+        assert decode(body, content_type) == DECODED
+
+    def test_msgpack_is_smaller(self):
+        """Test msgpack bodies are more compact than JSON"""
+        json_body, _, _ = encode(EVENT, JSON)
+        msgpack_body, _, _ = encode(EVENT, MSGPACK)
+
+        assert len(msgpack_body) < len(json_body)
+
+    def test_compression_above_threshold(self):
+        """Test large bodies are zstd-compressed and decoded from the header"""
+        body, _, encoding = encode(EVENT, MSGPACK, compress_threshold=256)
+
+        assert encoding == ZSTD
+        assert decode(body, MSGPACK, encoding) == DECODED
+
+    def test_small_bodies_not_compressed(self):
+        """Test bodies under the threshold are sent as-is"""
+        _, _, encoding = encode({"id": 1}, JSON, compress_threshold=256)
+
+        assert encoding is None
+
+    def test_missing_content_type_is_json(self):
+        """Test messages from older publishers still decode"""
+        body, _, _ = encode(EVENT, JSON)
+
+        assert decode(body, None) == DECODED
+
+    def test_unknown_content_type(self):
+        """Test an unsupported content type is rejected"""
+        with pytest.raises(ValueError):
+            decode(b"", "text/plain")
@@ -0,0 +1,130 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from shared.deadline import (
+    DEADLINE_HEADER,
+    TIMEOUT_HEADER,
+    DeadlineExceeded,
+    deadline_headers,
+    downstream_timeout,
+    install_deadline_middleware,
+    install_statement_timeout,
+    parse_deadline,
+    reset_deadline,
+    set_deadline,
+)
+
+
+@pytest.fixture
+def deadline_app():
+    app = FastAPI()
+    install_deadline_middleware(app)
+
+    @app.get("/fast")
+    async def fast():
+        return {"headers": deadline_headers()}
+
+    @app.get("/slow")
+    async def slow():
+        await asyncio.sleep(1)
+        return {"status": "done"}
+
+    return app
+
+
+class TestParseDeadline:
+    def test_explicit_deadline_header(self):
+        """Test absolute deadline header is parsed as epoch milliseconds"""
+        deadline = parse_deadline({DEADLINE_HEADER: "1700000000500"})
+        assert deadline == 1700000000.5
+
+    def test_relative_timeout_header(self):
+        """Test client timeout header is turned into an absolute deadline"""
+        before = time.time()
+        deadline = parse_deadline({TIMEOUT_HEADER: "2"}, default_timeout=30)
+        assert before + 2 <= deadline <= time.time() + 2
+
+    def test_max_timeout_caps_client_request(self):
+        """Test a client cannot ask for more than the configured maximum"""
+        deadline = parse_deadline({TIMEOUT_HEADER: "600"}, max_timeout=5)
+        assert deadline <= time.time() + 5
+
+    def test_no_deadline(self):
+        """Test missing headers and default yield no deadline"""
+        assert parse_deadline({}) is None
+
+    def test_malformed_header_ignored(self):
+        """Test malformed headers fall back to the default timeout"""
+        deadline = parse_deadline({DEADLINE_HEADER: "soon"}, default_timeout=1)
+        assert deadline <= time.time() + 1
+
+
+class TestDeadlineContext:
+    def test_downstream_timeout_capped_by_deadline(self):
+        """Test downstream timeouts never outlive the request deadline"""
+        token = set_deadline(time.time() + 1)
+        try:
+            assert downstream_timeout(10) <= 1
+            assert DEADLINE_HEADER in deadline_headers()
+        finally:
+            reset_deadline(token)
+
+    def test_downstream_timeout_without_deadline(self):
+        """Test the default timeout is used outside a request"""
+        assert downstream_timeout(10) == 10
+        assert deadline_headers() == {}
+
+    def test_downstream_timeout_after_deadline(self):
+        """Test no downstream call is attempted once the deadline passed"""
+        token = set_deadline(time.time() - 1)
+        try:
+            with pytest.raises(DeadlineExceeded):
+                downstream_timeout(10)
+        finally:
+            reset_deadline(token)
+
+    def test_statement_refused_after_deadline(self):
+        """Test database statements are refused once the deadline passed"""
+        engine = create_engine("sqlite:///:memory:")
+        install_statement_timeout(engine)
+
+        token = set_deadline(time.time() - 1)
+        try:
+            with engine.connect() as conn:
+                with pytest.raises(DeadlineExceeded):
+                    conn.execute(text("SELECT 1"))
+        finally:
+            reset_deadline(token)
+
+
+class TestDeadlineMiddleware:
+    def test_expired_request_rejected(self, deadline_app):
+        """Test requests whose deadline already passed are rejected at the door"""
+        client = TestClient(deadline_app)
+        expired = str(int((time.time() - 1) * 1000))
+
+        response = client.get("/fast", headers={DEADLINE_HEADER: expired})
+
+        assert response.status_code == 504
+
+    def test_deadline_propagated(self, deadline_app):
+        """Test the deadline is visible to handlers for downstream calls"""
+        client = TestClient(deadline_app)
+
+        response = client.get("/fast", headers={TIMEOUT_HEADER: "5"})
+
+        assert response.status_code == 200
+        assert DEADLINE_HEADER in response.json()["headers"]
+
+    def test_slow_request_cancelled(self, deadline_app):
+        """Test in-flight work is cancelled when the deadline elapses"""
+        client = TestClient(deadline_app)
+
+        response = client.get("/slow", headers={TIMEOUT_HEADER: "0.1"})
+
+        assert response.status_code == 504
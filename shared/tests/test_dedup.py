@@ -0,0 +1,86 @@
+import pytest
+from unittest.mock import AsyncMock
+
+from shared.dedup import Deduplicator, MessageInFlight
+
+
+@pytest.fixture
+def store(fake_redis):
+    return Deduplicator(fake_redis, lru_size=2)
+
+
+class TestDeduplicator:
+    def test_first_claim_processes(self, event_loop, store):
+        """Test an unseen id is claimed for processing"""
+        assert event_loop.run_until_complete(store.claim("q:msg-1")) is True
+
+    def test_completed_id_skipped(self, event_loop, store):
+        """Test an id is skipped once it was processed"""
+
+        async def run():
+            await store.claim("q:msg-1")
+            await store.complete("q:msg-1")
+            return await store.claim("q:msg-1")
+
+        assert event_loop.run_until_complete(run()) is False
+
+    def test_lru_avoids_redis(self, event_loop, store):
+        """Test recently processed ids are answered from memory"""
+
+        async def run():
+            await store.claim("q:msg-1")
+            await store.complete("q:msg-1")
+            calls = store.redis.calls
+            assert await store.claim("q:msg-1") is False
+            return calls
+
+        calls = event_loop.run_until_complete(run())
+        assert store.redis.calls == calls
+
+    def test_redis_remembers_evicted_ids(self, event_loop, store):
+        """Test ids evicted from the LRU are still found in Redis"""
+
+        async def run():
+            for i in range(3):
+                await store.claim(f"q:msg-{i}")
+                await store.complete(f"q:msg-{i}")
+            return await store.claim("q:msg-0")
+
+        assert event_loop.run_until_complete(run()) is False
+
+    def test_concurrent_claim_in_flight(self, event_loop, store):
+        """Test a second claim while the first is processing is refused"""
+
+        async def run():
+            await store.claim("q:msg-1")
+            await store.claim("q:msg-1")
+
+        with pytest.raises(MessageInFlight):
+            event_loop.run_until_complete(run())
+
+    def test_release_allows_retry(self, event_loop, store):
+        """Test a failed message can be claimed again after release"""
+
+        async def run():
+            await store.claim("q:msg-1")
+            await store.release("q:msg-1")
+            return await store.claim("q:msg-1")
+
+        assert event_loop.run_until_complete(run()) is True
+
+    def test_redis_down_fails_open(self, event_loop):
+        """Test consumption continues on the local cache when Redis fails"""
+        redis = AsyncMock()
+        redis.set.side_effect = ConnectionError("redis down")
+        store = Deduplicator(redis)
+
+        assert event_loop.run_until_complete(store.claim("q:msg-1")) is True
+
+    def test_redis_down_on_reclaim_fails_open(self, event_loop):
+        """Test a Redis error on the second claim attempt also fails open"""
+        redis = AsyncMock()
+        redis.set.side_effect = [None, ConnectionError("redis down")]
+        redis.get.return_value = None
+        store = Deduplicator(redis)
+
+        assert event_loop.run_until_complete(store.claim("q:msg-1")) is True
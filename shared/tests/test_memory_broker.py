@@ -0,0 +1,323 @@
+import asyncio
+import uuid
+
+import aio_pika
+import pytest
+
+from shared import memory_broker
+from shared.message_queue import MessageQueue, MessageType
+
+
+@pytest.fixture
+def broker_url():
+    return f"memory://test-{uuid.uuid4().hex}"
+
+
+@pytest.fixture
+def memory_mq(broker_url):
+    def build(service_name="test_service"):
+        mq = MessageQueue()
+        mq.rabbitmq_url = broker_url
+        mq.broker = "memory"
+        mq.service_name = service_name
+        mq.retry_delay_ms = 10
+        mq.max_attempts = 3
+        return mq
+
+    return build
+
+
+def message(body=b"{}"):
+    return aio_pika.Message(body=body, content_type="application/json")
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+class TestMemoryBroker:
+    def test_topic_routing(self, event_loop, broker_url):
+        """Test topic bindings match ``*`` and ``#`` like RabbitMQ"""
+
+        async def run():
+            connection = await memory_broker.connect(broker_url)
+            channel = await connection.channel()
+            exchange = await channel.declare_exchange(
+                "events", aio_pika.ExchangeType.TOPIC
+            )
+            created = await channel.declare_queue("created")
+            orders = await channel.declare_queue("orders")
+            everything = await channel.declare_queue("everything")
+            await created.bind(exchange, routing_key="order.created")
+            await orders.bind(exchange, routing_key="order.*")
+            await everything.bind(exchange, routing_key="#")
+
+            for key in ("order.created", "order.cancelled", "product.updated"):
+                await exchange.publish(message(key.encode()), routing_key=key)
+
+            counts = {}
+            for queue in (created, orders, everything):
+                counts[queue.name] = 0
+                while await queue.get(no_ack=True, fail=False):
+                    counts[queue.name] += 1
+            return counts
+
+        counts = event_loop.run_until_complete(run())
+        assert counts == {"created": 1, "orders": 2, "everything": 3}
+
+    def test_prefetch_and_ack(self, event_loop, broker_url):
+        """Test a consumer gets at most ``prefetch`` unacked messages"""
+
+        async def run():
+            connection = await memory_broker.connect(broker_url)
+            channel = await connection.channel()
+            await channel.set_qos(prefetch_count=2)
+            queue = await channel.declare_queue("work")
+            for i in range(5):
+                await channel.default_exchange.publish(message(), routing_key="work")
+
+            iterator = queue.iterator()
+            await iterator.__aenter__()
+            consumer = iterator.consumer
+            first = await iterator.__anext__()
+            second = await iterator.__anext__()
+            assert consumer.deliveries.empty()
+
+            await second.ack(multiple=True)
+            await settle()
+            assert consumer.deliveries.qsize() == 2
+            assert first.delivery_tag not in channel.unacked
+            await iterator.close()
+
+        event_loop.run_until_complete(run())
+
+    def test_unacked_requeued_on_close(self, event_loop, broker_url):
+        """Test messages not acked before the channel closes are redelivered"""
+
+        async def run():
+            connection = await memory_broker.connect(broker_url)
+            channel = await connection.channel()
+            queue = await channel.declare_queue("work", durable=True)
+            await channel.default_exchange.publish(message(), routing_key="work")
+            delivery = await queue.get()
+            await connection.close()
+
+            connection = await memory_broker.connect(broker_url)
+            channel = await connection.channel()
+            queue = await channel.declare_queue("work", durable=True)
+            redelivered = await queue.get()
+            return delivery, redelivered
+
+        delivery, redelivered = event_loop.run_until_complete(run())
+        assert not delivery.redelivered
+        assert redelivered.redelivered
+
+    def test_close_drops_deliveries_not_handed_out(self, event_loop, broker_url):
+        """Test a closed channel's consumer stops at once, its messages requeued"""
+
+        async def run():
+            connection = await memory_broker.connect(broker_url)
+            channel = await connection.channel()
+            queue = await channel.declare_queue("work", durable=True)
+            for _ in range(3):
+                await channel.default_exchange.publish(message(), routing_key="work")
+            iterator = queue.iterator()
+            await iterator.__aenter__()
+            first = await iterator.__anext__()
+            await channel.close()
+
+            with pytest.raises(StopAsyncIteration):
+                await iterator.__anext__()
+            return first, queue.declaration_result.message_count
+
+        first, ready = event_loop.run_until_complete(run())
+        assert ready == 3
+        assert not first.redelivered
+
+    def test_ttl_dead_letters(self, event_loop, broker_url):
+        """Test expired messages are dead-lettered to the configured queue"""
+
+        async def run():
+            connection = await memory_broker.connect(broker_url)
+            channel = await connection.channel()
+            target = await channel.declare_queue("work")
+            await channel.declare_queue(
+                "work.retry",
+                arguments={
+                    "x-message-ttl": 20,
+                    "x-dead-letter-exchange": "",
+                    "x-dead-letter-routing-key": "work",
+                },
+            )
+            await channel.default_exchange.publish(
+                message(b"later"), routing_key="work.retry"
+            )
+            assert await target.get(fail=False) is None
+            await asyncio.sleep(0.05)
+            return await target.get(fail=False)
+
+        delivered = event_loop.run_until_complete(run())
+        assert delivered.body == b"later"
+        assert delivered.headers["x-death"][0]["reason"] == "expired"
+
+    def test_exclusive_queue_removed_with_connection(self, event_loop, broker_url):
+        """Test exclusive queues only live as long as their connection"""
+
+        async def run():
+            connection = await memory_broker.connect(broker_url)
+            channel = await connection.channel()
+            queue = await channel.declare_queue(exclusive=True)
+            await connection.close()
+            return queue.name
+
+        name = event_loop.run_until_complete(run())
+        assert name not in memory_broker.get_broker(broker_url).queues
+
+
+class TestMessageQueueOnMemoryBroker:
+    def test_publish_and_consume(self, event_loop, memory_mq):
+        """Test an event flows from publisher to every consuming service"""
+        publisher = memory_mq("order_service")
+        products = memory_mq("product_service")
+        users = memory_mq("user_service")
+        received = {"product_service": [], "user_service": []}
+
+        async def run():
+            for mq in (publisher, products, users):
+                await mq.connect()
+            tasks = [
+                asyncio.create_task(
+                    mq.consume_messages(
+                        MessageType.ORDER_CREATED,
+                        lambda body, name=mq.service_name: received[name].append(
+                            body["data"]["id"]
+                        ),
+                    )
+                )
+                for mq in (products, users)
+            ]
+            await settle()
+            await publisher.publish_many(
+                (MessageType.ORDER_CREATED, {"id": f"order-{i}"}) for i in range(3)
+            )
+            await asyncio.sleep(0.05)
+            for task in tasks:
+                task.cancel()
+            for mq in (publisher, products, users):
+                await mq.close()
+
+        event_loop.run_until_complete(run())
+        expected = [f"order-{i}" for i in range(3)]
+        assert sorted(received["product_service"]) == expected
+        assert sorted(received["user_service"]) == expected
+
+    def test_retry_then_dead_letter(self, event_loop, memory_mq):
+        """Test a failing message is retried with delays, then dead-lettered"""
+        publisher = memory_mq("order_service")
+        consumer = memory_mq("product_service")
+        attempts = []
+
+        async def handler(body):
+            attempts.append(body["data"]["id"])
+            raise RuntimeError("always fails")
+
+        async def run():
+            await publisher.connect()
+            await consumer.connect()
+            task = asyncio.create_task(
+                consumer.consume_messages(MessageType.ORDER_CREATED, handler)
+            )
+            await settle()
+            await publisher.publish_message(MessageType.ORDER_CREATED, {"id": "bad"})
+            await asyncio.sleep(0.15)
+            task.cancel()
+
+            channel = await consumer.connection.channel()
+            dlq = await channel.declare_queue(
+                "product_service.order.created.dlq", durable=True
+            )
+            dead = await dlq.get(fail=False)
+            await publisher.close()
+            await consumer.close()
+            return dead
+
+        dead = event_loop.run_until_complete(run())
+        assert attempts == ["bad"] * 3
+        assert dead.headers["x-attempt"] == 3
+
+    def test_consistent_hash_partitions_replicas(self, event_loop, memory_mq):
+        """Test consistent hashing sends each key to a single replica"""
+        publisher = memory_mq("order_service")
+        publisher.set_partition_key(MessageType.ORDER_CREATED, lambda o: o["key"])
+        replicas = []
+        for replica_id in ("0", "1"):
+            mq = memory_mq("product_service")
+            mq.consistent_hash = True
+            mq.replica_id = replica_id
+            replicas.append(mq)
+        received = {"0": [], "1": []}
+
+        async def run():
+            for mq in [publisher] + replicas:
+                await mq.connect()
+            tasks = [
+                asyncio.create_task(
+                    mq.consume_partitioned(
+                        MessageType.ORDER_CREATED,
+                        lambda body, r=mq.replica_id: received[r].append(
+                            body["data"]["key"]
+                        ),
+                        lanes=4,
+                    )
+                )
+                for mq in replicas
+            ]
+            await settle()
+            await publisher.publish_many(
+                (MessageType.ORDER_CREATED, {"key": f"key-{i % 20}"})
+                for i in range(100)
+            )
+            await asyncio.sleep(0.1)
+            for task in tasks:
+                task.cancel()
+            for mq in [publisher] + replicas:
+                await mq.close()
+
+        event_loop.run_until_complete(run())
+        assert len(received["0"]) + len(received["1"]) == 100
+        assert received["0"] and received["1"]
+        assert not set(received["0"]) & set(received["1"])
+
+    def test_subscribe_reaches_every_replica(self, event_loop, memory_mq):
+        """Test every replica of a service gets its own copy of each event"""
+        publisher = memory_mq("product_service")
+        replicas = [memory_mq("product_service") for _ in range(2)]
+        received = [[], []]
+
+        async def run():
+            for mq in [publisher] + replicas:
+                await mq.connect()
+            tasks = [
+                asyncio.create_task(
+                    mq.subscribe(
+                        MessageType.PRODUCT_UPDATED,
+                        lambda body, seen=seen: seen.append(body["data"]["id"]),
+                    )
+                )
+                for mq, seen in zip(replicas, received)
+            ]
+            await settle()
+            await publisher.publish_many(
+                (MessageType.PRODUCT_UPDATED, {"id": f"prod-{i}"}) for i in range(3)
+            )
+            await asyncio.sleep(0.05)
+            for task in tasks:
+                task.cancel()
+            for mq in [publisher] + replicas:
+                await mq.close()
+
+        event_loop.run_until_complete(run())
+        expected = [f"prod-{i}" for i in range(3)]
+        assert sorted(received[0]) == expected
+        assert sorted(received[1]) == expected
@@ -0,0 +1,661 @@
+import asyncio
+import threading
+
+import time
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from prometheus_client import REGISTRY
+
+from aio_pika.pool import Pool
+
+from shared.dedup import Deduplicator
+from shared.message_queue import BatchFailure, MessageQueue, MessageType
+from shared.serialization import dumps, loads
+
+
+@pytest.fixture
+def publish_channel():
+    publisher = MagicMock()
+    publisher.exchange.publish = AsyncMock()
+    return publisher
+
+
+@pytest.fixture
+def mq(publish_channel):
+    queue = MessageQueue()
+    queue.connection = MagicMock()
+    queue.publish_channels = Pool(AsyncMock(return_value=publish_channel), max_size=1)
+    return queue
+
+
+class TestMessageQueuePublishing:
+    def test_publish_message(self, event_loop, mq, publish_channel):
+        """Test a message is published with the event type as routing key"""
+        event_loop.run_until_complete(
+            mq.publish_message(MessageType.ORDER_CREATED, {"id": "order-1"})
+        )
+
+        publish = publish_channel.exchange.publish
+        message = publish.call_args.args[0]
+        assert publish.call_args.kwargs["routing_key"] == "order.created"
+        assert loads(message.body)["data"] == {"id": "order-1"}
+
+    def test_publish_many(self, event_loop, mq, publish_channel):
+        """Test several messages share one pooled channel"""
+        events = [
+            (MessageType.INVENTORY_LOW, {"product_id": f"prod-{i}", "stock": i})
+            for i in range(3)
+        ]
+
+        event_loop.run_until_complete(mq.publish_many(events))
+
+        publish = publish_channel.exchange.publish
+        assert publish.await_count == 3
+        bodies = [loads(call.args[0].body)["data"] for call in publish.call_args_list]
+        assert bodies == [data for _, data in events]
+
+    def test_messages_carry_unique_ids(self, event_loop, mq, publish_channel):
+        """Test every message gets an id unless a stable one is given"""
+        events = [(MessageType.ORDER_CREATED, {"id": i}) for i in range(3)]
+
+        event_loop.run_until_complete(mq.publish_many(events))
+        event_loop.run_until_complete(
+            mq.publish_message(MessageType.ORDER_CREATED, {}, message_id="stable-1")
+        )
+
+        ids = [
+            call.args[0].message_id
+            for call in publish_channel.exchange.publish.call_args_list
+        ]
+        assert len(set(ids[:3])) == 3
+        assert ids[3] == "stable-1"
+
+    def test_messages_carry_publish_time(self, event_loop, mq, publish_channel):
+        """Test the publish time is sent in the body and as a header"""
+        before = time.time()
+        event_loop.run_until_complete(
+            mq.publish_message(MessageType.ORDER_CREATED, {"id": "order-1"})
+        )
+
+        message = publish_channel.exchange.publish.call_args.args[0]
+        assert message.headers["x-published-at"] >= before
+        assert loads(message.body)["timestamp"].startswith(
+            time.strftime("%Y-%m-%d", time.gmtime())
+        )
+
+    def test_publish_many_empty(self, event_loop, mq, publish_channel):
+        """Test publishing nothing does not touch the broker"""
+        event_loop.run_until_complete(mq.publish_many([]))
+
+        publish_channel.exchange.publish.assert_not_called()
+
+    def test_publish_with_msgpack_and_compression(
+        self, event_loop, mq, publish_channel
+    ):
+        """Test the configured codec and compression are set on the message"""
+        mq.content_type = "application/msgpack"
+        mq.compress_threshold = 64
+        items = [{"product_id": f"prod-{i}", "quantity": 1} for i in range(20)]
+
+        event_loop.run_until_complete(
+            mq.publish_message(MessageType.ORDER_CREATED, {"items": items})
+        )
+
+        message = publish_channel.exchange.publish.call_args.args[0]
+        assert message.content_type == "application/msgpack"
+        assert message.content_encoding == "zstd"
+        assert mq._decode(message)["data"]["items"] == items
+
+    def test_publish_failure_raises(self, event_loop, mq, publish_channel):
+        """Test a rejected publish surfaces to the caller"""
+        publish_channel.exchange.publish.side_effect = RuntimeError("nack")
+
+        with pytest.raises(RuntimeError):
+            event_loop.run_until_complete(
+                mq.publish_message(MessageType.ORDER_CREATED, {"id": "order-1"})
+            )
+
+
+class TestMessageQueueTopology:
+    def test_queue_name_per_service(self):
+        """Test each consuming service gets its own queue per event type"""
+        mq = MessageQueue()
+        mq.service_name = "product_service"
+
+        assert (
+            mq.queue_name(MessageType.ORDER_CREATED) == "product_service.order.created"
+        )
+
+    def test_queue_name_requires_service(self):
+        """Test consuming without a service name is refused"""
+        mq = MessageQueue()
+        mq.service_name = None
+
+        with pytest.raises(ValueError):
+            mq.queue_name(MessageType.ORDER_CREATED)
+
+    def test_declare_queue_binds_to_exchange(self, event_loop):
+        """Test the service queue is durable and bound by event type"""
+        mq = MessageQueue()
+        mq.service_name = "user_service"
+        channel = MagicMock()
+        exchange = MagicMock()
+        queue = MagicMock()
+        queue.bind = AsyncMock()
+        channel.declare_exchange = AsyncMock(return_value=exchange)
+        channel.declare_queue = AsyncMock(return_value=queue)
+
+        event_loop.run_until_complete(
+            mq.declare_queue(MessageType.ORDER_CREATED, channel)
+        )
+
+        channel.declare_queue.assert_awaited_once_with(
+            "user_service.order.created", durable=True
+        )
+        queue.bind.assert_awaited_once_with(exchange, routing_key="order.created")
+
+
+class FakeQueue:
+    """Queue double whose iterator yields the given messages"""
+
+    def __init__(self, messages):
+        self.name = "test_service.order.created"
+        self.messages = messages
+        self.bind = AsyncMock()
+
+    def iterator(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for message in self.messages:
+            yield message
+
+
+def make_message(data, message_id=None):
+    message = MagicMock()
+    message.message_id = message_id
+    message.body = dumps({"type": "order.created", "data": data})
+    message.content_type = "application/json"
+    message.content_encoding = None
+    message.headers = {}
+    message.redelivered = False
+    message.ack = AsyncMock()
+    message.nack = AsyncMock()
+    return message
+
+
+@pytest.fixture
+def consumer_mq():
+    def build(messages):
+        queue = FakeQueue(messages)
+        channel = MagicMock()
+        channel.set_qos = AsyncMock()
+        channel.close = AsyncMock()
+        channel.declare_exchange = AsyncMock()
+        channel.declare_queue = AsyncMock(return_value=queue)
+
+        mq = MessageQueue()
+        mq.service_name = "test_service"
+        mq.connection = MagicMock()
+        mq.connection.channel = AsyncMock(return_value=channel)
+
+        # Failed messages are copied to retry/dead-letter queues on this
+        publisher = MagicMock()
+        publisher.channel.default_exchange.publish = AsyncMock()
+        mq.publish_channels = Pool(AsyncMock(return_value=publisher), max_size=1)
+        channel.republish = publisher.channel.default_exchange.publish
+        return mq, channel
+
+    return build
+
+
+class TestMessageQueueConsuming:
+    def test_messages_acked_after_handler(self, event_loop, consumer_mq):
+        """Test each message is acked once its handler completes"""
+        messages = [make_message({"id": f"order-{i}"}) for i in range(5)]
+        mq, channel = consumer_mq(messages)
+        handled = []
+
+        async def handler(body):
+            handled.append(body["data"]["id"])
+
+        event_loop.run_until_complete(
+            mq.consume_messages(MessageType.ORDER_CREATED, handler, prefetch=20)
+        )
+
+        channel.set_qos.assert_awaited_once_with(prefetch_count=20)
+        assert sorted(handled) == [f"order-{i}" for i in range(5)]
+        for message in messages:
+            message.ack.assert_awaited_once()
+            message.nack.assert_not_called()
+
+    def test_failed_handler_retries(self, event_loop, consumer_mq):
+        """Test a failing message is moved to the first retry queue and acked"""
+        messages = [make_message({"id": "ok"}), make_message({"id": "bad"})]
+        mq, channel = consumer_mq(messages)
+
+        async def handler(body):
+            if body["data"]["id"] == "bad":
+                raise RuntimeError("boom")
+
+        event_loop.run_until_complete(
+            mq.consume_messages(MessageType.ORDER_CREATED, handler)
+        )
+
+        messages[0].ack.assert_awaited_once()
+        messages[1].ack.assert_awaited_once()
+        messages[1].nack.assert_not_called()
+
+        copy = channel.republish.call_args.args[0]
+        assert channel.republish.await_count == 1
+        assert channel.republish.call_args.kwargs["routing_key"] == (
+            "test_service.order.created.retry.1000"
+        )
+        assert copy.headers["x-attempt"] == 1
+        assert "boom" in copy.headers["x-last-error"]
+
+    def test_retry_topology_declared(self, event_loop, consumer_mq):
+        """Test delay queues dead-letter back to the work queue"""
+        mq, channel = consumer_mq([])
+        mq.max_attempts = 3
+
+        event_loop.run_until_complete(
+            mq.consume_messages(MessageType.ORDER_CREATED, AsyncMock())
+        )
+
+        declared = {
+            call.args[0]: call.kwargs.get("arguments")
+            for call in channel.declare_queue.call_args_list
+        }
+        assert declared["test_service.order.created.retry.1000"] == {
+            "x-message-ttl": 1000,
+            "x-dead-letter-exchange": "",
+            "x-dead-letter-routing-key": "test_service.order.created",
+        }
+        assert "test_service.order.created.retry.2000" in declared
+        assert "test_service.order.created.retry.4000" not in declared
+        assert "test_service.order.created.dlq" in declared
+
+    def test_dead_letter_after_max_attempts(self, event_loop, consumer_mq):
+        """Test a message on its last attempt goes to the dead-letter queue"""
+        message = make_message({"id": "bad"})
+        message.headers = {"x-attempt": 4}
+        mq, channel = consumer_mq([message])
+
+        async def handler(body):
+            raise RuntimeError("still failing")
+
+        event_loop.run_until_complete(
+            mq.consume_messages(MessageType.ORDER_CREATED, handler)
+        )
+
+        assert channel.republish.call_args.kwargs["routing_key"] == (
+            "test_service.order.created.dlq"
+        )
+        assert channel.republish.call_args.args[0].headers["x-attempt"] == 5
+        message.ack.assert_awaited_once()
+
+    def test_undecodable_message_dead_lettered(self, event_loop, consumer_mq):
+        """Test a body that cannot be decoded skips the retries"""
+        message = make_message({})
+        message.body = b"not json"
+        mq, channel = consumer_mq([message])
+        handler = AsyncMock()
+
+        event_loop.run_until_complete(
+            mq.consume_messages(MessageType.ORDER_CREATED, handler)
+        )
+
+        handler.assert_not_called()
+        assert channel.republish.call_args.kwargs["routing_key"] == (
+            "test_service.order.created.dlq"
+        )
+
+    def test_failed_republish_requeues(self, event_loop, consumer_mq):
+        """Test a message is requeued when it cannot be moved"""
+        messages = [make_message({"id": "bad"})]
+        mq, channel = consumer_mq(messages)
+        channel.republish.side_effect = RuntimeError("broker down")
+
+        async def handler(body):
+            raise RuntimeError("boom")
+
+        event_loop.run_until_complete(
+            mq.consume_messages(MessageType.ORDER_CREATED, handler)
+        )
+
+        messages[0].nack.assert_awaited_once_with(requeue=True)
+        messages[0].ack.assert_not_called()
+
+    def test_concurrency_is_bounded(self, event_loop, consumer_mq):
+        """Test no more than ``concurrency`` handlers run at once"""
+        messages = [make_message({"id": i}) for i in range(10)]
+        mq, _ = consumer_mq(messages)
+        running = 0
+        peak = 0
+
+        async def handler(body):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        event_loop.run_until_complete(
+            mq.consume_messages(MessageType.ORDER_CREATED, handler, concurrency=3)
+        )
+
+        assert peak == 3
+        assert all(message.ack.await_count == 1 for message in messages)
+
+    def test_sync_handler_runs_in_executor(self, event_loop, consumer_mq):
+        """Test plain functions are run off the event loop"""
+        messages = [make_message({"id": "order-1"})]
+        mq, _ = consumer_mq(messages)
+        threads = []
+
+        def handler(body):
+            threads.append(threading.get_ident())
+
+        event_loop.run_until_complete(
+            mq.consume_messages(MessageType.ORDER_CREATED, handler)
+        )
+
+        assert threads and threads[0] != threading.get_ident()
+        messages[0].ack.assert_awaited_once()
+
+
+def sample(name, queue, suffix=""):
+    value = REGISTRY.get_sample_value(f"{name}{suffix}", {"queue": queue})
+    return value or 0
+
+
+class TestMessageQueueConsumerMetrics:
+    def test_lag_and_redeliveries_recorded(self, event_loop, consumer_mq):
+        """Test handled messages report their lag and redeliveries are counted"""
+        queue = "test_service.order.created"
+        messages = [make_message({"id": i}) for i in range(2)]
+        messages[0].headers = {"x-published-at": time.time() - 2}
+        messages[1].redelivered = True
+        mq, _ = consumer_mq(messages)
+        lag_count = sample("mq_consumer_lag_seconds", queue, "_count")
+        lag_sum = sample("mq_consumer_lag_seconds", queue, "_sum")
+        redelivered = sample("mq_messages_redelivered_total", queue)
+
+        event_loop.run_until_complete(
+            mq.consume_messages(MessageType.ORDER_CREATED, AsyncMock())
+        )
+
+        assert sample("mq_consumer_lag_seconds", queue, "_count") == lag_count + 1
+        assert sample("mq_consumer_lag_seconds", queue, "_sum") >= lag_sum + 2
+        assert sample("mq_messages_redelivered_total", queue) == redelivered + 1
+
+    def test_depth_probe(self, event_loop):
+        """Test the probe samples depth of consumed and dead-letter queues"""
+        mq = MessageQueue()
+        mq.rabbitmq_url = "memory://test-depth-probe"
+        mq.broker = "memory"
+        mq.service_name = "test_service"
+
+        async def run():
+            await mq.connect()
+            channel = await mq.connection.channel()
+            queue = await mq.declare_queue(MessageType.ORDER_CREATED, channel)
+            await mq.declare_retry_queues(queue.name, channel)
+            mq.consumed_queues.add(queue.name)
+            await mq.publish_many(
+                (MessageType.ORDER_CREATED, {"id": i}) for i in range(3)
+            )
+            probe = asyncio.create_task(mq.probe_queue_depth(interval=0.01))
+            await asyncio.sleep(0.05)
+            probe.cancel()
+            await mq.close()
+
+        event_loop.run_until_complete(run())
+
+        assert sample("mq_queue_depth", "test_service.order.created") == 3
+        assert sample("mq_queue_depth", "test_service.order.created.dlq") == 0
+
+
+class TestMessageQueueDeduplication:
+    @pytest.fixture
+    def dedup(self, fake_redis):
+        return Deduplicator(fake_redis)
+
+    def test_duplicate_skipped(self, event_loop, consumer_mq, dedup):
+        """Test a redelivered message is acked without running the handler"""
+        messages = [
+            make_message({"id": "order-1"}, message_id="m-1"),
+            make_message({"id": "order-1"}, message_id="m-1"),
+        ]
+        mq, _ = consumer_mq(messages)
+        handled = []
+
+        async def handler(body):
+            handled.append(body["data"]["id"])
+
+        event_loop.run_until_complete(
+            mq.consume_messages(MessageType.ORDER_CREATED, handler, dedup=dedup)
+        )
+
+        assert handled == ["order-1"]
+        for message in messages:
+            message.ack.assert_awaited_once()
+
+    def test_failed_message_released(self, event_loop, consumer_mq, dedup):
+        """Test a failed message can be processed again on retry"""
+        messages = [make_message({"id": "order-1"}, message_id="m-1")]
+        mq, _ = consumer_mq(messages)
+
+        async def handler(body):
+            raise RuntimeError("boom")
+
+        event_loop.run_until_complete(
+            mq.consume_messages(MessageType.ORDER_CREATED, handler, dedup=dedup)
+        )
+
+        assert event_loop.run_until_complete(
+            dedup.claim("test_service.order.created:m-1")
+        )
+
+    def test_failed_claim_settles_message(self, event_loop, consumer_mq, dedup):
+        """Test a claim that raises still moves the message to a retry queue"""
+        messages = [make_message({"id": "order-1"}, message_id="m-1")]
+        mq, channel = consumer_mq(messages)
+        dedup.claim = AsyncMock(side_effect=RuntimeError("claim failed"))
+        handler = AsyncMock()
+
+        event_loop.run_until_complete(
+            mq.consume_messages(MessageType.ORDER_CREATED, handler, dedup=dedup)
+        )
+
+        handler.assert_not_called()
+        assert channel.republish.call_args.kwargs["routing_key"].startswith(
+            "test_service.order.created.retry"
+        )
+        messages[0].ack.assert_awaited_once()
+
+    def test_batch_skips_duplicates(self, event_loop, consumer_mq, dedup):
+        """Test duplicates are left out of the batch handed to the callback"""
+        messages = [make_message({"id": i}, message_id=f"m-{i % 2}") for i in range(4)]
+        mq, _ = consumer_mq(messages)
+        batches = []
+
+        async def handler(bodies):
+            batches.append([body["data"]["id"] for body in bodies])
+
+        event_loop.run_until_complete(
+            mq.consume_batches(
+                MessageType.ORDER_CREATED, handler, max_batch=2, dedup=dedup
+            )
+        )
+
+        assert batches == [[0, 1]]
+        for message in (messages[1], messages[3]):
+            message.ack.assert_awaited_once_with(multiple=True)
+
+
+class TestMessageQueueBatchConsuming:
+    def test_batches_bounded_by_size(self, event_loop, consumer_mq):
+        """Test messages are delivered in batches of at most max_batch"""
+        messages = [make_message({"id": i}) for i in range(5)]
+        mq, _ = consumer_mq(messages)
+        batches = []
+
+        async def handler(bodies):
+            batches.append([body["data"]["id"] for body in bodies])
+
+        event_loop.run_until_complete(
+            mq.consume_batches(
+                MessageType.ORDER_CREATED, handler, max_batch=2, max_wait_ms=100
+            )
+        )
+
+        assert batches == [[0, 1], [2, 3], [4]]
+        for message in (messages[1], messages[3], messages[4]):
+            message.ack.assert_awaited_once_with(multiple=True)
+        for message in messages:
+            message.nack.assert_not_called()
+
+    def test_batch_failure_retries_listed_messages(self, event_loop, consumer_mq):
+        """Test BatchFailure retries only the messages it names"""
+        messages = [make_message({"id": i}) for i in range(3)]
+        mq, channel = consumer_mq(messages)
+
+        async def handler(bodies):
+            raise BatchFailure([1])
+
+        event_loop.run_until_complete(
+            mq.consume_batches(MessageType.ORDER_CREATED, handler, max_batch=3)
+        )
+
+        for message in messages:
+            message.ack.assert_awaited_once_with()
+        copy = channel.republish.call_args.args[0]
+        assert channel.republish.await_count == 1
+        assert loads(copy.body)["data"] == {"id": 1}
+
+    def test_failing_batch_isolates_bad_messages(self, event_loop, consumer_mq):
+        """Test an unexpected error retries messages one by one"""
+        messages = [make_message({"id": i}) for i in range(3)]
+        mq, channel = consumer_mq(messages)
+        applied = []
+
+        async def handler(bodies):
+            ids = [body["data"]["id"] for body in bodies]
+            if 2 in ids:
+                raise RuntimeError("bad order")
+            applied.extend(ids)
+
+        event_loop.run_until_complete(
+            mq.consume_batches(MessageType.ORDER_CREATED, handler, max_batch=3)
+        )
+
+        assert applied == [0, 1]
+        messages[0].ack.assert_awaited_once_with()
+        messages[1].ack.assert_awaited_once_with()
+        messages[2].ack.assert_awaited_once_with()
+        assert channel.republish.await_count == 1
+        assert loads(channel.republish.call_args.args[0].body)["data"] == {"id": 2}
+
+
+class TestMessageQueuePartitionedConsuming:
+    def test_keys_ordered_and_parallel(self, event_loop, consumer_mq):
+        """Test a key's messages run in order while other keys run alongside"""
+        messages = [
+            make_message({"product_id": f"prod-{i % 3}", "seq": i}) for i in range(9)
+        ]
+        mq, _ = consumer_mq(messages)
+        seen = {}
+        running = 0
+        peak = 0
+
+        async def handler(body):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            seen.setdefault(body["data"]["product_id"], []).append(body["data"]["seq"])
+            running -= 1
+
+        event_loop.run_until_complete(
+            mq.consume_partitioned(
+                MessageType.ORDER_CREATED,
+                handler,
+                partition_key=lambda body: body["data"]["product_id"],
+                lanes=64,
+            )
+        )
+
+        assert seen == {f"prod-{k}": [k, k + 3, k + 6] for k in range(3)}
+        assert peak > 1
+        assert all(message.ack.await_count == 1 for message in messages)
+
+    def test_message_with_several_keys_waits_for_each(self, event_loop, consumer_mq):
+        """Test a multi-key message runs after earlier messages of all its keys"""
+        messages = [
+            make_message({"keys": ["a"], "seq": 0}),
+            make_message({"keys": ["b"], "seq": 1}),
+            make_message({"keys": ["a", "b"], "seq": 2}),
+        ]
+        mq, _ = consumer_mq(messages)
+        finished = []
+
+        async def handler(body):
+            await asyncio.sleep(0.01 if body["data"]["seq"] else 0.03)
+            finished.append(body["data"]["seq"])
+
+        event_loop.run_until_complete(
+            mq.consume_partitioned(
+                MessageType.ORDER_CREATED,
+                handler,
+                partition_key=lambda body: body["data"]["keys"],
+                lanes=1024,
+            )
+        )
+
+        assert finished == [1, 0, 2]
+
+    def test_header_key_used_by_default(self, event_loop, consumer_mq):
+        """Test the partition key header orders messages without a key function"""
+        messages = [make_message({"seq": i}) for i in range(4)]
+        for message in messages:
+            message.headers = {"x-partition-key": "same"}
+        mq, _ = consumer_mq(messages)
+        running = 0
+        peak = 0
+
+        async def handler(body):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.005)
+            running -= 1
+
+        event_loop.run_until_complete(
+            mq.consume_partitioned(MessageType.ORDER_CREATED, handler, lanes=8)
+        )
+
+        assert peak == 1
+
+    def test_partition_key_header_published(self, event_loop, mq, publish_channel):
+        """Test registered partition keys are sent as a header"""
+        mq.set_partition_key(MessageType.ORDER_CREATED, lambda order: order["id"])
+
+        event_loop.run_until_complete(
+            mq.publish_message(MessageType.ORDER_CREATED, {"id": "order-1"})
+        )
+
+        message = publish_channel.exchange.publish.call_args.args[0]
+        assert message.headers["x-partition-key"] == "order-1"
@@ -0,0 +1,194 @@
+import asyncio
+
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from shared.message_queue import MessageType
+from shared.publish_buffer import BufferedPublisher, OverflowPolicy
+
+
+@pytest.fixture
+def broker():
+    mq = MagicMock()
+    mq.published = []
+
+    async def publish_many(events):
+        mq.published.extend(events)
+
+    mq.publish_many = AsyncMock(side_effect=publish_many)
+    return mq
+
+
+def event(i):
+    return MessageType.USER_REGISTERED, {"id": f"user-{i}"}
+
+
+class TestBufferedPublisher:
+    def test_flush_publishes_in_batches(self, event_loop, broker):
+        """Test buffered events are flushed in batches of batch_size"""
+        buffer = BufferedPublisher(broker, capacity=10, batch_size=2)
+
+        async def run():
+            for i in range(5):
+                await buffer.put(*event(i))
+            await buffer.flush()
+
+        event_loop.run_until_complete(run())
+
+        assert broker.publish_many.await_count == 3
+        assert broker.published == [event(i) for i in range(5)]
+        assert buffer.depth == 0
+
+    def test_drop_oldest_when_full(self, event_loop, broker):
+        """Test the oldest event is evicted when the buffer is full"""
+        buffer = BufferedPublisher(
+            broker, capacity=3, overflow=OverflowPolicy.DROP_OLDEST
+        )
+
+        async def run():
+            for i in range(5):
+                await buffer.put(*event(i))
+            await buffer.flush()
+
+        event_loop.run_until_complete(run())
+
+        assert broker.published == [event(i) for i in (2, 3, 4)]
+
+    def test_block_waits_for_room(self, event_loop, broker):
+        """Test the block policy holds the caller until a flush frees room"""
+        buffer = BufferedPublisher(broker, capacity=2, overflow=OverflowPolicy.BLOCK)
+
+        async def run():
+            await buffer.put(*event(0))
+            await buffer.put(*event(1))
+            blocked = asyncio.ensure_future(buffer.put(*event(2)))
+            await asyncio.sleep(0.01)
+            assert not blocked.done()
+            await buffer.flush()
+            await blocked
+            await buffer.flush()
+
+        event_loop.run_until_complete(run())
+
+        assert broker.published == [event(i) for i in range(3)]
+
+    def test_spill_and_replay(self, event_loop, broker, tmp_path):
+        """Test overflow is spilled to disk and replayed by the flusher"""
+        spill_path = str(tmp_path / "spill.ndjson")
+        buffer = BufferedPublisher(
+            broker,
+            capacity=2,
+            overflow=OverflowPolicy.SPILL,
+            spill_path=spill_path,
+            flush_interval=0.01,
+        )
+
+        async def run():
+            for i in range(4):
+                await buffer.put(*event(i))
+            buffer.start()
+            await asyncio.sleep(0.05)
+            await buffer.stop()
+
+        event_loop.run_until_complete(run())
+
+        assert broker.published == [event(i) for i in range(4)]
+        assert not (tmp_path / "spill.ndjson").exists()
+
+    def test_failed_replay_resumes(self, event_loop, broker, tmp_path):
+        """Test a replay that failed part-way does not publish its start again"""
+        spill_path = str(tmp_path / "spill.ndjson")
+        buffer = BufferedPublisher(
+            broker, batch_size=2, overflow=OverflowPolicy.SPILL, spill_path=spill_path
+        )
+        buffer._spill([event(i) for i in range(5)])
+        publish_many = broker.publish_many.side_effect
+
+        async def fail_second(events):
+            if broker.publish_many.await_count == 2:
+                raise ConnectionError("broker down")
+            await publish_many(events)
+
+        broker.publish_many.side_effect = fail_second
+
+        async def run():
+            with pytest.raises(ConnectionError):
+                await buffer._replay_spill()
+            await buffer._replay_spill()
+
+        event_loop.run_until_complete(run())
+
+        assert broker.published == [event(i) for i in range(5)]
+        assert list(tmp_path.iterdir()) == []
+
+    def test_failed_flush_keeps_events(self, event_loop, broker):
+        """Test a broker failure puts the batch back in order"""
+        buffer = BufferedPublisher(broker, capacity=10, batch_size=10)
+        broker.publish_many.side_effect = RuntimeError("broker down")
+
+        async def run():
+            for i in range(3):
+                await buffer.put(*event(i))
+            with pytest.raises(RuntimeError):
+                await buffer.flush()
+
+        event_loop.run_until_complete(run())
+
+        assert list(buffer._buffer) == [event(i) for i in range(3)]
+
+    def test_block_keeps_failed_batch(self, event_loop, broker):
+        """Test blocked producers cannot take the room of a batch being published"""
+        buffer = BufferedPublisher(
+            broker, capacity=2, batch_size=2, overflow=OverflowPolicy.BLOCK
+        )
+        publishing = asyncio.Event()
+        fail = asyncio.Event()
+
+        async def publish_many(events):
+            publishing.set()
+            await fail.wait()
+            raise RuntimeError("broker down")
+
+        broker.publish_many.side_effect = publish_many
+
+        async def run():
+            await buffer.put(*event(0))
+            await buffer.put(*event(1))
+            flush = asyncio.ensure_future(buffer.flush())
+            await publishing.wait()
+            blocked = asyncio.ensure_future(buffer.put(*event(2)))
+            await asyncio.sleep(0.01)
+            assert not blocked.done()
+            fail.set()
+            with pytest.raises(RuntimeError):
+                await flush
+            blocked.cancel()
+
+        event_loop.run_until_complete(run())
+
+        assert list(buffer._buffer) == [event(0), event(1)]
+
+    def test_stop_keeps_batch_in_flight(self, event_loop, broker):
+        """Test stopping during a publish puts the batch back and flushes it"""
+        buffer = BufferedPublisher(broker, capacity=10, flush_interval=0.01)
+        publishing = asyncio.Event()
+        published = []
+
+        async def publish_many(events):
+            if not publishing.is_set():
+                publishing.set()
+                await asyncio.sleep(10)
+            published.extend(events)
+
+        broker.publish_many.side_effect = publish_many
+
+        async def run():
+            await buffer.put(*event(0))
+            buffer.start()
+            await publishing.wait()
+            await buffer.stop()
+
+        event_loop.run_until_complete(run())
+
+        assert published == [event(0)]
+        assert buffer.depth == 0
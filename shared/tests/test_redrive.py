@@ -0,0 +1,83 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+
+from aio_pika.pool import Pool
+
+from shared.message_queue import MessageQueue
+from shared.redrive import redrive
+
+
+def dead_letter(i):
+    message = MagicMock()
+    message.body = b'{"type": "order.created", "data": {"id": %d}}' % i
+    message.content_type = "application/json"
+    message.content_encoding = None
+    message.headers = {"x-attempt": 5, "x-last-error": "RuntimeError: boom"}
+    message.ack = AsyncMock()
+    message.nack = AsyncMock()
+    return message
+
+
+@pytest.fixture
+def dlq_mq():
+    def build(messages):
+        dlq = MagicMock()
+        dlq.get = AsyncMock(side_effect=messages + [None])
+        channel = MagicMock()
+        channel.close = AsyncMock()
+        channel.declare_queue = AsyncMock(return_value=dlq)
+
+        publisher = MagicMock()
+        publisher.channel.default_exchange.publish = AsyncMock()
+
+        mq = MessageQueue()
+        mq.connection = MagicMock()
+        mq.connection.channel = AsyncMock(return_value=channel)
+        mq.publish_channels = Pool(AsyncMock(return_value=publisher), max_size=1)
+        return mq, channel, publisher.channel.default_exchange.publish
+
+    return build
+
+
+class TestRedrive:
+    def test_redrive_moves_dead_letters(self, event_loop, dlq_mq):
+        """Test dead letters are replayed to the work queue with attempts reset"""
+        messages = [dead_letter(i) for i in range(3)]
+        mq, channel, publish = dlq_mq(messages)
+
+        moved = event_loop.run_until_complete(
+            redrive(mq, "product_service.order.created", rate=1000)
+        )
+
+        assert moved == 3
+        channel.declare_queue.assert_awaited_once_with(
+            "product_service.order.created.dlq", durable=True
+        )
+        for call in publish.call_args_list:
+            assert call.kwargs["routing_key"] == "product_service.order.created"
+            assert "x-attempt" not in call.args[0].headers
+        for message in messages:
+            message.ack.assert_awaited_once()
+
+    def test_redrive_respects_limit(self, event_loop, dlq_mq):
+        """Test no more than ``limit`` messages are replayed"""
+        messages = [dead_letter(i) for i in range(5)]
+        mq, _, publish = dlq_mq(messages)
+
+        moved = event_loop.run_until_complete(
+            redrive(mq, "product_service.order.created", rate=1000, limit=2)
+        )
+
+        assert moved == 2
+        assert publish.await_count == 2
+
+    def test_redrive_is_rate_limited(self, event_loop, dlq_mq):
+        """Test replay is paced to ``rate`` messages per second"""
+        mq, _, _ = dlq_mq([dead_letter(i) for i in range(5)])
+
+        started = event_loop.time()
+        event_loop.run_until_complete(
+            redrive(mq, "product_service.order.created", rate=100)
+        )
+
+        assert event_loop.time() - started >= 0.05
@@ -0,0 +1,41 @@
+import uuid
+from datetime import datetime
+
+from shared.schemas import OrderItem, OrderStatus
+from shared.serialization import ORJSONResponse, dumps, loads
+
+
+class TestSerialization:
+    def test_native_types(self):
+        """Test datetimes, enums and UUIDs are encoded natively"""
+        order_id = uuid.uuid4()
+        created_at = datetime(2024, 1, 1, 12, 0, 0)
+
+        data = loads(
+            dumps({"id": order_id, "status": OrderStatus.PENDING, "at": created_at})
+        )
+
+        assert data == {
+            "id": str(order_id),
+            "status": "pending",
+            "at": "2024-01-01T12:00:00",
+        }
+
+    def test_pydantic_models(self):
+        """Test Pydantic models fall back to their dict representation"""
+        item = OrderItem(product_id="prod-1", quantity=2, price=9.99)
+
+        assert loads(dumps([item])) == [
+            {"product_id": "prod-1", "quantity": 2, "price": 9.99}
+        ]
+
+    def test_sort_keys(self):
+        """Test sorted output is stable for cache keys"""
+        assert dumps({"b": 1, "a": 2}, sort_keys=True) == b'{"a":2,"b":1}'
+
+    def test_response_render(self):
+        """Test the response class renders with the shared codec"""
+        response = ORJSONResponse({"status": OrderStatus.SHIPPED})
+
+        assert response.body == b'{"status":"shipped"}'
+        assert response.media_type == "application/json"
@@ -5,8 +5,8 @@ logger = logging.getLogger(__name__)
 
 
 async def publish_user_registered(user_data: dict):
-    """Publish user registration events"""
-    await message_queue.publish_message(MessageType.USER_REGISTERED, user_data)
+    """Publish user registration events without waiting for the broker"""
+    await message_queue.publish_buffered(MessageType.USER_REGISTERED, user_data)
 
 
 async def handle_order_events(message: dict):
@@ -6,6 +6,9 @@ from database import Base, engine
 from routers import auth, users
 
 from monitoring import monitor_app
+from shared.deadline import install_deadline_middleware
+from shared.dedup import Deduplicator
+from shared.serialization import ORJSONResponse
 
 from contextlib import asynccontextmanager
 import asyncio
@@ -19,17 +22,28 @@ Base.metadata.create_all(bind=engine)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup: Connect to message queue
-    await message_queue.connect()
+    await message_queue.connect(service_name="user_service")
+
+    # Registration events are fire-and-forget; flush them in the background
+    message_queue.start_buffer()
 
     # Start consuming order events for user analytics
     order_task = asyncio.create_task(
-        message_queue.consume_messages(MessageType.ORDER_CREATED, handle_order_events)
+        message_queue.consume_messages(
+            MessageType.ORDER_CREATED,
+            handle_order_events,
+            prefetch=100,
+            concurrency=16,
+            dedup=Deduplicator(),
+        )
     )
+    depth_probe_task = asyncio.create_task(message_queue.probe_queue_depth())
 
     yield
 
     # Shutdown: Close connections
     order_task.cancel()
+    depth_probe_task.cancel()
     await message_queue.close()
 
 
@@ -100,6 +114,7 @@ A secure microservice for user management and authentication in the E-commerce P
         },
     ],
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # CORS middleware
@@ -123,6 +138,9 @@ monitor_app(app, "user_service")
 # 3. Creates /metrics endpoint for monitoring systems
 # 4. Enables performance tracking
 
+# Reject and cancel requests whose gateway deadline has passed
+install_deadline_middleware(app)
+
 
 # ✅ HEALTH CHECK ENDPOINT
 @app.get("/health")